@@ -0,0 +1,112 @@
+# 存储上传与签名基准测试
+# 对同一个本地文件分别使用各上传方式写入存储，输出耗时与吞吐，并测量签名 URL 冷/热耗时
+#
+# 用法：
+#   python scripts/benchmark_storage.py --backend memory --size 64 --latency-ms 30 --bandwidth 20
+#   python scripts/benchmark_storage.py --backend local --concurrency 8 --total-bandwidth 100 --repeat 3
+#   python scripts/benchmark_storage.py --backend s3 --file /path/to/video.mp4
+#
+# local / memory 为离线存储替身，不需要网络与对象存储环境变量；--latency-ms、--bandwidth、
+# --total-bandwidth（MB/s）模拟链路。s3 使用与服务相同的环境变量；测试上传的对象默认在结束后删除（--keep 保留）。
+import argparse
+import os
+import sys
+import tempfile
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_path = os.path.join(os.path.dirname(current_dir), "src")
+if src_path not in sys.path:
+    sys.path.insert(0, src_path)
+
+from storage.s3.simulated_storage import SimulatedLink, SimulatedSyncStorage, get_object_store
+from tools.storage_upload_tool import get_storage
+
+MB = 1024 * 1024
+
+
+def _make_storage(args):
+    if args.backend == "s3":
+        return get_storage()
+    link = SimulatedLink(latency=args.latency_ms / 1000, bandwidth=int(args.bandwidth * MB),
+                         total_bandwidth=int(args.total_bandwidth * MB))
+    return SimulatedSyncStorage(store=get_object_store(args.backend), link=link,
+                                max_pool_connections=max(10, args.concurrency))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="存储上传与签名基准测试")
+    parser.add_argument("--backend", default="memory", choices=["memory", "local", "s3"], help="存储后端")
+    parser.add_argument("--file", help="要上传的本地文件；为空时生成随机内容文件")
+    parser.add_argument("--size", type=int, default=64, help="生成文件的大小（MB）")
+    parser.add_argument("--modes", default="parallel,trunk,stream", help="上传方式，逗号分隔（parallel/trunk/stream）")
+    parser.add_argument("--concurrency", type=int, default=4, help="分片并发数")
+    parser.add_argument("--part-size", type=int, default=8, help="分片大小（MB）")
+    parser.add_argument("--latency-ms", type=float, default=0, help="模拟每次请求延迟（毫秒）")
+    parser.add_argument("--bandwidth", type=float, default=0, help="模拟单连接带宽（MB/s，0 不限）")
+    parser.add_argument("--total-bandwidth", type=float, default=0, help="模拟总带宽（MB/s，0 不限）")
+    parser.add_argument("--repeat", type=int, default=1, help="每种方式重复次数")
+    parser.add_argument("--keep", action="store_true", help="保留测试上传的对象")
+    args = parser.parse_args()
+
+    storage = _make_storage(args)
+    part_size = args.part_size * MB
+
+    file_path = args.file
+    if not file_path:
+        fd, file_path = tempfile.mkstemp(suffix=".mp4")
+        with os.fdopen(fd, "wb") as f:
+            for _ in range(args.size):
+                f.write(os.urandom(MB))
+    size = os.path.getsize(file_path)
+
+    def _upload(mode: str) -> str:
+        name = os.path.basename(file_path)
+        if mode == "parallel":
+            return storage.parallel_upload_file(file_path=file_path, file_name=name, content_type="video/mp4",
+                                                max_concurrency=args.concurrency, max_part_size=part_size)
+        with open(file_path, "rb") as f:
+            if mode == "trunk":
+                return storage.trunk_upload_file(chunk_iter=iter(lambda: f.read(MB), b""), file_name=name,
+                                                 content_type="video/mp4", part_size=part_size,
+                                                 max_in_flight=args.concurrency)
+            if mode == "stream":
+                return storage.stream_upload_file(fileobj=f, file_name=name, content_type="video/mp4",
+                                                  multipart_chunksize=part_size, max_concurrency=args.concurrency,
+                                                  use_threads=args.concurrency > 1)
+        raise ValueError(f"未知的上传方式: {mode}")
+
+    print(f"backend={args.backend} size={size / MB:.1f}MB concurrency={args.concurrency} part={args.part_size}MB")
+    print(f"{'mode':<10}{'run':>4}{'seconds':>10}{'MB/s':>10}{'sign cold':>12}{'sign warm':>12}")
+    try:
+        for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+            for run in range(1, args.repeat + 1):
+                started = time.monotonic()
+                try:
+                    key = _upload(mode)
+                except Exception as e:
+                    print(f"{mode:<10}{run:>4}  失败: {e}")
+                    break
+                seconds = time.monotonic() - started
+
+                started = time.monotonic()
+                storage.generate_presigned_url(key=key)
+                cold = time.monotonic() - started
+                started = time.monotonic()
+                storage.generate_presigned_url(key=key)
+                warm = time.monotonic() - started
+
+                print(f"{mode:<10}{run:>4}{seconds:>10.2f}{size / MB / seconds:>10.1f}"
+                      f"{cold * 1000:>10.1f}ms{warm * 1000:>10.3f}ms")
+                if not args.keep:
+                    storage.delete_file(file_key=key)
+    finally:
+        if not args.file:
+            os.remove(file_path)
+
+
+if __name__ == "__main__":
+    main()
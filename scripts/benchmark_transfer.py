@@ -0,0 +1,66 @@
+# URL 转存基准测试
+# 对同一个源 URL 分别使用各传输方式转存到对象存储，输出经过本机的字节数与每 GB 耗时
+#
+# 用法：
+#   python scripts/benchmark_transfer.py --url https://example.com/video.mp4
+#   python scripts/benchmark_transfer.py --url <URL> --modes stream,ranged --concurrency 8 --repeat 3
+#
+# 需要与服务相同的对象存储环境变量（COZE_BUCKET_ENDPOINT_URL、COZE_BUCKET_NAME 等）；
+# 测试上传的对象默认在结束后删除（--keep 保留）。
+import argparse
+import os
+import sys
+from dotenv import load_dotenv
+
+load_dotenv()
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_path = os.path.join(os.path.dirname(current_dir), "src")
+if src_path not in sys.path:
+    sys.path.insert(0, src_path)
+
+from storage.s3.transfer import TransferEngine
+from tools.storage_upload_tool import get_storage
+
+
+def _fmt_bytes(value):
+    if value is None:
+        return "-"
+    return f"{value / 1024 / 1024:.1f}MB"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="URL 转存基准测试")
+    parser.add_argument("--url", required=True, help="源文件 URL")
+    parser.add_argument("--modes", default="stream,ranged,copy", help="要测试的传输方式，逗号分隔（stream/ranged/copy）")
+    parser.add_argument("--concurrency", type=int, default=4, help="分片并发数")
+    parser.add_argument("--part-size", type=int, default=8, help="分片大小（MB）")
+    parser.add_argument("--repeat", type=int, default=1, help="每种方式重复次数")
+    parser.add_argument("--keep", action="store_true", help="保留测试上传的对象")
+    args = parser.parse_args()
+
+    storage = get_storage()
+    engine = TransferEngine(storage, part_size=args.part_size * 1024 * 1024, concurrency=args.concurrency)
+
+    print(f"{'mode':<8}{'run':>4}{'size':>12}{'through app':>14}{'seconds':>10}{'s/GB':>10}")
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        for run in range(1, args.repeat + 1):
+            try:
+                key = engine.transfer_from_url(args.url, mode=mode)
+            except Exception as e:
+                print(f"{mode:<8}{run:>4}  失败: {e}")
+                break
+
+            stats = engine.last_stats
+            per_gb = stats.seconds_per_gb
+            print(
+                f"{stats['mode']:<8}{run:>4}{_fmt_bytes(stats['size']):>12}"
+                f"{_fmt_bytes(stats['bytes_through_app']):>14}{stats['seconds']:>10.2f}"
+                f"{(f'{per_gb:.1f}' if per_gb is not None else '-'):>10}"
+            )
+            if not args.keep:
+                storage.delete_file(file_key=key)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,7 @@ import sys
 import json
 import base64
 import tempfile
+import time
 from pathlib import Path
 
 # 添加项目根目录和 src 目录到 Python 路径（必须在所有导入之前）
@@ -22,18 +23,26 @@ if workspace_path not in sys.path:
 if src_path not in sys.path:
     sys.path.insert(0, src_path)
 
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, BackgroundTasks
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, BackgroundTasks, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from typing import Optional
 import asyncio
 import uuid
 
-from agents.agent import build_agent
 from langgraph.types import RunnableConfig
-from storage.database.db import get_session
-from storage.database.session import get_db_session
+from llm.ark_video_client import close_ark_video_clients
+from storage.database.db import close_async_engine, get_session
+from storage.database.progress_events import TERMINAL_STATUSES, close_progress_broker, get_progress_broker
+from storage.database.progress_cache import get_progress_cache
+from storage.database.progress_writer import close_progress_writer
+from storage.database.session import get_async_db_session, get_db_session
 from storage.database.video_task_manager import VideoTaskManager, VideoTaskCreate, VideoTaskResponse
+from storage.database.video_job_queue import VideoJobQueue
+from storage.workload_identity import stop_workload_identity
+from api.video_tasks import VideoGenerateRequest, get_agent, process_video_generation_task
+from tools.storage_upload_tool import STORAGE_UPLOAD_JANITOR_INTERVAL, close_async_storages, run_upload_janitor
 
 # 导入企业微信模块
 from src.api.wechat_callback_simple import router as wechat_callback_router
@@ -42,6 +51,15 @@ from src.api.enterprise_wechat import router as enterprise_wechat_router
 # 导入请求日志中间件
 from src.api.middleware import RequestLoggingMiddleware
 
+# 视频任务执行方式：background（本进程后台任务）或 queue（持久化队列 + 独立 worker）
+VIDEO_JOB_MODE = os.getenv("VIDEO_JOB_MODE", "background")
+# 进度推送（SSE/WebSocket）无事件时的保活与数据库兜底检查间隔（秒）
+PROGRESS_STREAM_KEEPALIVE = float(os.getenv("PROGRESS_STREAM_KEEPALIVE_SECONDS", "15"))
+# 单个进度推送连接的最长时长（秒）：任务长时间未结束时到期关闭，客户端可重新连接或改为轮询
+PROGRESS_STREAM_MAX_SECONDS = float(os.getenv("PROGRESS_STREAM_MAX_SECONDS", "1800"))
+# WebSocket 无进度变化时发送的保活消息
+_WS_KEEPALIVE_MESSAGE = json.dumps({"type": "keepalive"})
+
 # 初始化 FastAPI 应用
 app = FastAPI(
     title="天虹紧固件视频生成 API",
@@ -61,6 +79,50 @@ app.mount("/assets", StaticFiles(directory=str(assets_path)), name="assets")
 app.include_router(wechat_callback_router)
 app.include_router(enterprise_wechat_router)
 
+
+@app.on_event("startup")
+async def ensure_database_schema():
+    """补齐数据库表结构（任务队列字段等），失败不影响服务启动"""
+    try:
+        from storage.database.init_db import init_db
+        await asyncio.to_thread(init_db)
+    except Exception as e:
+        print(f"数据库表结构初始化失败: {e}")
+
+
+_upload_janitor: Optional[asyncio.Task] = None
+
+
+@app.on_event("startup")
+async def start_upload_janitor():
+    """定期中止超期未完成的分片上传（background 模式下没有独立 worker，由 API 进程清理）"""
+    global _upload_janitor
+    if STORAGE_UPLOAD_JANITOR_INTERVAL > 0:
+        _upload_janitor = asyncio.create_task(run_upload_janitor())
+
+
+@app.on_event("shutdown")
+async def stop_upload_janitor():
+    if _upload_janitor is not None:
+        _upload_janitor.cancel()
+
+
+@app.on_event("shutdown")
+async def shutdown_ark_clients():
+    """关闭共享的方舟视频生成客户端与异步对象存储连接池"""
+    await close_ark_video_clients()
+    await close_async_storages()
+
+
+@app.on_event("shutdown")
+async def flush_task_progress():
+    """写入尚未落库的任务进度，关闭进度通知的 LISTEN 连接与异步数据库连接池，停止凭证刷新线程"""
+    await close_progress_writer()
+    await close_progress_broker()
+    await close_async_engine()
+    await asyncio.to_thread(stop_workload_identity)
+
+
 # 请求模型
 class ScriptRequest(BaseModel):
     """生成脚本请求"""
@@ -75,15 +137,6 @@ class FrameImagesRequest(BaseModel):
     product_name: str = "紧固件"
     product_image_url: str = ""
 
-class VideoGenerateRequest(BaseModel):
-    product_name: str
-    theme: str = "品质保证"
-    duration: int = 20
-    type: str = "video"  # video 或 script
-    scenario: str = ""  # 使用场景描述
-    product_image_url: str = ""  # 产品图片URL
-    session_id: Optional[str] = None
-
 # 响应模型
 class VideoGenerateResponse(BaseModel):
     success: bool
@@ -114,122 +167,6 @@ class ProgressResponse(BaseModel):
     error_message: Optional[str] = None
     message: Optional[str] = None
 
-# 全局 Agent 实例
-_agent_instance = None
-
-def get_agent():
-    """获取或创建 Agent 实例"""
-    global _agent_instance
-    if _agent_instance is None:
-        _agent_instance = build_agent()
-    return _agent_instance
-
-async def process_video_generation_task(
-    task_id: str,
-    request: VideoGenerateRequest,
-    total_parts: int = 1
-):
-    """
-    后台处理视频生成任务
-
-    Args:
-        task_id: 任务ID
-        request: 视频生成请求
-        total_parts: 总段数
-    """
-    from langchain.tools import tool, ToolRuntime
-
-    # 创建进度回调函数
-    def progress_callback(progress: int, message: str):
-        """进度回调函数"""
-        with get_db_session() as db:
-            try:
-                mgr = VideoTaskManager()
-                mgr.update_progress(db, task_id, progress, message)
-            except Exception as e:
-                print(f"更新进度失败: {e}")
-
-    # 获取 Agent
-    agent = get_agent()
-
-    try:
-        # 更新状态为生成中
-        progress_callback(0, "开始生成视频...")
-
-        # 构造用户消息
-        prompt_parts = [f"请为{request.product_name}生成一个{request.theme}主题的宣传视频，时长{request.duration}秒"]
-        if request.scenario:
-            prompt_parts.append(f"，使用场景：{request.scenario}")
-        if request.product_image_url:
-            prompt_parts.append(f"，参考产品图片：{request.product_image_url}")
-        user_message = "".join(prompt_parts)
-
-        # 配置运行时参数
-        config = RunnableConfig(
-            configurable={
-                "thread_id": request.session_id or "default"
-            }
-        )
-
-        # 调用 Agent
-        response = await agent.ainvoke(
-            {"messages": [("user", user_message)]},
-            config=config
-        )
-
-        # 解析响应
-        video_url = None
-        video_url_part1 = None
-        video_url_part2 = None
-        merged_video_path = None
-        merged_video_url = None
-        video_urls = None
-        content_text = ""
-
-        # 遍历所有消息，查找视频生成工具的结果
-        for msg in response["messages"]:
-            msg_content = msg.content if hasattr(msg, 'content') else str(msg)
-            content_text += str(msg_content)
-
-            # 尝试解析 JSON
-            if isinstance(msg_content, str) and msg_content.strip().startswith('{'):
-                try:
-                    response_data = json.loads(msg_content)
-                    if "video_url" in response_data:
-                        video_url = response_data.get("video_url")
-                        video_url_part1 = response_data.get("video_url_part1")
-                        video_url_part2 = response_data.get("video_url_part2")
-                        merged_video_path = response_data.get("merged_video_path")
-                        merged_video_url = response_data.get("merged_video_url")
-                        video_urls = response_data.get("video_urls")
-                        break
-                except:
-                    pass
-
-        # 更新任务状态
-        with get_db_session() as db:
-            try:
-                mgr = VideoTaskManager()
-                if video_url:
-                    result_data = {
-                        "video_urls": video_urls or [video_url],
-                        "merged_video_url": merged_video_url
-                    }
-                    mgr.mark_as_completed(db, task_id, result_data)
-                else:
-                    mgr.mark_as_failed(db, task_id, f"无法从响应中提取视频 URL。响应内容：{content_text}")
-            except Exception as e:
-                print(f"更新任务状态失败: {e}")
-
-    except Exception as e:
-        # 标记任务失败
-        with get_db_session() as db:
-            try:
-                mgr = VideoTaskManager()
-                mgr.mark_as_failed(db, task_id, str(e))
-            except Exception as e2:
-                print(f"标记任务失败时出错: {e2}")
-
 @app.get("/")
 async def root():
     """API 健康检查"""
@@ -496,30 +433,38 @@ async def generate_video(request: VideoGenerateRequest, background_tasks: Backgr
 
         total_parts = calculate_total_parts(request.duration)
 
-        # 创建任务记录
-        with get_db_session() as db:
-            try:
-                mgr = VideoTaskManager()
-                task_create = VideoTaskCreate(
-                    task_id=task_id,
-                    session_id=request.session_id,
-                    product_name=request.product_name,
-                    theme=request.theme,
-                    duration=request.duration,
-                    type=request.type
-                )
-                mgr.create_task(db, task_create, total_parts=total_parts)
-            except Exception as e:
-                print(f"创建任务记录失败: {e}")
-
-        # 添加后台任务
-        background_tasks.add_task(
-            process_video_generation_task,
-            task_id,
-            request,
-            total_parts
+        task_create = VideoTaskCreate(
+            task_id=task_id,
+            session_id=request.session_id,
+            product_name=request.product_name,
+            theme=request.theme,
+            duration=request.duration,
+            type=request.type
         )
 
+        if VIDEO_JOB_MODE == "queue":
+            # 写入持久化队列，由独立 worker 租约执行（python worker.py）
+            def _enqueue():
+                with get_db_session() as db:
+                    VideoJobQueue().enqueue(db, task_create, request.model_dump(), total_parts=total_parts)
+            await asyncio.to_thread(_enqueue)
+        else:
+            # 创建任务记录
+            async with get_async_db_session() as db:
+                try:
+                    mgr = VideoTaskManager()
+                    await mgr.create_task_async(db, task_create, total_parts=total_parts)
+                except Exception as e:
+                    print(f"创建任务记录失败: {e}")
+
+            # 添加后台任务
+            background_tasks.add_task(
+                process_video_generation_task,
+                task_id,
+                request,
+                total_parts
+            )
+
         return VideoGenerateResponse(
             success=True,
             message=f"视频生成任务已创建，任务ID: {task_id}。请使用 /api/progress/{task_id} 查询进度。",
@@ -536,32 +481,18 @@ async def generate_video(request: VideoGenerateRequest, background_tasks: Backgr
             message=f"创建任务失败: {str(e)}"
         )
 
-@app.get("/api/progress/{task_id}", response_model=ProgressResponse)
-async def get_progress(task_id: str):
-    """
-    查询视频生成任务进度
+async def _load_progress(task_id: str) -> ProgressResponse:
+    """读取任务进度（优先读进程内缓存，未命中时读数据库并缓存）"""
+    cache = get_progress_cache()
+    cached = cache.get(task_id)
+    if cached is not None:
+        return cached
 
-    参数:
-        task_id: 任务ID
-
-    返回:
-        success: 是否成功
-        task_id: 任务ID
-        status: 任务状态（pending/generating/merging/uploading/completed/failed）
-        progress: 进度百分比（0-100）
-        current_step: 当前步骤描述
-        total_parts: 总段数
-        completed_parts: 已完成段数
-        video_urls: 生成的视频URL列表
-        merged_video_url: 拼接后的视频URL
-        script_content: 脚本内容（如果是script类型）
-        error_message: 错误信息（如果失败）
-        message: 消息
-    """
-    with get_db_session() as db:
+    version = cache.version(task_id)
+    async with get_async_db_session() as db:
         try:
             mgr = VideoTaskManager()
-            task = mgr.get_task_by_id(db, task_id)
+            task = await mgr.get_task_by_id_async(db, task_id)
 
             if not task:
                 return ProgressResponse(
@@ -586,7 +517,9 @@ async def get_progress(task_id: str):
                 "message": _get_status_message(task.status, task.progress)
             }
 
-            return ProgressResponse(**response_data)
+            response = ProgressResponse(**response_data)
+            cache.put(task_id, response, finished=task.status in TERMINAL_STATUSES, version=version)
+            return response
 
         except Exception as e:
             import traceback
@@ -597,6 +530,130 @@ async def get_progress(task_id: str):
                 message=f"查询进度失败: {str(e)}"
             )
 
+@app.get("/api/progress/{task_id}", response_model=ProgressResponse)
+async def get_progress(task_id: str):
+    """
+    查询视频生成任务进度
+
+    参数:
+        task_id: 任务ID
+
+    返回:
+        success: 是否成功
+        task_id: 任务ID
+        status: 任务状态（pending/generating/merging/uploading/completed/failed）
+        progress: 进度百分比（0-100）
+        current_step: 当前步骤描述
+        total_parts: 总段数
+        completed_parts: 已完成段数
+        video_urls: 生成的视频URL列表
+        merged_video_url: 拼接后的视频URL
+        script_content: 脚本内容（如果是script类型）
+        error_message: 错误信息（如果失败）
+        message: 消息
+
+    注意：
+        - 需要持续获取进度时请使用 /api/progress/{task_id}/stream（SSE）或 /ws/progress/{task_id}（WebSocket），
+          服务端在进度变化时推送，不必轮询
+    """
+    return await _load_progress(task_id)
+
+async def _progress_updates(task_id: str):
+    """
+    任务进度推送序列：先产生当前进度，之后每次进度变化产生一次，任务结束（完成/失败）后结束
+
+    长时间没有推送时读一次数据库兜底（LISTEN 不可用时仍能结束），无变化时产生 None 作为保活；
+    超过 PROGRESS_STREAM_MAX_SECONDS 后结束（任务卡住时不无限期读库）
+    """
+    # 先订阅再读快照，避免两者之间的更新丢失
+    with get_progress_broker().subscribe(task_id) as subscription:
+        last = await _load_progress(task_id)
+        yield last
+        if not last.success or last.status in TERMINAL_STATUSES:
+            return
+
+        deadline = time.monotonic() + PROGRESS_STREAM_MAX_SECONDS
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            event = await subscription.get(timeout=min(PROGRESS_STREAM_KEEPALIVE, remaining))
+            if event is None:
+                current = await _load_progress(task_id)
+                if current.success and current != last:
+                    last = current
+                    yield current
+                else:
+                    yield None
+                if current.status in TERMINAL_STATUSES:
+                    return
+                continue
+
+            if event.get("status") in TERMINAL_STATUSES:
+                # 终态读取完整结果（视频地址、错误信息）
+                yield await _load_progress(task_id)
+                return
+
+            fields = ("status", "progress", "current_step", "completed_parts", "total_parts")
+            last = last.model_copy(update={k: event[k] for k in fields if event.get(k) is not None})
+            last.message = _get_status_message(last.status, last.progress)
+            yield last
+
+@app.get("/api/progress/{task_id}/stream")
+async def stream_progress(task_id: str):
+    """
+    以 SSE（text/event-stream）推送任务进度
+
+    每个事件的 data 为与 /api/progress/{task_id} 相同结构的 JSON；任务完成或失败后服务端关闭连接。
+    """
+    async def _events():
+        async for update in _progress_updates(task_id):
+            if update is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"event: progress\ndata: {update.model_dump_json()}\n\n"
+
+    return StreamingResponse(
+        _events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.websocket("/ws/progress/{task_id}")
+async def websocket_progress(websocket: WebSocket, task_id: str):
+    """
+    以 WebSocket 推送任务进度
+
+    每条消息为与 /api/progress/{task_id} 相同结构的 JSON；无进度变化时每 PROGRESS_STREAM_KEEPALIVE_SECONDS 秒
+    发送一条 {"type": "keepalive"}。任务完成或失败、或超过 PROGRESS_STREAM_MAX_SECONDS 后服务端关闭连接。
+    """
+    await websocket.accept()
+
+    async def _send_updates():
+        async for update in _progress_updates(task_id):
+            await websocket.send_text(_WS_KEEPALIVE_MESSAGE if update is None else update.model_dump_json())
+
+    async def _wait_disconnect():
+        # 推送在等待进度时感知不到断开，单独接收断开事件（客户端发送的消息忽略）
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    sender = asyncio.create_task(_send_updates())
+    receiver = asyncio.create_task(_wait_disconnect())
+    try:
+        done, _ = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        # 客户端断开时停止推送（不再订阅、读库）；推送结束时停止接收
+        sender.cancel()
+        receiver.cancel()
+        await asyncio.gather(sender, receiver, return_exceptions=True)
+    if sender in done:
+        error = sender.exception()
+        if error is None:
+            await websocket.close()
+        elif not isinstance(error, WebSocketDisconnect):
+            raise error
+
 def _get_status_message(status: str, progress: int) -> str:
     """根据状态生成友好的消息"""
     messages = {
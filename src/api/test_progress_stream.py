@@ -0,0 +1,156 @@
+"""
+任务进度推送测试：SSE 与 WebSocket 推送进度变化、无变化时保活、终态后结束、超过最长时长后结束、
+WebSocket 客户端断开后退订
+进度读取替换为预设的进度序列，进度事件通过不连接数据库的分发器发布
+"""
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# 添加项目根目录和src目录到路径
+ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "src"))
+os.environ.setdefault("COZE_WORKSPACE_PATH", str(ROOT))
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+pytest.importorskip("langgraph")
+pytest.importorskip("cryptography")
+
+from fastapi.testclient import TestClient
+
+from api import app as app_module
+from api.app import ProgressResponse
+from storage.database.progress_events import ProgressBroker
+
+
+def _progress(status: str, progress: int, **fields) -> ProgressResponse:
+    return ProgressResponse(success=True, task_id="t1", status=status, progress=progress, **fields)
+
+
+@pytest.fixture
+def stream(monkeypatch):
+    """进度快照按顺序返回（用完后重复最后一个），返回分发器与快照列表"""
+    async def _no_listen(self):
+        return
+
+    monkeypatch.setattr(ProgressBroker, "_listen", _no_listen)
+    broker = ProgressBroker()
+    snapshots = [_progress("generating", 10)]
+
+    async def _load_progress(task_id):
+        return snapshots.pop(0) if len(snapshots) > 1 else snapshots[0]
+
+    monkeypatch.setattr(app_module, "get_progress_broker", lambda: broker)
+    monkeypatch.setattr(app_module, "_load_progress", _load_progress)
+    monkeypatch.setattr(app_module, "PROGRESS_STREAM_KEEPALIVE", 0.05)
+    return broker, snapshots
+
+
+async def _collect(updates):
+    return [update async for update in updates]
+
+
+def test_updates_follow_events_until_terminal_status(stream):
+    broker, snapshots = stream
+
+    def _publish():
+        broker.publish({"task_id": "t1", "status": "generating", "progress": 40, "current_step": "生成第2段"})
+        snapshots[0] = _progress("completed", 100, merged_video_url="m")
+
+    async def _run():
+        updates = app_module._progress_updates("t1")
+        first = await updates.__anext__()
+        _publish()
+        second = await updates.__anext__()
+        broker.publish({"task_id": "t1", "status": "completed", "progress": 100})
+        rest = await _collect(updates)
+        return [first, second] + rest
+
+    first, second, final = asyncio.run(_run())
+    assert (first.status, first.progress) == ("generating", 10)
+    assert (second.progress, second.current_step) == (40, "生成第2段")
+    assert second.message == "正在生成视频... (40%)"
+    # 终态读取完整结果后结束
+    assert final.status == "completed" and final.merged_video_url == "m"
+    assert broker._subscribers == {}
+
+
+def test_keepalive_and_fallback_read_when_no_events(stream):
+    broker, snapshots = stream
+    snapshots.extend([_progress("generating", 10), _progress("failed", 10, error_message="超时")])
+
+    updates = asyncio.run(_collect(app_module._progress_updates("t1")))
+    # 无事件：读库无变化时保活（None），读到终态后结束
+    assert updates[1] is None
+    assert updates[-1].status == "failed"
+    assert len(updates) == 3
+
+
+def test_stream_ends_after_max_duration(stream, monkeypatch):
+    monkeypatch.setattr(app_module, "PROGRESS_STREAM_MAX_SECONDS", 0.12)
+    updates = asyncio.run(asyncio.wait_for(_collect(app_module._progress_updates("t1")), timeout=2))
+    assert updates[0].progress == 10
+    assert all(update is None for update in updates[1:])
+    assert 2 <= len(updates) <= 4
+
+
+def test_terminal_snapshot_ends_stream_immediately(stream):
+    broker, snapshots = stream
+    snapshots[0] = _progress("completed", 100)
+    updates = asyncio.run(_collect(app_module._progress_updates("t1")))
+    assert [update.status for update in updates] == ["completed"]
+    assert broker._subscribers == {}
+
+
+def test_sse_formats_progress_and_keepalive(stream):
+    broker, snapshots = stream
+    snapshots.extend([_progress("generating", 10), _progress("completed", 100)])
+
+    async def _run():
+        response = await app_module.stream_progress("t1")
+        assert response.media_type == "text/event-stream"
+        return [chunk async for chunk in response.body_iterator]
+
+    chunks = asyncio.run(_run())
+    assert chunks[0].startswith("event: progress\ndata: {")
+    assert '"progress":10' in chunks[0]
+    assert chunks[1] == ": keepalive\n\n"
+    assert '"status":"completed"' in chunks[-1]
+
+
+def test_websocket_sends_keepalive_and_closes_on_terminal(stream):
+    broker, snapshots = stream
+    snapshots.extend([_progress("generating", 10), _progress("completed", 100)])
+
+    client = TestClient(app_module.app)
+    with client.websocket_connect("/ws/progress/t1") as websocket:
+        first = websocket.receive_json()
+        keepalive = websocket.receive_json()
+        final = websocket.receive_json()
+        assert websocket.receive()["type"] == "websocket.close"
+    assert first["progress"] == 10
+    assert keepalive == {"type": "keepalive"}
+    assert final["status"] == "completed"
+    assert broker._subscribers == {}
+
+
+def test_websocket_disconnect_stops_pushing(stream, monkeypatch):
+    broker, _ = stream
+    monkeypatch.setattr(app_module, "PROGRESS_STREAM_KEEPALIVE", 60)
+
+    client = TestClient(app_module.app)
+    with client.websocket_connect("/ws/progress/t1") as websocket:
+        assert websocket.receive_json()["progress"] == 10
+        assert "t1" in broker._subscribers
+        websocket.close()
+        # 客户端断开后服务端停止推送并退订，不等到保活或最长时长
+        deadline = time.monotonic() + 5
+        while broker._subscribers and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert broker._subscribers == {}
@@ -0,0 +1,206 @@
+"""
+视频生成任务执行
+API 后台任务与独立 worker 共用的视频生成流程
+"""
+import asyncio
+import json
+from typing import Optional
+
+from pydantic import BaseModel
+from langgraph.types import RunnableConfig
+
+from storage.database.progress_writer import get_progress_writer
+from storage.database.session import get_async_db_session
+from storage.database.video_task_manager import VideoTaskManager
+from tools.storage_upload_tool import abort_task_uploads
+from utils.file.scratch import get_scratch_space
+
+
+class RetryableTaskError(Exception):
+    """任务失败但可重试（如上传失败）：由队列 worker 放回队列，重试时从阶段检查点继续"""
+
+
+def discard_task_resume_state(task_id: str) -> None:
+    """任务最终失败后丢弃续传状态：中止保留的分片上传，删除任务目录中的中间文件"""
+    abort_task_uploads(task_id)
+    get_scratch_space().remove_task_dir(task_id)
+
+
+class VideoGenerateRequest(BaseModel):
+    product_name: str
+    theme: str = "品质保证"
+    duration: int = 20
+    type: str = "video"  # video 或 script
+    scenario: str = ""  # 使用场景描述
+    product_image_url: str = ""  # 产品图片URL
+    session_id: Optional[str] = None
+
+# 全局 Agent 实例
+_agent_instance = None
+
+def get_agent():
+    """获取或创建 Agent 实例（首次执行任务时才加载 Agent 依赖，worker 的队列逻辑不依赖它）"""
+    global _agent_instance
+    if _agent_instance is None:
+        from agents.agent import build_agent
+        _agent_instance = build_agent()
+    return _agent_instance
+
+async def process_video_generation_task(
+    task_id: str,
+    request: VideoGenerateRequest,
+    total_parts: int = 1,
+    lease_owner: Optional[str] = None
+):
+    """
+    后台处理视频生成任务
+
+    Args:
+        task_id: 任务ID
+        request: 视频生成请求
+        total_parts: 总段数
+        lease_owner: 由队列 worker 执行时为 worker ID；终态只在仍持有租约时写入，
+            租约已被其他 worker 接管时不覆盖其结果
+
+    Raises:
+        RetryableTaskError: 由队列 worker 执行且工具返回可重试的失败时抛出，不写入终态
+    """
+    progress_writer = get_progress_writer()
+
+    # 创建进度回调函数（在事件循环中调用；只记录最新进度，由写入器定期批量落库）
+    def progress_callback(progress: int, message: str):
+        """进度回调函数"""
+        progress_writer.report(task_id, progress, message)
+
+    async def finish_task(video_url: Optional[str], result_data: dict, content_text: str):
+        """写入最终任务状态"""
+        async with get_async_db_session() as db:
+            try:
+                mgr = VideoTaskManager()
+                if video_url:
+                    task = await mgr.mark_as_completed_async(db, task_id, result_data, lease_owner)
+                else:
+                    task = await mgr.mark_as_failed_async(
+                        db, task_id, f"无法从响应中提取视频 URL。响应内容：{content_text}", lease_owner)
+                if task is None and lease_owner:
+                    print(f"任务租约已丢失，不写入终态: {task_id}")
+            except Exception as e:
+                print(f"更新任务状态失败: {e}")
+                return
+        if not video_url and task is not None:
+            # 任务最终失败，不会再续传：立即中止保留的分片上传并删除任务目录
+            await asyncio.to_thread(discard_task_resume_state, task_id)
+
+    async def fail_task(error_message: str):
+        """标记任务失败"""
+        async with get_async_db_session() as db:
+            try:
+                mgr = VideoTaskManager()
+                task = await mgr.mark_as_failed_async(db, task_id, error_message, lease_owner)
+                if task is None and lease_owner:
+                    print(f"任务租约已丢失，不写入终态: {task_id}")
+            except Exception as e2:
+                print(f"标记任务失败时出错: {e2}")
+                return
+        if task is not None:
+            # 任务最终失败，不会再续传：立即中止保留的分片上传并删除任务目录
+            await asyncio.to_thread(discard_task_resume_state, task_id)
+
+    # 获取 Agent
+    agent = get_agent()
+
+    try:
+        # 更新状态为生成中
+        progress_callback(0, "开始生成视频...")
+
+        # 构造用户消息
+        prompt_parts = [f"请为{request.product_name}生成一个{request.theme}主题的宣传视频，时长{request.duration}秒"]
+        if request.scenario:
+            prompt_parts.append(f"，使用场景：{request.scenario}")
+        if request.product_image_url:
+            prompt_parts.append(f"，参考产品图片：{request.product_image_url}")
+        user_message = "".join(prompt_parts)
+
+        # 配置运行时参数
+        # task_id 供工具记录阶段检查点，任务重试时跳过已完成的阶段
+        config = RunnableConfig(
+            configurable={
+                "thread_id": request.session_id or "default",
+                "task_id": task_id
+            }
+        )
+
+        # 调用 Agent
+        response = await agent.ainvoke(
+            {"messages": [("user", user_message)]},
+            config=config
+        )
+
+        # 解析响应
+        video_url = None
+        video_url_part1 = None
+        video_url_part2 = None
+        merged_video_path = None
+        merged_video_url = None
+        video_urls = None
+        retry_error = None
+        content_text = ""
+
+        # 遍历所有消息，查找视频生成工具的结果
+        for msg in response["messages"]:
+            msg_content = msg.content if hasattr(msg, 'content') else str(msg)
+            content_text += str(msg_content)
+
+            # 尝试解析 JSON
+            if isinstance(msg_content, str) and msg_content.strip().startswith('{'):
+                try:
+                    response_data = json.loads(msg_content)
+                    if "video_url" in response_data:
+                        video_url = response_data.get("video_url")
+                        video_url_part1 = response_data.get("video_url_part1")
+                        video_url_part2 = response_data.get("video_url_part2")
+                        merged_video_path = response_data.get("merged_video_path")
+                        merged_video_url = response_data.get("merged_video_url")
+                        video_urls = response_data.get("video_urls")
+                        break
+                    if response_data.get("retryable"):
+                        retry_error = response_data.get("error")
+                except:
+                    pass
+
+        if not video_url and retry_error and lease_owner:
+            # 可重试的失败交给 worker 放回队列，保留检查点与续传状态
+            await progress_writer.drain(task_id)
+            raise RetryableTaskError(retry_error)
+
+        # 更新任务状态
+        result_data = {
+            "video_urls": video_urls or [video_url],
+            "merged_video_url": merged_video_url
+        }
+        # 终态立即写入（先丢弃尚未落库的进度）
+        await progress_writer.drain(task_id)
+        await finish_task(video_url, result_data, content_text)
+
+    except asyncio.CancelledError:
+        # 任务被取消（如服务关闭），进行中的方舟任务已由客户端取消
+        async def _cancel():
+            await progress_writer.drain(task_id)
+            await fail_task("任务已取消")
+        await asyncio.shield(_cancel())
+        raise
+    except RetryableTaskError:
+        raise
+    except Exception as e:
+        # 标记任务失败
+        await progress_writer.drain(task_id)
+        await fail_task(str(e))
+
+
+__all__ = [
+    "RetryableTaskError",
+    "VideoGenerateRequest",
+    "discard_task_resume_state",
+    "get_agent",
+    "process_video_generation_task",
+]
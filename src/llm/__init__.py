@@ -1,4 +1,11 @@
 """火山方舟 LLM 模块"""
 from .volcano_responses_llm import create_volcano_responses_llm, VolcanoResponsesLLM
+from .ark_video_client import ArkVideoClient, get_ark_video_client, close_ark_video_clients
 
-__all__ = ['create_volcano_responses_llm', 'VolcanoResponsesLLM']
+__all__ = [
+    'create_volcano_responses_llm',
+    'VolcanoResponsesLLM',
+    'ArkVideoClient',
+    'get_ark_video_client',
+    'close_ark_video_clients',
+]
@@ -0,0 +1,255 @@
+"""
+方舟生成任务集中轮询器
+进程内所有未完成的任务共用一个后台轮询协程：按预计完成时间自适应调整轮询间隔，
+并尽量通过任务列表接口批量查询，调用方通过 Future 获取任务结果
+"""
+import asyncio
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set
+
+# 单段视频的预计生成耗时（秒），会根据实际完成耗时动态修正
+DEFAULT_EXPECTED_DURATION = float(os.getenv("ARK_TASK_EXPECTED_SECONDS", "90"))
+
+# 轮询间隔边界（秒）
+MIN_POLL_INTERVAL = 2.0
+MAX_POLL_INTERVAL = 20.0
+POLL_JITTER = 0.2
+
+# 单次批量查询的最大任务数
+BATCH_SIZE = 50
+# 单任务查询的并发上限（批量接口不可用时使用）
+SINGLE_QUERY_CONCURRENCY = 10
+
+# 预计耗时的指数加权平均系数
+EXPECTED_DURATION_ALPHA = 0.2
+
+
+def next_poll_interval(elapsed: float, expected: float) -> float:
+    """
+    根据已等待时间与预计耗时计算下一次轮询间隔
+
+    - 预计完成前（< 60%）：间隔较长，最多 MAX_POLL_INTERVAL
+    - 接近预计完成时间（60% - 150%）：使用最短间隔
+    - 明显超出预计：逐步放慢
+    """
+    if elapsed < expected * 0.6:
+        interval = (expected * 0.6 - elapsed) / 2
+    elif elapsed <= expected * 1.5:
+        interval = MIN_POLL_INTERVAL
+    else:
+        interval = MIN_POLL_INTERVAL + (elapsed - expected * 1.5) / 10
+    interval = max(MIN_POLL_INTERVAL, min(interval, MAX_POLL_INTERVAL))
+    return interval * random.uniform(1 - POLL_JITTER, 1 + POLL_JITTER)
+
+
+@dataclass
+class _TrackedTask:
+    """被跟踪的任务"""
+    task_id: str
+    future: asyncio.Future
+    started_at: float
+    deadline: float
+    next_poll_at: float = field(default=0.0)
+    # 等待同一任务的调用方数量，最后一个离开时才停止跟踪
+    waiters: int = 1
+
+
+class ArkTaskPoller:
+    """
+    集中轮询器
+
+    Args:
+        client: 需提供 list_tasks(task_ids)、get_task(task_id)、cancel_task(task_id) 协程方法
+        parse_result: 将任务原始状态解析为结果字典的函数，进行中返回 None
+    """
+
+    def __init__(self, client: Any, parse_result: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]):
+        self._client = client
+        self._parse_result = parse_result
+        self._tasks: Dict[str, _TrackedTask] = {}
+        self._runner: Optional[asyncio.Task] = None
+        # 超时任务的服务端取消请求（持有引用，避免执行中被回收）
+        self._cancelling: Set[asyncio.Task] = set()
+        self._wakeup = asyncio.Event()
+        self._batch_supported = True
+        self._expected_duration = DEFAULT_EXPECTED_DURATION
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._tasks)
+
+    def track(self, task_id: str, max_wait_time: float = 300) -> asyncio.Future:
+        """
+        开始跟踪任务
+
+        同一任务被多次跟踪时返回同一个 Future，每次 track 需对应一次 untrack（或等到 Future 完成）。
+
+        Returns:
+            任务结束（成功/失败/超时）时完成的 Future，结果为结果字典
+        """
+        existing = self._tasks.get(task_id)
+        if existing is not None:
+            existing.waiters += 1
+            return existing.future
+
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        tracked = _TrackedTask(
+            task_id=task_id,
+            future=loop.create_future(),
+            started_at=now,
+            deadline=now + max_wait_time,
+        )
+        tracked.next_poll_at = now + next_poll_interval(0, self._expected_duration)
+        self._tasks[task_id] = tracked
+
+        if self._runner is None or self._runner.done():
+            self._runner = loop.create_task(self._run())
+        self._wakeup.set()
+        return tracked.future
+
+    def untrack(self, task_id: str) -> bool:
+        """
+        调用方不再关心任务结果时调用；仍有其他调用方等待时继续跟踪
+
+        Returns:
+            是否已停止跟踪（最后一个等待者离开，调用方可据此取消服务端任务）
+        """
+        tracked = self._tasks.get(task_id)
+        if tracked is None:
+            return False
+        tracked.waiters -= 1
+        if tracked.waiters > 0:
+            return False
+        del self._tasks[task_id]
+        if not tracked.future.done():
+            tracked.future.cancel()
+        return True
+
+    async def aclose(self) -> None:
+        """停止后台轮询并取消所有等待中的 Future"""
+        tasks, self._tasks = self._tasks, {}
+        for tracked in tasks.values():
+            if not tracked.future.done():
+                tracked.future.cancel()
+        if self._runner is not None and not self._runner.done():
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+        self._runner = None
+        if self._cancelling:
+            await asyncio.gather(*self._cancelling, return_exceptions=True)
+
+    async def _run(self) -> None:
+        """后台轮询主循环，没有待跟踪任务时退出"""
+        while self._tasks:
+            now = time.monotonic()
+            due = [t for t in self._tasks.values() if t.next_poll_at <= now]
+
+            if due:
+                await self._poll(due)
+
+            self._expire(time.monotonic())
+            if not self._tasks:
+                break
+
+            wait = min(t.next_poll_at for t in self._tasks.values()) - time.monotonic()
+            if wait > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _poll(self, due: List[_TrackedTask]) -> None:
+        """查询一批到期任务，并结算已结束的任务"""
+        statuses = await self._fetch_statuses([t.task_id for t in due])
+        now = time.monotonic()
+
+        for tracked in due:
+            if self._tasks.get(tracked.task_id) is not tracked:
+                continue
+            status_data = statuses.get(tracked.task_id)
+            result = self._parse_result(status_data) if status_data else None
+
+            if result is None:
+                tracked.next_poll_at = now + next_poll_interval(now - tracked.started_at, self._expected_duration)
+                continue
+
+            result["task_id"] = tracked.task_id
+            if result.get("status") == "succeeded":
+                self._observe_duration(now - tracked.started_at)
+            self._resolve(tracked, result)
+
+    async def _fetch_statuses(self, task_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        批量查询任务状态，批量接口不可用时退化为并发单任务查询；查询失败的任务不出现在结果中
+
+        批量查询结果中缺失的任务（过滤条件未生效、分页截断等）逐个补查。
+        """
+        statuses: Dict[str, Dict[str, Any]] = {}
+        missing = task_ids
+
+        if self._batch_supported:
+            try:
+                for i in range(0, len(task_ids), BATCH_SIZE):
+                    for item in await self._client.list_tasks(task_ids[i:i + BATCH_SIZE]):
+                        if item.get("id"):
+                            statuses[item["id"]] = item
+                missing = [task_id for task_id in task_ids if task_id not in statuses]
+                if not missing:
+                    return statuses
+            except Exception as e:
+                print(f"批量查询任务状态失败，改为逐个查询: {e}")
+                self._batch_supported = False
+                missing = [task_id for task_id in task_ids if task_id not in statuses]
+
+        semaphore = asyncio.Semaphore(SINGLE_QUERY_CONCURRENCY)
+
+        async def fetch_one(task_id: str) -> None:
+            async with semaphore:
+                try:
+                    statuses[task_id] = await self._client.get_task(task_id)
+                except Exception:
+                    # 网络抖动时等待下一轮
+                    pass
+
+        await asyncio.gather(*[fetch_one(task_id) for task_id in missing])
+        return statuses
+
+    def _expire(self, now: float) -> None:
+        """结算超时任务，并尝试取消服务端任务"""
+        for tracked in [t for t in self._tasks.values() if t.deadline <= now]:
+            self._resolve(tracked, {
+                "error": "视频生成超时",
+                "status": "timeout",
+                "task_id": tracked.task_id
+            })
+            cancelling = asyncio.get_running_loop().create_task(self._cancel_remote(tracked.task_id))
+            self._cancelling.add(cancelling)
+            cancelling.add_done_callback(self._cancelling.discard)
+
+    async def _cancel_remote(self, task_id: str) -> None:
+        try:
+            await self._client.cancel_task(task_id)
+        except Exception as e:
+            print(f"取消超时任务失败: {task_id}, {e}")
+
+    def _resolve(self, tracked: _TrackedTask, result: Dict[str, Any]) -> None:
+        self._tasks.pop(tracked.task_id, None)
+        if not tracked.future.done():
+            tracked.future.set_result(result)
+
+    def _observe_duration(self, duration: float) -> None:
+        """用实际完成耗时修正预计耗时"""
+        self._expected_duration = (
+            (1 - EXPECTED_DURATION_ALPHA) * self._expected_duration + EXPECTED_DURATION_ALPHA * duration
+        )
+
+
+__all__ = ["ArkTaskPoller", "next_poll_interval"]
@@ -0,0 +1,257 @@
+"""
+火山方舟视频生成任务异步客户端
+基于 httpx.AsyncClient 连接池：任务创建、集中轮询（见 ark_task_poller）、取消
+"""
+import asyncio
+import os
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from .ark_task_poller import ArkTaskPoller
+
+ARK_BASE_URL = os.getenv("ARK_BASE_URL", "https://ark.cn-beijing.volces.com/api/v3")
+DEFAULT_VIDEO_MODEL = "doubao-seedance-1-5-pro-251215"
+
+
+def get_video_api_key() -> str:
+    """获取视频生成 API 密钥"""
+    return os.getenv("ARK_VIDEO_API_KEY") or "39bf20d0-55b5-4957-baa1-02f4529a3076"
+
+
+def parse_task_result(status_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    解析任务状态
+
+    Returns:
+        任务结束时返回结果字典（与原 generate_video_internal 返回结构一致），仍在进行中返回 None
+    """
+    task_id = status_data.get("id")
+
+    if status_data.get("error"):
+        return {
+            "error": f"视频生成失败: {status_data.get('error', {}).get('message')}",
+            "status": "failed",
+            "task_id": task_id
+        }
+
+    status = status_data.get("status")
+
+    if status == "succeeded":
+        return {
+            "success": True,
+            "video_url": status_data.get("content", {}).get("video_url"),
+            "status": "succeeded",
+            "task_id": task_id,
+            "model": status_data.get("model")
+        }
+    elif status in ["failed", "cancelled"]:
+        return {
+            "error": f"视频生成任务{status}",
+            "status": status,
+            "task_id": task_id
+        }
+    elif status in ["queued", "running", None]:
+        return None
+    return {
+        "error": f"视频生成状态未知: {status}",
+        "status": "unknown",
+        "task_id": task_id
+    }
+
+
+class ArkVideoClient:
+    """火山方舟视频生成任务异步客户端（同一事件循环内共享连接池）"""
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = ARK_BASE_URL,
+        max_connections: int = 100,
+        timeout: float = 60.0
+    ):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": "Bearer " + api_key
+            },
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=20),
+        )
+        self.poller = ArkTaskPoller(self, parse_task_result)
+
+    async def __aenter__(self) -> "ArkVideoClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    @property
+    def is_closed(self) -> bool:
+        return self._client.is_closed
+
+    async def aclose(self) -> None:
+        """停止轮询并关闭连接池"""
+        await self.poller.aclose()
+        await self._client.aclose()
+
+    async def create_task(self, prompt: str, image_url: str = "", model: str = DEFAULT_VIDEO_MODEL) -> str:
+        """
+        提交视频生成任务（不等待结果）
+
+        Returns:
+            任务ID
+
+        Raises:
+            httpx.HTTPError: 请求失败
+            ValueError: 未返回任务ID
+        """
+        content_items: List[Dict[str, Any]] = [
+            {"type": "text", "text": prompt}
+        ]
+        if image_url:
+            content_items.append({
+                "type": "image_url",
+                "image_url": {"url": image_url}
+            })
+
+        response = await self._client.post(
+            "/contents/generations/tasks",
+            json={"model": model, "content": content_items}
+        )
+        response.raise_for_status()
+        task_id = response.json().get("id")
+        if not task_id:
+            raise ValueError("视频生成任务创建失败，未返回任务ID")
+        return task_id
+
+    async def get_task(self, task_id: str) -> Dict[str, Any]:
+        """查询单个任务的原始状态"""
+        response = await self._client.get(f"/contents/generations/tasks/{task_id}", timeout=30.0)
+        response.raise_for_status()
+        return response.json()
+
+    async def list_tasks(self, task_ids: List[str]) -> List[Dict[str, Any]]:
+        """批量查询任务状态（任务列表接口，按任务ID过滤）"""
+        params = [("page_num", 1), ("page_size", len(task_ids))]
+        params.extend(("filter.task_ids", task_id) for task_id in task_ids)
+        response = await self._client.get("/contents/generations/tasks", params=params, timeout=30.0)
+        response.raise_for_status()
+        return response.json().get("items") or []
+
+    async def cancel_task(self, task_id: str) -> bool:
+        """取消任务（仅排队中的任务可被服务端取消），失败时返回 False"""
+        try:
+            response = await self._client.delete(f"/contents/generations/tasks/{task_id}", timeout=10.0)
+            return response.status_code < 400
+        except httpx.HTTPError as e:
+            print(f"取消视频生成任务失败 {task_id}: {e}")
+            return False
+
+    async def wait_for_task(self, task_id: str, max_wait_time: float = 300) -> Dict[str, Any]:
+        """
+        等待任务结束
+
+        任务交给集中轮询器统一查询；协程被取消时停止跟踪，没有其他协程等待同一任务时尝试取消服务端任务，
+        等待超时时轮询器同样会取消服务端任务。
+
+        Returns:
+            结果字典
+        """
+        future = self.poller.track(task_id, max_wait_time=max_wait_time)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if self.poller.untrack(task_id):
+                await asyncio.shield(self.cancel_task(task_id))
+            raise
+
+    async def generate_video(
+        self,
+        prompt: str,
+        image_url: str = "",
+        model: str = DEFAULT_VIDEO_MODEL,
+        max_wait_time: float = 300
+    ) -> Dict[str, Any]:
+        """
+        提交任务并等待结果
+
+        Returns:
+            结果字典：成功时包含 success/video_url/status/task_id，失败时包含 error/status
+        """
+        try:
+            task_id = await self.create_task(prompt, image_url=image_url, model=model)
+        except httpx.HTTPStatusError as e:
+            return {
+                "error": f"HTTP错误: {e.response.status_code} - {e.response.text}",
+                "status": "failed"
+            }
+        except Exception as e:
+            return {
+                "error": f"视频生成失败: {str(e)}",
+                "status": "failed"
+            }
+        return await self.wait_for_task(task_id, max_wait_time=max_wait_time)
+
+    async def generate_videos(
+        self,
+        segments: List[Dict[str, str]],
+        model: str = DEFAULT_VIDEO_MODEL,
+        max_wait_time: float = 300
+    ) -> List[Dict[str, Any]]:
+        """
+        并发生成多段视频：全部同时提交、同时轮询
+
+        Args:
+            segments: 分段列表，每项包含 prompt 和可选的 image_url
+
+        Returns:
+            与 segments 顺序一致的结果列表
+        """
+        return list(await asyncio.gather(*[
+            self.generate_video(
+                seg["prompt"],
+                image_url=seg.get("image_url", ""),
+                model=model,
+                max_wait_time=max_wait_time
+            )
+            for seg in segments
+        ]))
+
+
+# 每个事件循环、每个 API 密钥共享一个客户端（连接池不能跨事件循环复用）
+_clients: Dict[tuple, ArkVideoClient] = {}
+
+
+def get_ark_video_client(api_key: Optional[str] = None) -> ArkVideoClient:
+    """获取当前事件循环内共享的视频生成客户端（必须在协程中调用）"""
+    loop = asyncio.get_running_loop()
+    api_key = api_key or get_video_api_key()
+    cache_key = (id(loop), api_key)
+
+    client = _clients.get(cache_key)
+    if client is None or client.is_closed:
+        client = ArkVideoClient(api_key)
+        _clients[cache_key] = client
+    return client
+
+
+async def close_ark_video_clients() -> None:
+    """关闭当前事件循环内的所有共享客户端（应用退出时调用）"""
+    loop_id = id(asyncio.get_running_loop())
+    for cache_key in [k for k in _clients if k[0] == loop_id]:
+        await _clients.pop(cache_key).aclose()
+
+
+__all__ = [
+    "ARK_BASE_URL",
+    "DEFAULT_VIDEO_MODEL",
+    "ArkVideoClient",
+    "get_ark_video_client",
+    "close_ark_video_clients",
+    "get_video_api_key",
+    "parse_task_result",
+]
@@ -0,0 +1,176 @@
+"""
+方舟任务集中轮询器测试：自适应轮询间隔、批量查询与逐个补查、超时结算并取消服务端任务、
+多个调用方等待同一任务时只有最后一个离开才停止跟踪
+服务端接口替换为内存中的任务状态，不需要网络
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+# 添加src目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+pytest.importorskip("httpx")
+
+from llm import ark_task_poller
+from llm.ark_task_poller import MAX_POLL_INTERVAL, MIN_POLL_INTERVAL, ArkTaskPoller, next_poll_interval
+from llm.ark_video_client import ArkVideoClient, parse_task_result
+
+
+class _Server:
+    """内存中的任务状态，记录收到的请求"""
+
+    def __init__(self, batch: bool = True):
+        self.statuses = {}
+        self.calls = []
+        self._batch = batch
+
+    async def list_tasks(self, task_ids):
+        self.calls.append(("list", tuple(task_ids)))
+        if not self._batch:
+            raise RuntimeError("404")
+        # 模拟过滤条件未生效、结果截断：只返回第一个
+        return [dict(self.statuses.get(task_id, {}), id=task_id) for task_id in task_ids[:1]]
+
+    async def get_task(self, task_id):
+        self.calls.append(("get", task_id))
+        return dict(self.statuses.get(task_id, {}), id=task_id)
+
+    async def cancel_task(self, task_id):
+        self.calls.append(("cancel", task_id))
+        return True
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    """轮询间隔缩短为 10ms"""
+    monkeypatch.setattr(ark_task_poller, "next_poll_interval", lambda elapsed, expected: 0.01)
+
+
+def test_next_poll_interval_follows_expected_duration(monkeypatch):
+    monkeypatch.setattr(ark_task_poller.random, "uniform", lambda low, high: 1.0)
+    # 远未到预计完成时间：长间隔，不超过上限
+    assert next_poll_interval(0, 90) == MAX_POLL_INTERVAL
+    assert next_poll_interval(30, 90) == 12
+    # 接近预计完成时间：最短间隔
+    assert next_poll_interval(60, 90) == MIN_POLL_INTERVAL
+    assert next_poll_interval(130, 90) == MIN_POLL_INTERVAL
+    # 明显超出预计：逐步放慢
+    assert next_poll_interval(200, 90) == pytest.approx(MIN_POLL_INTERVAL + 6.5)
+    assert next_poll_interval(10_000, 90) == MAX_POLL_INTERVAL
+
+
+def test_next_poll_interval_jitter_stays_within_bounds():
+    for elapsed in (0, 60, 200):
+        interval = next_poll_interval(elapsed, 90)
+        assert MIN_POLL_INTERVAL * 0.8 <= interval <= MAX_POLL_INTERVAL * 1.2
+
+
+def test_batch_query_with_missing_items_falls_back_per_task():
+    server = _Server()
+    server.statuses = {"a": {"status": "succeeded", "content": {"video_url": "va"}},
+                       "b": {"status": "failed"}}
+
+    async def _run():
+        poller = ArkTaskPoller(server, parse_task_result)
+        results = await asyncio.gather(poller.track("a"), poller.track("b"))
+        await poller.aclose()
+        return results
+
+    a, b = asyncio.run(_run())
+    assert a["video_url"] == "va" and a["task_id"] == "a"
+    assert b["status"] == "failed"
+    # 一次批量查询两个任务，结果中缺失的 b 逐个补查
+    assert server.calls == [("list", ("a", "b")), ("get", "b")]
+
+
+def test_batch_failure_switches_to_single_queries():
+    server = _Server(batch=False)
+    server.statuses = {"a": {"status": "running"}}
+
+    async def _run():
+        poller = ArkTaskPoller(server, parse_task_result)
+        future = poller.track("a")
+        await asyncio.sleep(0.05)
+        server.statuses["a"] = {"status": "succeeded", "content": {"video_url": "va"}}
+        result = await future
+        await poller.aclose()
+        return poller, result
+
+    poller, result = asyncio.run(_run())
+    assert result["status"] == "succeeded"
+    assert not poller._batch_supported
+    # 批量接口只尝试一次
+    assert [call[0] for call in server.calls].count("list") == 1
+
+
+def test_timeout_resolves_and_cancels_remote_task():
+    server = _Server()
+    server.statuses = {"a": {"status": "queued"}}
+
+    async def _run():
+        poller = ArkTaskPoller(server, parse_task_result)
+        result = await poller.track("a", max_wait_time=0.05)
+        await poller.aclose()
+        return poller, result
+
+    poller, result = asyncio.run(_run())
+    assert result == {"error": "视频生成超时", "status": "timeout", "task_id": "a"}
+    assert ("cancel", "a") in server.calls
+    assert poller.pending_count == 0
+
+
+def test_shared_task_keeps_polling_until_last_waiter_leaves():
+    server = _Server()
+    server.statuses = {"a": {"status": "running"}}
+
+    async def _run():
+        client = ArkVideoClient("test-key")
+        client.list_tasks = server.list_tasks
+        client.get_task = server.get_task
+        client.cancel_task = server.cancel_task
+
+        first = asyncio.create_task(client.wait_for_task("a"))
+        second = asyncio.create_task(client.wait_for_task("a"))
+        await asyncio.sleep(0.02)
+
+        # 一个等待者离开：不取消共享的 Future，也不取消服务端任务
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        assert client.poller.pending_count == 1
+        assert ("cancel", "a") not in server.calls
+
+        server.statuses["a"] = {"status": "succeeded", "content": {"video_url": "va"}}
+        result = await second
+        await client.aclose()
+        return result
+
+    result = asyncio.run(_run())
+    assert result["video_url"] == "va"
+    assert ("cancel", "a") not in server.calls
+
+
+def test_last_waiter_leaving_cancels_remote_task():
+    server = _Server()
+    server.statuses = {"a": {"status": "running"}}
+
+    async def _run():
+        client = ArkVideoClient("test-key")
+        client.list_tasks = server.list_tasks
+        client.get_task = server.get_task
+        client.cancel_task = server.cancel_task
+
+        waiters = [asyncio.create_task(client.wait_for_task("a")) for _ in range(2)]
+        await asyncio.sleep(0.02)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        pending = client.poller.pending_count
+        await client.aclose()
+        return pending
+
+    assert asyncio.run(_run()) == 0
+    assert server.calls.count(("cancel", "a")) == 1
@@ -201,7 +201,7 @@ async def generate_video(request: VideoRequest):
     """
     try:
         # 调用工具生成视频
-        result = generate_miniprogram_video.invoke({
+        result = await generate_miniprogram_video.ainvoke({
             "script": request.script,
             "product_name": request.product_name,
             "product_image_url": request.product_image_url,
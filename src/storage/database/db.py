@@ -1,12 +1,23 @@
+import asyncio
 import os
+import re
+import threading
 import time
+from typing import Dict, Optional, Tuple
 from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import OperationalError
+from storage.workload_identity import get_workload_identity
 import logging
 logger = logging.getLogger(__name__)
 
 MAX_RETRY_TIME = 20  # 连接最大重试时间（秒）
+# 引擎创建失败后的冷却时间（秒）：期间直接报错，不再每次调用都等待 MAX_RETRY_TIME
+ENGINE_FAILURE_COOLDOWN = float(os.getenv("DB_ENGINE_FAILURE_COOLDOWN_SECONDS", "60"))
+# 异步引擎连接池（每个事件循环一个引擎，即每个 API/worker 进程一个）
+ASYNC_POOL_SIZE = int(os.getenv("DB_ASYNC_POOL_SIZE", "10"))
+ASYNC_MAX_OVERFLOW = int(os.getenv("DB_ASYNC_MAX_OVERFLOW", "10"))
 # Load environment variables from .env if present
 try:
     from dotenv import load_dotenv
@@ -22,14 +33,10 @@ def get_db_url() -> str:
     
     # 可选：尝试从 coze_workload_identity 获取（如果可用）
     try:
-        from coze_workload_identity import Client
-        client = Client()
-        env_vars = client.get_project_env_vars()
-        client.close()
-        for env_var in env_vars:
-            if env_var.key == "PGDATABASE_URL":
-                url = env_var.value.replace("'", "'\\''")
-                return url
+        value = get_workload_identity().get_env_var("PGDATABASE_URL")
+        if value:
+            url = value.replace("'", "'\\''")
+            return url
     except ImportError:
         logger.debug("coze_workload_identity not available, using only environment variables")
     except Exception as e:
@@ -40,6 +47,9 @@ def get_db_url() -> str:
     return url
 _engine = None
 _SessionLocal = None
+_engine_lock = threading.Lock()
+# 最近一次引擎创建失败：(时间, 错误)
+_engine_failure: Optional[Tuple[float, Exception]] = None
 
 def _create_engine_with_retry():
     url = get_db_url()
@@ -85,9 +95,19 @@ def _create_engine_with_retry():
     raise last_error  # pyright: ignore [reportGeneralTypeIssues]
 
 def get_engine():
-    global _engine
+    """获取同步引擎；创建失败后 ENGINE_FAILURE_COOLDOWN 秒内直接抛出，不重复等待连接重试"""
+    global _engine, _engine_failure
     if _engine is None:
-        _engine = _create_engine_with_retry()
+        with _engine_lock:
+            if _engine is None:
+                if _engine_failure is not None and time.monotonic() - _engine_failure[0] < ENGINE_FAILURE_COOLDOWN:
+                    raise RuntimeError(f"Database unavailable (retry after cooldown): {_engine_failure[1]}")
+                try:
+                    _engine = _create_engine_with_retry()
+                except Exception as e:
+                    _engine_failure = (time.monotonic(), e)
+                    raise
+                _engine_failure = None
     return _engine
 
 def get_sessionmaker():
@@ -99,9 +119,67 @@ def get_sessionmaker():
 def get_session():
     return get_sessionmaker()()
 
+def get_async_db_url() -> str:
+    """异步引擎使用的数据库 URL（驱动替换为 psycopg 3 异步驱动）"""
+    url = get_db_url()
+    if url is None or url == "":
+        logger.error("PGDATABASE_URL is not set")
+        raise ValueError("PGDATABASE_URL is not set")
+    return re.sub(r"^(postgres|postgresql)(\+\w+)?://", "postgresql+psycopg://", url)
+
+# 异步引擎的连接绑定创建时的事件循环，按事件循环分别创建
+_async_engines: Dict[int, AsyncEngine] = {}
+_async_sessionmakers: Dict[int, async_sessionmaker] = {}
+
+def get_async_engine() -> AsyncEngine:
+    """获取当前事件循环的异步引擎（必须在协程中调用）"""
+    loop_id = id(asyncio.get_running_loop())
+    engine = _async_engines.get(loop_id)
+    if engine is None:
+        # 连接池参数与同步引擎一致，连接数可通过 DB_ASYNC_POOL_SIZE / DB_ASYNC_MAX_OVERFLOW 按进程调整
+        engine = create_async_engine(
+            get_async_db_url(),
+            pool_size=ASYNC_POOL_SIZE,
+            max_overflow=ASYNC_MAX_OVERFLOW,
+            pool_pre_ping=True,
+            pool_recycle=1800,
+            pool_timeout=30,
+            connect_args={
+                "connect_timeout": 5,
+                "options": "-c statement_timeout=30000"
+            },
+        )
+        _async_engines[loop_id] = engine
+    return engine
+
+def get_async_sessionmaker() -> async_sessionmaker:
+    """获取当前事件循环的异步会话工厂（提交后不过期对象，提交后仍可读取属性）"""
+    loop_id = id(asyncio.get_running_loop())
+    factory = _async_sessionmakers.get(loop_id)
+    if factory is None:
+        factory = async_sessionmaker(get_async_engine(), autoflush=False, expire_on_commit=False)
+        _async_sessionmakers[loop_id] = factory
+    return factory
+
+def get_async_session():
+    return get_async_sessionmaker()()
+
+async def close_async_engine() -> None:
+    """关闭当前事件循环的异步引擎连接池（应用退出时调用）"""
+    loop_id = id(asyncio.get_running_loop())
+    _async_sessionmakers.pop(loop_id, None)
+    engine = _async_engines.pop(loop_id, None)
+    if engine is not None:
+        await engine.dispose()
+
 __all__ = [
     "get_db_url",
     "get_engine",
     "get_sessionmaker",
     "get_session",
+    "get_async_db_url",
+    "get_async_engine",
+    "get_async_sessionmaker",
+    "get_async_session",
+    "close_async_engine",
 ]
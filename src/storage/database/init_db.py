@@ -9,7 +9,8 @@ def init_db():
     """
     初始化数据库表
     
-    创建 video_generation_tasks 表（如果不存在）
+    创建 video_generation_tasks 表（如果不存在），并补齐任务队列与检查点字段；
+    创建上传去重索引表 stored_contents 与进度通知触发器
     """
     engine = get_engine()
     
@@ -41,6 +42,54 @@ def init_db():
     CREATE INDEX IF NOT EXISTS idx_video_tasks_session_id ON video_generation_tasks(session_id);
     CREATE INDEX IF NOT EXISTS idx_video_tasks_status ON video_generation_tasks(status);
     CREATE INDEX IF NOT EXISTS idx_video_tasks_created_at ON video_generation_tasks(created_at DESC);
+
+    -- 任务队列与阶段检查点字段（兼容已存在的表）
+    ALTER TABLE video_generation_tasks ADD COLUMN IF NOT EXISTS request_payload JSON;
+    ALTER TABLE video_generation_tasks ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0;
+    ALTER TABLE video_generation_tasks ADD COLUMN IF NOT EXISTS lease_owner VARCHAR(128);
+    ALTER TABLE video_generation_tasks ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP WITH TIME ZONE;
+    ALTER TABLE video_generation_tasks ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP WITH TIME ZONE;
+    ALTER TABLE video_generation_tasks ADD COLUMN IF NOT EXISTS stage_checkpoints JSON;
+    CREATE INDEX IF NOT EXISTS idx_video_tasks_queue ON video_generation_tasks(status, lease_expires_at)
+        WHERE request_payload IS NOT NULL;
+
+    -- 按内容哈希去重的已上传对象索引
+    CREATE TABLE IF NOT EXISTS stored_contents (
+        content_hash VARCHAR(64) NOT NULL,
+        bucket VARCHAR(255) NOT NULL,
+        object_key TEXT NOT NULL,
+        size BIGINT NOT NULL,
+        content_type VARCHAR(255),
+        hit_count INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+        last_used_at TIMESTAMP WITH TIME ZONE,
+        PRIMARY KEY (content_hash, bucket)
+    );
+
+    -- 进度、状态变化时通知订阅者（/api/progress/{task_id}/stream、/ws/progress/{task_id}），事务提交后投递
+    CREATE OR REPLACE FUNCTION notify_video_task_progress() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('video_task_progress', json_build_object(
+            'task_id', NEW.task_id,
+            'status', NEW.status,
+            'progress', NEW.progress,
+            'current_step', NEW.current_step,
+            'completed_parts', NEW.completed_parts,
+            'total_parts', NEW.total_parts
+        )::text);
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS trg_video_task_progress ON video_generation_tasks;
+    CREATE TRIGGER trg_video_task_progress
+        AFTER UPDATE ON video_generation_tasks
+        FOR EACH ROW
+        WHEN (OLD.status IS DISTINCT FROM NEW.status
+              OR OLD.progress IS DISTINCT FROM NEW.progress
+              OR OLD.current_step IS DISTINCT FROM NEW.current_step
+              OR OLD.completed_parts IS DISTINCT FROM NEW.completed_parts)
+        EXECUTE FUNCTION notify_video_task_progress();
     """
     
     try:
@@ -0,0 +1,115 @@
+"""
+任务进度读缓存
+进程内按 task_id 缓存进度查询结果（TTL + LRU），轮询 /api/progress 时直接从内存返回；
+本进程写入任务（VideoTaskManager、任务队列、进度通知）时失效对应条目。
+进行中的任务只缓存很短时间，以此限定其他进程写入后本进程读到旧值的时长；已结束的任务不再变化，长时间缓存。
+"""
+import itertools
+import os
+import threading
+import time
+from typing import Any, Optional
+
+from cachetools import LRUCache, TLRUCache
+
+# 最多缓存的任务数
+DEFAULT_CACHE_SIZE = int(os.getenv("TASK_PROGRESS_CACHE_SIZE", "10000"))
+# 进行中任务的缓存时长（秒）
+DEFAULT_ACTIVE_TTL = float(os.getenv("TASK_PROGRESS_CACHE_TTL_SECONDS", "2"))
+# 已结束任务的缓存时长（秒）
+DEFAULT_FINISHED_TTL = float(os.getenv("TASK_PROGRESS_CACHE_FINISHED_TTL_SECONDS", "3600"))
+
+
+class TaskProgressCache:
+    """
+    任务进度缓存（线程安全）
+
+    读取数据库前用 version() 取版本号，写入缓存时带上；期间该任务被失效过则放弃写入，
+    避免读库与写库交错时把旧值放回缓存。
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_CACHE_SIZE, active_ttl: float = DEFAULT_ACTIVE_TTL,
+                 finished_ttl: float = DEFAULT_FINISHED_TTL):
+        self.active_ttl = active_ttl
+        self.finished_ttl = finished_ttl
+        # 值为 (是否已结束, 缓存内容)
+        self._entries = TLRUCache(maxsize=maxsize, ttu=self._expires_at, timer=time.monotonic)
+        # 最近失效过的任务 -> 失效序号
+        self._versions = LRUCache(maxsize=maxsize)
+        # 最近一次 clear 的序号：所有任务的版本号不小于它
+        self._cleared = 0
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _expires_at(self, task_id: str, entry: tuple, now: float) -> float:
+        return now + (self.finished_ttl if entry[0] else self.active_ttl)
+
+    def get(self, task_id: str) -> Optional[Any]:
+        """读取缓存，不存在或已过期时返回 None"""
+        with self._lock:
+            entry = self._entries.get(task_id)
+        return None if entry is None else entry[1]
+
+    def _version(self, task_id: str) -> int:
+        return max(self._versions.get(task_id, 0), self._cleared)
+
+    def version(self, task_id: str) -> int:
+        """当前版本号（读数据库前调用）"""
+        with self._lock:
+            return self._version(task_id)
+
+    def put(self, task_id: str, value: Any, finished: bool = False, version: Optional[int] = None) -> bool:
+        """
+        写入缓存
+
+        Args:
+            task_id: 任务ID
+            value: 缓存内容
+            finished: 任务是否已结束（决定缓存时长）
+            version: 读数据库前取得的版本号；与当前版本不一致时不写入
+
+        Returns:
+            是否写入
+        """
+        with self._lock:
+            if version is not None and self._version(task_id) != version:
+                return False
+            self._entries[task_id] = (finished, value)
+            return True
+
+    def invalidate(self, *task_ids: str) -> None:
+        """失效指定任务的缓存"""
+        with self._lock:
+            for task_id in task_ids:
+                self._entries.pop(task_id, None)
+                self._versions[task_id] = next(self._counter)
+
+    def clear(self) -> None:
+        """失效全部缓存（无法确定受影响的任务时调用）"""
+        with self._lock:
+            # 推进所有任务的版本（包括从未缓存过的任务），正在读库的请求不会写回
+            self._cleared = next(self._counter)
+            self._entries.clear()
+
+
+_cache: Optional[TaskProgressCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_progress_cache() -> TaskProgressCache:
+    """获取进程内共享的任务进度缓存"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TaskProgressCache()
+    return _cache
+
+
+def invalidate_task_progress(*task_ids: str) -> None:
+    """失效任务进度缓存（写入任务后调用）"""
+    if task_ids:
+        get_progress_cache().invalidate(*task_ids)
+
+
+__all__ = ["TaskProgressCache", "get_progress_cache", "invalidate_task_progress"]
@@ -0,0 +1,170 @@
+"""
+任务进度事件推送
+进程内发布/订阅：本进程的进度写入器直接发布，其他进程（worker）的更新通过 Postgres LISTEN/NOTIFY 送达。
+video_generation_tasks 上的触发器在进度、状态变化时 pg_notify，事务提交后才投递；
+每个进程只持有一个 LISTEN 连接，无论有多少客户端订阅。
+"""
+import asyncio
+import json
+import os
+import re
+from typing import Any, Dict, Optional, Set
+
+from storage.database.db import get_db_url
+from storage.database.progress_cache import invalidate_task_progress
+import logging
+logger = logging.getLogger(__name__)
+
+# 与 init_db 中触发器使用的通道名一致
+PROGRESS_CHANNEL = "video_task_progress"
+# LISTEN 连接断开后的重连间隔（秒）
+LISTEN_RETRY_SECONDS = float(os.getenv("TASK_PROGRESS_LISTEN_RETRY_SECONDS", "5"))
+
+# 终态：推送后订阅结束
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+class ProgressSubscription:
+    """单个订阅：只保留最新一条事件，慢客户端跳过中间进度而不是积压"""
+
+    def __init__(self, broker: "ProgressBroker", task_id: str):
+        self.task_id = task_id
+        self._broker = broker
+        self._latest: Optional[Dict[str, Any]] = None
+        self._ready = asyncio.Event()
+
+    def _offer(self, event: Dict[str, Any]) -> None:
+        self._latest = event
+        self._ready.set()
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """等待下一条事件；超时返回 None"""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self._ready.clear()
+        event, self._latest = self._latest, None
+        return event
+
+    def close(self) -> None:
+        self._broker._unsubscribe(self)
+
+    def __enter__(self) -> "ProgressSubscription":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class ProgressBroker:
+    """进程内进度事件分发（绑定创建它的事件循环）"""
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[ProgressSubscription]] = {}
+        # 每个任务最近一次分发的 (status, progress, current_step)，用于丢弃本地与 NOTIFY 重复的事件
+        self._last: Dict[str, tuple] = {}
+        self._listener: Optional[asyncio.Task] = None
+
+    def subscribe(self, task_id: str) -> ProgressSubscription:
+        subscription = ProgressSubscription(self, task_id)
+        self._subscribers.setdefault(task_id, set()).add(subscription)
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+        return subscription
+
+    def _unsubscribe(self, subscription: ProgressSubscription) -> None:
+        subscribers = self._subscribers.get(subscription.task_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            self._subscribers.pop(subscription.task_id, None)
+            self._last.pop(subscription.task_id, None)
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        """分发事件（没有订阅者时直接丢弃）；event 至少包含 task_id"""
+        task_id = event.get("task_id")
+        # 其他进程写入的变化经 NOTIFY 到达，同时失效本进程的进度缓存
+        if event.get("status") is not None:
+            invalidate_task_progress(task_id)
+        subscribers = self._subscribers.get(task_id)
+        if not subscribers:
+            return
+        last = self._last.get(task_id)
+        # 本进程写入器发布的事件不含状态，沿用最近一次的状态
+        if event.get("status") is None and last is not None:
+            event = dict(event, status=last[0])
+        signature = (event.get("status"), event.get("progress"), event.get("current_step"))
+        if last == signature:
+            return
+        # 进度只增不减：乱序到达的较小进度丢弃（状态变化除外）
+        if last is not None and last[0] == signature[0] and (signature[1] or 0) < (last[1] or 0):
+            return
+        self._last[task_id] = signature
+        for subscription in list(subscribers):
+            subscription._offer(event)
+
+    async def _listen(self) -> None:
+        """LISTEN 进度通道并转发通知；有订阅者期间断线重连，全部退订后退出"""
+        import psycopg
+
+        # get_db_url 可能同步读取配置/请求凭证，不在事件循环线程中执行
+        db_url = await asyncio.to_thread(get_db_url)
+        conninfo = re.sub(r"^postgresql\+\w+://", "postgresql://", db_url or "")
+        while self._subscribers:
+            try:
+                async with await psycopg.AsyncConnection.connect(conninfo, autocommit=True) as conn:
+                    await conn.execute(f"LISTEN {PROGRESS_CHANNEL}")
+                    logger.info(f"Listening on {PROGRESS_CHANNEL}")
+                    async for notify in conn.notifies():
+                        try:
+                            self.publish(json.loads(notify.payload))
+                        except ValueError:
+                            logger.warning(f"Invalid progress notification: {notify.payload}")
+                        if not self._subscribers:
+                            return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Progress listener disconnected, retry in {LISTEN_RETRY_SECONDS}s: {e}")
+                await asyncio.sleep(LISTEN_RETRY_SECONDS)
+
+    async def aclose(self) -> None:
+        if self._listener is not None and not self._listener.done():
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+        self._listener = None
+
+
+_brokers: Dict[int, ProgressBroker] = {}
+
+
+def get_progress_broker() -> ProgressBroker:
+    """获取当前事件循环内共享的进度事件分发器（必须在协程中调用）"""
+    loop_id = id(asyncio.get_running_loop())
+    broker = _brokers.get(loop_id)
+    if broker is None:
+        broker = ProgressBroker()
+        _brokers[loop_id] = broker
+    return broker
+
+
+async def close_progress_broker() -> None:
+    """停止当前事件循环内的 LISTEN 连接（应用退出时调用）"""
+    broker = _brokers.pop(id(asyncio.get_running_loop()), None)
+    if broker is not None:
+        await broker.aclose()
+
+
+__all__ = [
+    "PROGRESS_CHANNEL",
+    "TERMINAL_STATUSES",
+    "ProgressBroker",
+    "ProgressSubscription",
+    "get_progress_broker",
+    "close_progress_broker",
+]
@@ -0,0 +1,122 @@
+"""
+任务进度合并写入
+进度回调只更新内存中每个任务的最新进度，后台协程每隔固定时间把所有任务的进度合并为一条多行 UPDATE 写入；
+终态（完成/失败）由调用方立即写入，写入前先丢弃该任务未写入的进度并等待进行中的批量写入完成
+"""
+import asyncio
+import os
+from typing import Dict, Optional, Tuple
+
+from storage.database.progress_events import get_progress_broker
+from storage.database.session import get_async_db_session
+from storage.database.video_task_manager import VideoTaskManager
+import logging
+logger = logging.getLogger(__name__)
+
+# 进度批量写入间隔（毫秒）
+DEFAULT_FLUSH_INTERVAL_MS = int(os.getenv("TASK_PROGRESS_FLUSH_MS", "500"))
+
+
+async def _write_batch(updates: Dict[str, Tuple[int, Optional[str]]]) -> int:
+    async with get_async_db_session() as db:
+        return await VideoTaskManager().update_progress_batch_async(db, updates)
+
+
+class ProgressWriter:
+    """
+    进度合并写入器（绑定创建它的事件循环）
+
+    数据库写入次数与运行时长成正比，与回调次数无关：两次写入之间同一任务的多次进度只保留最新（最大）一次，
+    所有任务合并为一条语句写入。
+    """
+
+    def __init__(self, flush_interval: float = DEFAULT_FLUSH_INTERVAL_MS / 1000):
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, Tuple[int, Optional[str]]] = {}
+        self._runner: Optional[asyncio.Task] = None
+        self._inflight: Optional[asyncio.Task] = None
+
+    def report(self, task_id: str, progress: int, current_step: Optional[str] = None) -> None:
+        """记录任务进度（不阻塞、不访问数据库）并推送给本进程的订阅者；小于已记录进度的值被忽略"""
+        get_progress_broker().publish({"task_id": task_id, "progress": progress, "current_step": current_step})
+
+        existing = self._pending.get(task_id)
+        if existing is not None:
+            if progress < existing[0]:
+                return
+            if current_step is None:
+                current_step = existing[1]
+        self._pending[task_id] = (progress, current_step)
+
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        """后台写入循环，没有待写入进度时退出"""
+        while self._pending:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def _wait_inflight(self) -> None:
+        """等待进行中的批量写入结束（其失败已在 flush 中处理）"""
+        if self._inflight is not None:
+            try:
+                await asyncio.shield(self._inflight)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass
+
+    async def flush(self) -> None:
+        """立即写入所有待写入的进度"""
+        await self._wait_inflight()
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        self._inflight = asyncio.get_running_loop().create_task(_write_batch(batch))
+        try:
+            await asyncio.shield(self._inflight)
+        except Exception as e:
+            logger.warning(f"Flush progress of {len(batch)} tasks failed: {e}")
+            # 写入失败的进度并回待写入集合，下次重试；期间已有更新的任务以新值为准
+            for task_id, value in batch.items():
+                self._pending.setdefault(task_id, value)
+
+    async def drain(self, task_id: str) -> None:
+        """丢弃任务未写入的进度并等待进行中的批量写入完成（写入终态前调用，避免旧进度晚于终态落库）"""
+        self._pending.pop(task_id, None)
+        await self._wait_inflight()
+
+    async def aclose(self) -> None:
+        """写入剩余进度并停止后台协程"""
+        if self._runner is not None and not self._runner.done():
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+        self._runner = None
+        await self.flush()
+
+
+_writers: Dict[int, ProgressWriter] = {}
+
+
+def get_progress_writer() -> ProgressWriter:
+    """获取当前事件循环内共享的进度写入器（必须在协程中调用）"""
+    loop_id = id(asyncio.get_running_loop())
+    writer = _writers.get(loop_id)
+    if writer is None:
+        writer = ProgressWriter()
+        _writers[loop_id] = writer
+    return writer
+
+
+async def close_progress_writer() -> None:
+    """写入当前事件循环内剩余的进度（应用退出时调用）"""
+    writer = _writers.pop(id(asyncio.get_running_loop()), None)
+    if writer is not None:
+        await writer.aclose()
+
+
+__all__ = ["ProgressWriter", "get_progress_writer", "close_progress_writer"]
@@ -2,10 +2,10 @@
 数据库会话上下文管理器
 确保数据库会话正确关闭，避免连接泄漏
 """
-from contextlib import contextmanager
-from typing import Generator
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncGenerator, Generator
 
-from storage.database.db import get_session
+from storage.database.db import get_async_session, get_session
 
 
 @contextmanager
@@ -25,4 +25,21 @@ def get_db_session() -> Generator:
         session.close()
 
 
-__all__ = ["get_db_session"]
+@asynccontextmanager
+async def get_async_db_session() -> AsyncGenerator:
+    """
+    异步数据库会话上下文管理器（在事件循环中等待数据库 I/O，不阻塞其他请求）
+
+    使用方式:
+        async with get_async_db_session() as db:
+            await db.execute(text("SELECT 1"))
+        # 会话自动关闭
+    """
+    session = get_async_session()
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
+__all__ = ["get_db_session", "get_async_db_session"]
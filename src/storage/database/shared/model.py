@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, JSON, func
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Text, JSON, func
 from sqlalchemy.orm import DeclarativeBase
 from typing import Optional
 
@@ -33,9 +33,33 @@ class VideoGenerationTask(Base):
     
     # 错误信息
     error_message = Column(Text, nullable=True, comment="错误信息")
+
+    # 阶段检查点（脚本、各段视频URL、拼接文件、上传key），重试时跳过已完成阶段
+    stage_checkpoints = Column(JSON, nullable=True, comment="已完成阶段的检查点")
+
+    # 任务队列（由独立 worker 租约执行）
+    request_payload = Column(JSON, nullable=True, comment="原始生成请求（入队任务才有）")
+    attempts = Column(Integer, nullable=False, server_default="0", comment="已租约执行次数")
+    lease_owner = Column(String(128), nullable=True, comment="持有租约的 worker ID")
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True, comment="租约过期时间")
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True, comment="最近心跳时间")
     
     # 时间戳
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, comment="创建时间")
     updated_at = Column(DateTime(timezone=True), onupdate=func.now(), nullable=True, comment="更新时间")
     completed_at = Column(DateTime(timezone=True), nullable=True, comment="完成时间")
 
+
+
+class StoredContent(Base):
+    """按内容哈希去重的已上传对象索引"""
+    __tablename__ = "stored_contents"
+
+    content_hash = Column(String(64), primary_key=True, comment="内容 SHA-256（十六进制）")
+    bucket = Column(String(255), primary_key=True, comment="对象所在桶")
+    object_key = Column(Text, nullable=False, comment="对象 key")
+    size = Column(BigInteger, nullable=False, comment="内容字节数")
+    content_type = Column(String(255), nullable=True, comment="MIME 类型")
+    hit_count = Column(Integer, nullable=False, server_default="0", comment="去重命中次数")
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, comment="首次上传时间")
+    last_used_at = Column(DateTime(timezone=True), nullable=True, comment="最近命中时间")
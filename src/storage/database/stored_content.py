@@ -0,0 +1,90 @@
+"""
+上传内容去重索引
+记录 内容哈希 -> 对象 key，相同内容再次上传时直接复用已有对象
+"""
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from storage.database.shared.model import StoredContent
+
+
+class StoredContentManager:
+    """按内容哈希去重的已上传对象索引"""
+
+    def find(self, db: Session, content_hash: str, bucket: str, size: int) -> Optional[StoredContent]:
+        """
+        查找相同内容的已上传对象
+
+        Args:
+            db: 数据库会话
+            content_hash: 内容 SHA-256
+            bucket: 对象所在桶
+            size: 内容字节数（与哈希一起校验）
+
+        Returns:
+            索引记录，不存在时返回 None
+        """
+        record = db.get(StoredContent, (content_hash, bucket))
+        if record is None or record.size != size:
+            return None
+        return record
+
+    def mark_hit(self, db: Session, content_hash: str, bucket: str) -> None:
+        """记录一次去重命中"""
+        stmt = text("""
+            UPDATE stored_contents
+            SET hit_count = hit_count + 1, last_used_at = NOW()
+            WHERE content_hash = :content_hash AND bucket = :bucket
+        """)
+        try:
+            db.execute(stmt, {"content_hash": content_hash, "bucket": bucket})
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+    def remember(self, db: Session, content_hash: str, bucket: str, object_key: str, size: int,
+                 content_type: Optional[str] = None) -> str:
+        """
+        记录新上传的对象
+
+        并发上传相同内容时以先写入的记录为准，后写入的不覆盖。
+
+        Returns:
+            索引中该内容对应的对象 key
+        """
+        stmt = text("""
+            INSERT INTO stored_contents (content_hash, bucket, object_key, size, content_type, last_used_at)
+            VALUES (:content_hash, :bucket, :object_key, :size, :content_type, NOW())
+            ON CONFLICT (content_hash, bucket) DO UPDATE SET last_used_at = NOW()
+            RETURNING object_key
+        """)
+        try:
+            result = db.execute(stmt, {
+                "content_hash": content_hash,
+                "bucket": bucket,
+                "object_key": object_key,
+                "size": size,
+                "content_type": content_type,
+            })
+            stored_key = result.scalar()
+            db.commit()
+            return stored_key
+        except Exception:
+            db.rollback()
+            raise
+
+    def forget(self, db: Session, content_hash: str, bucket: str) -> None:
+        """删除索引记录（对象已不存在时调用）"""
+        stmt = text("DELETE FROM stored_contents WHERE content_hash = :content_hash AND bucket = :bucket")
+        try:
+            db.execute(stmt, {"content_hash": content_hash, "bucket": bucket})
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+
+__all__ = ["StoredContentManager"]
@@ -0,0 +1,70 @@
+"""
+任务进度读缓存测试：版本号防止读库与失效交错时写回旧值，已结束/进行中任务的缓存时长
+"""
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# 添加src目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+pytest.importorskip("cachetools")
+
+from storage.database.progress_cache import TaskProgressCache
+
+
+def test_put_and_get():
+    cache = TaskProgressCache()
+    assert cache.get("t1") is None
+    assert cache.put("t1", {"progress": 10})
+    assert cache.get("t1") == {"progress": 10}
+
+
+def test_invalidate_during_read_discards_stale_put():
+    cache = TaskProgressCache()
+    # 请求 A 读库前取版本号
+    version = cache.version("t1")
+    # 读库期间其他请求写入任务并失效缓存
+    cache.invalidate("t1")
+    # A 读到的旧值不能写回缓存
+    assert not cache.put("t1", {"progress": 10}, version=version)
+    assert cache.get("t1") is None
+
+    # 失效之后开始的读取可以写入
+    version = cache.version("t1")
+    assert cache.put("t1", {"progress": 50}, version=version)
+    assert cache.get("t1") == {"progress": 50}
+
+
+def test_invalidate_removes_entry_and_advances_version():
+    cache = TaskProgressCache()
+    cache.put("t1", "a")
+    before = cache.version("t1")
+    cache.invalidate("t1", "t2")
+    assert cache.get("t1") is None
+    assert cache.version("t1") != before
+    assert cache.version("t2") != 0
+
+
+def test_clear_rejects_puts_started_before_clear():
+    cache = TaskProgressCache()
+    cache.put("t1", "a")
+    known = cache.version("t1")
+    unknown = cache.version("t2")
+    cache.clear()
+    assert cache.get("t1") is None
+    assert not cache.put("t1", "stale", version=known)
+    # 未缓存过的任务同样不能写回 clear 之前读到的值
+    assert not cache.put("t2", "stale", version=unknown)
+    assert cache.put("t2", "fresh", version=cache.version("t2"))
+
+
+def test_active_entries_expire_before_finished_entries():
+    cache = TaskProgressCache(active_ttl=0.05, finished_ttl=60)
+    cache.put("running", "r")
+    cache.put("done", "d", finished=True)
+    time.sleep(0.1)
+    assert cache.get("running") is None
+    assert cache.get("done") == "d"
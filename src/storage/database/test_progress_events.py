@@ -0,0 +1,149 @@
+"""
+进度事件分发测试：慢订阅者只收到最新一条、重复与乱序事件丢弃、退订后清理，
+LISTEN/NOTIFY 通知转发给订阅者（连接替换为内存中的通知序列，不需要 PostgreSQL）
+"""
+import asyncio
+import json
+import sys
+import threading
+import types
+from pathlib import Path
+
+import pytest
+
+# 添加src目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("cachetools")
+
+from storage.database import progress_events
+from storage.database.progress_events import PROGRESS_CHANNEL, ProgressBroker
+
+
+@pytest.fixture
+def broker(monkeypatch):
+    """不连接数据库的分发器"""
+    async def _idle(self):
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(ProgressBroker, "_listen", _idle)
+    return ProgressBroker()
+
+
+def test_slow_subscriber_gets_latest_event_only(broker):
+    async def _run():
+        with broker.subscribe("t1") as subscription:
+            for progress in (10, 20, 30):
+                broker.publish({"task_id": "t1", "status": "generating", "progress": progress})
+            first = await subscription.get(timeout=1)
+            second = await subscription.get(timeout=0.01)
+        await broker.aclose()
+        return first, second
+
+    first, second = asyncio.run(_run())
+    assert first["progress"] == 30
+    assert second is None
+
+
+def test_duplicate_and_stale_events_are_dropped(broker):
+    async def _run():
+        received = []
+        with broker.subscribe("t1") as subscription:
+            for event in (
+                {"task_id": "t1", "status": "generating", "progress": 40},
+                # 本进程写入器发布的事件不含状态：沿用最近的状态；与上一条相同时丢弃
+                {"task_id": "t1", "progress": 40},
+                # 乱序到达的较小进度
+                {"task_id": "t1", "status": "generating", "progress": 20},
+                {"task_id": "t1", "progress": 50, "current_step": "拼接"},
+                # 状态变化不受进度只增不减的限制
+                {"task_id": "t1", "status": "completed", "progress": 0},
+            ):
+                broker.publish(event)
+                got = await subscription.get(timeout=0.01)
+                if got is not None:
+                    received.append((got["status"], got["progress"]))
+        await broker.aclose()
+        return received
+
+    assert asyncio.run(_run()) == [("generating", 40), ("generating", 50), ("completed", 0)]
+
+
+def test_unsubscribe_clears_task_state(broker):
+    async def _run():
+        subscription = broker.subscribe("t1")
+        broker.publish({"task_id": "t1", "status": "generating", "progress": 10})
+        subscription.close()
+        # 没有订阅者时直接丢弃
+        broker.publish({"task_id": "t1", "status": "generating", "progress": 20})
+        await broker.aclose()
+
+    asyncio.run(_run())
+    assert broker._subscribers == {}
+    assert broker._last == {}
+
+
+class _Notify:
+    def __init__(self, payload: str):
+        self.payload = payload
+
+
+class _Connection:
+    """依次产生预设通知的 LISTEN 连接"""
+
+    def __init__(self, payloads, executed):
+        self._payloads = payloads
+        self._executed = executed
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def execute(self, sql):
+        self._executed.append(sql)
+
+    async def notifies(self):
+        for payload in self._payloads:
+            await asyncio.sleep(0)
+            yield _Notify(payload)
+        await asyncio.Event().wait()
+
+
+def test_listen_forwards_notifications(monkeypatch):
+    executed, conninfos, url_threads = [], [], []
+    payloads = [
+        "not json",
+        json.dumps({"task_id": "t1", "status": "generating", "progress": 30}),
+        json.dumps({"task_id": "t1", "status": "completed", "progress": 100}),
+    ]
+
+    async def _connect(conninfo, autocommit=False):
+        conninfos.append(conninfo)
+        return _Connection(payloads, executed)
+
+    def _get_db_url():
+        url_threads.append(threading.current_thread())
+        return "postgresql+psycopg://user@db/app"
+
+    fake_psycopg = types.SimpleNamespace(AsyncConnection=types.SimpleNamespace(connect=_connect))
+    monkeypatch.setitem(sys.modules, "psycopg", fake_psycopg)
+    monkeypatch.setattr(progress_events, "get_db_url", _get_db_url)
+
+    async def _run():
+        broker = ProgressBroker()
+        received = []
+        with broker.subscribe("t1") as subscription:
+            while not received or received[-1]["status"] != "completed":
+                received.append(await asyncio.wait_for(subscription.get(), timeout=1))
+        await broker.aclose()
+        return received
+
+    received = asyncio.run(_run())
+    assert received[-1] == {"task_id": "t1", "status": "completed", "progress": 100}
+    assert executed == [f"LISTEN {PROGRESS_CHANNEL}"]
+    assert conninfos == ["postgresql://user@db/app"]
+    # 数据库地址在线程池中解析，不阻塞事件循环
+    assert url_threads and url_threads[0] is not threading.main_thread()
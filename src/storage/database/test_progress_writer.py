@@ -0,0 +1,127 @@
+"""
+进度合并写入测试：同一任务多次进度合并为最新值、多个任务合并为一次写入，drain 等待进行中的写入
+数据库写入替换为记录批次的函数，不需要数据库
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+# 添加src目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+pytest.importorskip("sqlalchemy")
+
+from storage.database import progress_writer
+from storage.database.progress_writer import ProgressWriter
+
+
+class _Broker:
+    def __init__(self):
+        self.events = []
+
+    def publish(self, event):
+        self.events.append(event)
+
+
+@pytest.fixture
+def batches(monkeypatch):
+    """记录每次批量写入的内容"""
+    written = []
+
+    async def _write_batch(updates):
+        written.append(dict(updates))
+        return len(updates)
+
+    monkeypatch.setattr(progress_writer, "_write_batch", _write_batch)
+    monkeypatch.setattr(progress_writer, "get_progress_broker", lambda: _Broker())
+    return written
+
+
+def test_reports_coalesce_into_one_batch(batches):
+    async def _run():
+        writer = ProgressWriter(flush_interval=0.05)
+        for progress in range(0, 60, 5):
+            writer.report("t1", progress, f"step {progress}")
+        writer.report("t1", 20, "late")  # 乱序到达的较小进度被忽略
+        writer.report("t1", 60)  # 未给出步骤时保留之前的步骤
+        writer.report("t2", 30, "other")
+        await asyncio.sleep(0.2)
+        await writer.aclose()
+
+    asyncio.run(_run())
+    assert batches == [{"t1": (60, "step 55"), "t2": (30, "other")}]
+
+
+def test_runner_writes_once_per_interval(batches):
+    async def _run():
+        writer = ProgressWriter(flush_interval=0.1)
+        for i in range(100):
+            writer.report("t1", i)
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0.25)
+        await writer.aclose()
+
+    asyncio.run(_run())
+    # 写入次数取决于运行时长而不是回调次数
+    assert 1 <= len(batches) <= 3
+    assert batches[-1]["t1"][0] == 99
+
+
+def test_drain_discards_pending_and_waits_for_inflight_write(monkeypatch, batches):
+    order = []
+
+    async def _run():
+        release = asyncio.Event()
+        write_started = asyncio.Event()
+
+        async def _slow_write(updates):
+            write_started.set()
+            await release.wait()
+            order.append(("written", dict(updates)))
+            return len(updates)
+
+        monkeypatch.setattr(progress_writer, "_write_batch", _slow_write)
+        writer = ProgressWriter(flush_interval=60)
+        writer.report("t1", 10)
+        flushing = asyncio.create_task(writer.flush())
+        await write_started.wait()
+
+        # 写入进行中又有新进度；终态写入前 drain 丢弃它并等待进行中的写入结束
+        writer.report("t1", 20)
+        draining = asyncio.create_task(writer.drain("t1"))
+        await asyncio.sleep(0.01)
+        assert not draining.done()
+        release.set()
+        await draining
+        order.append(("drained", None))
+        await flushing
+        await writer.aclose()
+
+    asyncio.run(_run())
+    assert order == [("written", {"t1": (10, None)}), ("drained", None)]
+
+
+def test_failed_write_is_retried_without_overwriting_newer_progress(monkeypatch, batches):
+    calls = []
+
+    async def _failing_once(updates):
+        calls.append(dict(updates))
+        if len(calls) == 1:
+            raise RuntimeError("db down")
+        return len(updates)
+
+    monkeypatch.setattr(progress_writer, "_write_batch", _failing_once)
+
+    async def _run():
+        writer = ProgressWriter(flush_interval=60)
+        writer.report("t1", 10)
+        writer.report("t2", 10)
+        await writer.flush()
+        writer.report("t2", 40)
+        await writer.flush()
+        await writer.aclose()
+
+    asyncio.run(_run())
+    assert calls[1] == {"t1": (10, None), "t2": (40, None)}
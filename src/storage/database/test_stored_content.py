@@ -0,0 +1,82 @@
+"""
+上传内容去重索引测试：按哈希与大小查找、命中计数、并发记录相同内容时以先写入的 key 为准、删除失效记录
+使用 SQLite 内存库（注册 now 函数；ON CONFLICT ... RETURNING 需要 SQLite 3.35+），不需要 PostgreSQL
+"""
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+# 添加src目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+pytest.importorskip("sqlalchemy")
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from storage.database.shared.model import Base, StoredContent
+from storage.database.stored_content import StoredContentManager
+
+HASH = "a" * 64
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def _register_functions(dbapi_connection, _):
+        dbapi_connection.create_function(
+            "now", 0, lambda: datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        )
+
+    Base.metadata.create_all(engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def _record(factory, content_hash: str = HASH, bucket: str = "b1") -> StoredContent:
+    with factory() as db:
+        return db.get(StoredContent, (content_hash, bucket))
+
+
+def test_remember_and_find(session_factory):
+    manager = StoredContentManager()
+    with session_factory() as db:
+        assert manager.find(db, HASH, "b1", 10) is None
+        assert manager.remember(db, HASH, "b1", "videos/a.mp4", 10, "video/mp4") == "videos/a.mp4"
+
+    with session_factory() as db:
+        assert manager.find(db, HASH, "b1", 10).object_key == "videos/a.mp4"
+        # 大小不一致或其他桶不视为相同内容
+        assert manager.find(db, HASH, "b1", 11) is None
+        assert manager.find(db, HASH, "b2", 10) is None
+
+
+def test_concurrent_remember_keeps_first_key(session_factory):
+    manager = StoredContentManager()
+    with session_factory() as db:
+        manager.remember(db, HASH, "b1", "videos/first.mp4", 10)
+    with session_factory() as db:
+        # 后写入的不覆盖，返回先写入的 key
+        assert manager.remember(db, HASH, "b1", "videos/second.mp4", 10) == "videos/first.mp4"
+    assert _record(session_factory).object_key == "videos/first.mp4"
+
+
+def test_mark_hit_and_forget(session_factory):
+    manager = StoredContentManager()
+    with session_factory() as db:
+        manager.remember(db, HASH, "b1", "videos/a.mp4", 10)
+        manager.remember(db, HASH, "b2", "videos/a.mp4", 10)
+        manager.mark_hit(db, HASH, "b1")
+        manager.mark_hit(db, HASH, "b1")
+    record = _record(session_factory)
+    assert record.hit_count == 2 and record.last_used_at is not None
+
+    with session_factory() as db:
+        manager.forget(db, HASH, "b1")
+    assert _record(session_factory) is None
+    # 只删除该桶的记录
+    assert _record(session_factory, bucket="b2") is not None
@@ -0,0 +1,204 @@
+"""
+视频任务队列测试
+- 放弃反复崩溃的任务、重试次数上限、释放租约、终态写入的租约校验：SQLite 内存库上执行
+- 租约（FOR UPDATE SKIP LOCKED）与续约使用 PostgreSQL 的时间运算，SQLite 无法执行：
+  用记录语句的会话替身检查生成的 PostgreSQL 语句
+"""
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+# 添加src目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("cachetools")
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from storage.database.progress_cache import get_progress_cache
+from storage.database.shared.model import Base, VideoGenerationTask
+from storage.database.video_job_queue import VideoJobQueue
+from storage.database.video_task_manager import VideoTaskManager
+
+
+def _utc(minutes: int) -> datetime:
+    """相对当前时间的 UTC 时间（SQLite 的 CURRENT_TIMESTAMP 为 UTC）"""
+    return (datetime.now(timezone.utc) + timedelta(minutes=minutes)).replace(tzinfo=None)
+
+
+def _task(task_id: str, **fields) -> VideoGenerationTask:
+    values = dict(task_id=task_id, product_name="p", theme="品质保证", duration=20, type="video",
+                  request_payload={"product_name": "p"})
+    values.update(fields)
+    return VideoGenerationTask(**values)
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def _register_functions(dbapi_connection, _):
+        dbapi_connection.create_function("greatest", -1, max)
+        dbapi_connection.create_function("least", -1, min)
+
+    Base.metadata.create_all(engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def _status(factory, task_id: str) -> tuple:
+    with factory() as db:
+        task = db.query(VideoGenerationTask).filter_by(task_id=task_id).one()
+        return task.status, task.lease_owner
+
+
+def test_abandon_expired_fails_only_exhausted_expired_tasks(session_factory):
+    with session_factory() as db:
+        db.add_all([
+            _task("exhausted", status="generating", attempts=3, lease_owner="w1", lease_expires_at=_utc(-5)),
+            _task("retryable", status="generating", attempts=1, lease_owner="w1", lease_expires_at=_utc(-5)),
+            _task("alive", status="generating", attempts=3, lease_owner="w2", lease_expires_at=_utc(5)),
+            _task("finished", status="completed", attempts=3, lease_expires_at=_utc(-5)),
+        ])
+        db.commit()
+
+    cache = get_progress_cache()
+    versions = {task_id: cache.version(task_id) for task_id in ("exhausted", "retryable", "alive")}
+    with session_factory() as db:
+        abandoned = VideoJobQueue().abandon_expired(db, max_attempts=3)
+
+    assert abandoned == ["exhausted"]
+    assert _status(session_factory, "exhausted") == ("failed", None)
+    assert _status(session_factory, "retryable") == ("generating", "w1")
+    assert _status(session_factory, "alive") == ("generating", "w2")
+    assert _status(session_factory, "finished") == ("completed", None)
+    # 只失效被放弃任务的进度缓存，不清空整个缓存
+    assert cache.version("exhausted") != versions["exhausted"]
+    assert cache.version("retryable") == versions["retryable"]
+    assert cache.version("alive") == versions["alive"]
+
+
+def test_retry_requeues_until_attempts_exhausted(session_factory):
+    with session_factory() as db:
+        db.add_all([
+            _task("t1", status="generating", attempts=1, lease_owner="w1", lease_expires_at=_utc(2)),
+            _task("t2", status="generating", attempts=3, lease_owner="w1", lease_expires_at=_utc(2)),
+        ])
+        db.commit()
+
+    queue = VideoJobQueue()
+    with session_factory() as db:
+        # 租约已被其他 worker 接管：不放回队列
+        assert not queue.retry(db, "t1", "w2", "上传失败", max_attempts=3)
+        assert queue.retry(db, "t1", "w1", "上传失败", max_attempts=3)
+        # 执行次数已用尽
+        assert not queue.retry(db, "t2", "w1", "上传失败", max_attempts=3)
+
+    assert _status(session_factory, "t1") == ("pending", None)
+    assert _status(session_factory, "t2") == ("generating", "w1")
+
+
+def test_release_requires_lease_owner(session_factory):
+    with session_factory() as db:
+        db.add(_task("t1", status="completed", lease_owner="w1", lease_expires_at=_utc(2)))
+        db.commit()
+
+    queue = VideoJobQueue()
+    with session_factory() as db:
+        queue.release(db, "t1", "w2")
+    assert _status(session_factory, "t1") == ("completed", "w1")
+    with session_factory() as db:
+        queue.release(db, "t1", "w1")
+    assert _status(session_factory, "t1") == ("completed", None)
+
+
+def test_terminal_writes_require_lease_owner(session_factory):
+    with session_factory() as db:
+        db.add(_task("t1", status="generating", lease_owner="w1", lease_expires_at=_utc(2)))
+        db.commit()
+
+    mgr = VideoTaskManager()
+    with session_factory() as db:
+        # 租约已被其他 worker 接管：不写入终态
+        assert mgr.mark_as_failed(db, "t1", "超时", lease_owner="w2") is None
+        assert mgr.mark_as_completed(db, "t1", {"video_urls": ["u"]}, lease_owner="w2") is None
+    assert _status(session_factory, "t1") == ("generating", "w1")
+
+    with session_factory() as db:
+        task = mgr.mark_as_completed(db, "t1", {"video_urls": ["u"], "merged_video_url": "m"}, lease_owner="w1")
+    assert task.status == "completed"
+    assert task.merged_video_url == "m"
+
+
+class _Result:
+    def __init__(self, rows=(), rowcount=0):
+        self._rows = list(rows)
+        self.rowcount = rowcount
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self._rows
+
+
+class _RecordingSession:
+    """记录执行的语句（按 PostgreSQL 方言编译），按顺序返回预设结果"""
+
+    def __init__(self, *results):
+        self.statements = []
+        self.commits = 0
+        self._results = list(results)
+
+    def execute(self, stmt):
+        self.statements.append(str(stmt.compile(dialect=postgresql.dialect())))
+        return self._results.pop(0)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+    def refresh(self, obj):
+        pass
+
+
+def test_lease_selects_with_skip_locked_and_claims_tasks():
+    leased = [_task("t1", attempts=0), _task("t2", attempts=1)]
+    db = _RecordingSession(_Result(leased))
+    tasks = VideoJobQueue().lease(db, "w1", limit=2, lease_seconds=60, max_attempts=3)
+
+    sql = db.statements[0]
+    assert "FOR UPDATE SKIP LOCKED" in sql
+    assert "LIMIT" in sql
+    # 租约过期的任务只在执行次数未用尽时重新租约
+    assert "video_generation_tasks.attempts <" in sql
+    assert "video_generation_tasks.lease_owner IS NULL" in sql
+    assert db.commits == 1
+    assert [task.lease_owner for task in tasks] == ["w1", "w1"]
+    assert all(task.status == "generating" for task in tasks)
+
+
+def test_lease_with_no_free_slots_does_not_query():
+    db = _RecordingSession()
+    assert VideoJobQueue().lease(db, "w1", limit=0) == []
+    assert db.statements == []
+
+
+def test_heartbeat_only_extends_own_lease():
+    queue = VideoJobQueue()
+    db = _RecordingSession(_Result(rowcount=1), _Result(rowcount=0))
+    assert queue.heartbeat(db, "t1", "w1", lease_seconds=60)
+    # 租约已被其他 worker 接管时更新 0 行
+    assert not queue.heartbeat(db, "t1", "w1", lease_seconds=60)
+
+    sql = db.statements[0]
+    assert sql.startswith("UPDATE video_generation_tasks SET lease_expires_at=(now() + ")
+    assert "video_generation_tasks.lease_owner = %(lease_owner_1)s" in sql
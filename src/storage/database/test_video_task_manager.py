@@ -0,0 +1,76 @@
+"""
+VideoTaskManager 单条语句更新测试：返回的行在会话关闭后可读、进度只增不减并限制在 0-100、已完成段数原子自增
+使用 SQLite 内存库（注册 greatest/least 函数），不需要 PostgreSQL
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+# 添加src目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("cachetools")
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from storage.database.shared.model import Base, VideoGenerationTask
+from storage.database.video_task_manager import VideoTaskManager
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def _register_functions(dbapi_connection, _):
+        dbapi_connection.create_function("greatest", -1, max)
+        dbapi_connection.create_function("least", -1, min)
+
+    Base.metadata.create_all(engine)
+    # 与 db.get_sessionmaker 相同的配置（默认 expire_on_commit=True）
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with factory() as db:
+        db.add(VideoGenerationTask(task_id="t1", product_name="p", theme="品质保证", duration=20, type="video",
+                                   total_parts=2, lease_owner="worker-1"))
+        db.commit()
+    return factory
+
+
+def test_returned_row_is_readable_after_session_closes(session_factory):
+    with session_factory() as db:
+        task = VideoTaskManager().update_progress(db, "t1", 30, "生成中")
+    # 提交后不再查询数据库，会话关闭后仍能读取
+    assert task.status == "pending"
+    assert task.progress == 30
+    assert task.current_step == "生成中"
+
+
+def test_returned_row_overrides_row_loaded_in_session(session_factory):
+    with session_factory() as db:
+        loaded = db.query(VideoGenerationTask).filter_by(task_id="t1").one()
+        assert loaded.progress == 0
+        task = VideoTaskManager().update_progress(db, "t1", 40)
+        assert task.progress == 40
+
+
+def test_progress_only_increases_and_is_clamped(session_factory):
+    mgr = VideoTaskManager()
+    with session_factory() as db:
+        assert mgr.update_progress(db, "t1", 150, "超出").progress == 100
+        task = mgr.update_progress(db, "t1", 40, "乱序")
+    assert task.progress == 100
+    assert task.current_step == "超出"
+
+
+def test_increment_completed_parts(session_factory):
+    mgr = VideoTaskManager()
+    with session_factory() as db:
+        first = mgr.increment_completed_parts(db, "t1")
+        second = mgr.increment_completed_parts(db, "t1")
+    assert (first.completed_parts, first.progress) == (1, 35)
+    assert (second.completed_parts, second.progress) == (2, 70)
+
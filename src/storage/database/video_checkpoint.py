@@ -0,0 +1,90 @@
+"""
+视频任务阶段检查点
+工具在每个阶段完成后记录结果（脚本、各段视频URL、拼接文件、上传key），
+任务重试或恢复时跳过已完成的阶段，避免重复消耗视频生成额度
+"""
+import asyncio
+from typing import Any, Optional
+
+from storage.database.session import get_async_db_session, get_db_session
+from storage.database.video_task_manager import VideoTaskManager
+
+# 检查点键名
+STAGE_SCRIPT = "script"
+STAGE_MERGED_PATH = "merged_path"
+STAGE_UPLOADED_KEY = "uploaded_key"
+
+
+def segment_stage(index: int) -> str:
+    """第 index 段视频的检查点键名"""
+    return f"segment_{index}"
+
+
+def get_task_id_from_runtime(runtime: Any) -> Optional[str]:
+    """从工具运行时配置（configurable.task_id）中获取任务ID"""
+    config = getattr(runtime, "config", None) or {}
+    return (config.get("configurable") or {}).get("task_id")
+
+
+class VideoTaskCheckpoint:
+    """
+    单个任务的检查点读写
+
+    没有任务ID（如直接调用工具）或数据库不可用时退化为不记录，不影响主流程。
+    """
+
+    def __init__(self, task_id: Optional[str]):
+        self.task_id = task_id
+        self.stages: dict = {}
+
+    def load(self) -> dict:
+        """加载已有检查点"""
+        if not self.task_id:
+            return self.stages
+        try:
+            with get_db_session() as db:
+                self.stages = VideoTaskManager().get_checkpoints(db, self.task_id)
+        except Exception as e:
+            print(f"读取任务检查点失败: {e}")
+        return self.stages
+
+    def save(self, **stages: Any) -> None:
+        """记录已完成的阶段"""
+        self.stages.update(stages)
+        if not self.task_id:
+            return
+        try:
+            with get_db_session() as db:
+                VideoTaskManager().save_checkpoint(db, self.task_id, stages)
+        except Exception as e:
+            print(f"记录任务检查点失败: {e}")
+
+    def get(self, stage: str) -> Any:
+        return self.stages.get(stage)
+
+    async def aload(self) -> dict:
+        return await asyncio.to_thread(self.load)
+
+    async def asave(self, **stages: Any) -> None:
+        await asyncio.to_thread(self.save, **stages)
+
+    async def acomplete_part(self, **stages: Any) -> None:
+        """记录一个分段完成：保存检查点并增加任务的已完成段数（推进生成阶段进度）"""
+        await self.asave(**stages)
+        if not self.task_id:
+            return
+        try:
+            async with get_async_db_session() as db:
+                await VideoTaskManager().increment_completed_parts_async(db, self.task_id)
+        except Exception as e:
+            print(f"更新已完成段数失败: {e}")
+
+
+__all__ = [
+    "STAGE_SCRIPT",
+    "STAGE_MERGED_PATH",
+    "STAGE_UPLOADED_KEY",
+    "segment_stage",
+    "get_task_id_from_runtime",
+    "VideoTaskCheckpoint",
+]
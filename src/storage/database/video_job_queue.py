@@ -0,0 +1,209 @@
+"""
+视频生成任务队列
+基于 video_generation_tasks 表的持久化队列，worker 通过 SELECT ... FOR UPDATE SKIP LOCKED 租约任务
+"""
+from datetime import timedelta
+from typing import List
+
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.orm import Session
+
+from storage.database.progress_cache import invalidate_task_progress
+from storage.database.shared.model import VideoGenerationTask
+from storage.database.video_task_manager import VideoTaskCreate
+
+# 已结束的任务状态，不再参与租约
+FINISHED_STATUSES = ("completed", "failed")
+
+
+class VideoJobQueue:
+    """视频生成任务队列"""
+
+    def enqueue(self, db: Session, task_in: VideoTaskCreate, payload: dict, total_parts: int = 1) -> VideoGenerationTask:
+        """
+        创建任务并入队
+
+        Args:
+            db: 数据库会话
+            task_in: 任务创建数据
+            payload: 原始生成请求，worker 据此重建请求
+            total_parts: 总段数
+
+        Returns:
+            创建的任务对象
+        """
+        task_data = task_in.model_dump()
+        task_data["total_parts"] = total_parts
+        task_data["request_payload"] = payload
+
+        db_task = VideoGenerationTask(**task_data)
+        db.add(db_task)
+        try:
+            db.commit()
+            db.refresh(db_task)
+            return db_task
+        except Exception:
+            db.rollback()
+            raise
+
+    def _expired(self):
+        """租约已过期（worker 崩溃或失联）且未结束的任务"""
+        return (
+            VideoGenerationTask.status.notin_(FINISHED_STATUSES)
+            & (VideoGenerationTask.lease_expires_at < func.now())
+        )
+
+    def abandon_expired(self, db: Session, max_attempts: int = 3) -> List[str]:
+        """
+        将租约已过期且执行次数已用尽（反复崩溃）的任务标记为失败
+
+        Args:
+            db: 数据库会话
+            max_attempts: 最大执行次数
+
+        Returns:
+            被标记失败的任务ID（调用方据此清理这些任务的续传状态）
+        """
+        stmt = update(VideoGenerationTask)\
+            .where(VideoGenerationTask.request_payload.isnot(None))\
+            .where(self._expired())\
+            .where(VideoGenerationTask.attempts >= max_attempts)\
+            .values(
+                status="failed",
+                error_message=f"任务执行 {max_attempts} 次均未完成",
+                lease_owner=None,
+                lease_expires_at=None,
+            )\
+            .returning(VideoGenerationTask.task_id)\
+            .execution_options(synchronize_session=False)
+        try:
+            task_ids = list(db.execute(stmt).scalars().all())
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        invalidate_task_progress(*task_ids)
+        return task_ids
+
+    def lease(
+        self,
+        db: Session,
+        worker_id: str,
+        limit: int = 1,
+        lease_seconds: int = 120,
+        max_attempts: int = 3
+    ) -> List[VideoGenerationTask]:
+        """
+        租约待执行的任务
+
+        可租约的任务：等待中的任务，或租约已过期（worker 崩溃）、未结束且执行次数未用尽的任务
+        （用尽的由 abandon_expired 标记失败）。多个 worker 并发租约时通过 SKIP LOCKED 互不阻塞、互不重复。
+
+        Args:
+            db: 数据库会话
+            worker_id: worker ID
+            limit: 最多租约的任务数
+            lease_seconds: 租约时长（秒），需通过 heartbeat 续约
+            max_attempts: 最大执行次数
+
+        Returns:
+            已租约的任务列表
+        """
+        if limit <= 0:
+            return []
+
+        now = func.now()
+        stmt = select(VideoGenerationTask)\
+            .where(VideoGenerationTask.request_payload.isnot(None))\
+            .where(or_(
+                (VideoGenerationTask.status == "pending") & VideoGenerationTask.lease_owner.is_(None),
+                self._expired() & (VideoGenerationTask.attempts < max_attempts)
+            ))\
+            .order_by(VideoGenerationTask.created_at)\
+            .limit(limit)\
+            .with_for_update(skip_locked=True)
+
+        try:
+            tasks = list(db.execute(stmt).scalars().all())
+            for task in tasks:
+                task.status = "generating"
+                task.lease_owner = worker_id
+                task.lease_expires_at = now + timedelta(seconds=lease_seconds)
+                task.heartbeat_at = now
+                task.attempts = VideoGenerationTask.attempts + 1
+
+            leased_ids = [task.task_id for task in tasks]
+            db.commit()
+            invalidate_task_progress(*leased_ids)
+            for task in tasks:
+                db.refresh(task)
+            return tasks
+        except Exception:
+            db.rollback()
+            raise
+
+    def heartbeat(self, db: Session, task_id: str, worker_id: str, lease_seconds: int = 120) -> bool:
+        """
+        续约
+
+        Returns:
+            是否仍持有租约（False 表示租约已过期并被其他 worker 接管）
+        """
+        stmt = update(VideoGenerationTask)\
+            .where(VideoGenerationTask.task_id == task_id)\
+            .where(VideoGenerationTask.lease_owner == worker_id)\
+            .values(
+                lease_expires_at=func.now() + timedelta(seconds=lease_seconds),
+                heartbeat_at=func.now(),
+            )\
+            .execution_options(synchronize_session=False)
+        try:
+            updated = db.execute(stmt).rowcount
+            db.commit()
+            return updated > 0
+        except Exception:
+            db.rollback()
+            raise
+
+    def retry(self, db: Session, task_id: str, worker_id: str, error_message: str, max_attempts: int = 3) -> bool:
+        """
+        任务执行失败但可重试时放回队列（保留阶段检查点，重新执行时跳过已完成的阶段）
+
+        Returns:
+            是否已放回队列（False 表示执行次数已用尽或租约已丢失）
+        """
+        try:
+            updated = db.query(VideoGenerationTask)\
+                .filter(VideoGenerationTask.task_id == task_id)\
+                .filter(VideoGenerationTask.lease_owner == worker_id)\
+                .filter(VideoGenerationTask.attempts < max_attempts)\
+                .update({
+                    VideoGenerationTask.status: "pending",
+                    VideoGenerationTask.error_message: error_message,
+                    VideoGenerationTask.lease_owner: None,
+                    VideoGenerationTask.lease_expires_at: None,
+                }, synchronize_session=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        invalidate_task_progress(task_id)
+        return updated > 0
+
+    def release(self, db: Session, task_id: str, worker_id: str) -> None:
+        """释放租约（任务执行结束后调用）"""
+        try:
+            db.query(VideoGenerationTask)\
+                .filter(VideoGenerationTask.task_id == task_id)\
+                .filter(VideoGenerationTask.lease_owner == worker_id)\
+                .update({
+                    VideoGenerationTask.lease_owner: None,
+                    VideoGenerationTask.lease_expires_at: None,
+                }, synchronize_session=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+
+__all__ = ["VideoJobQueue", "FINISHED_STATUSES"]
@@ -2,11 +2,15 @@
 视频生成任务进度管理器
 管理视频生成任务的创建、更新和查询
 """
+import json
 from typing import List, Optional
 from pydantic import BaseModel, Field
 from datetime import datetime
+from sqlalchemy import case, func, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+from storage.database.progress_cache import invalidate_task_progress
 from storage.database.shared.model import VideoGenerationTask
 
 
@@ -59,6 +63,24 @@ class VideoTaskResponse(BaseModel):
         from_attributes = True
 
 
+# 批量更新进度：规则同 update_progress，多个任务在一条语句中更新
+_PROGRESS_BATCH_SQL = text("""
+    UPDATE video_generation_tasks AS t
+    SET progress = GREATEST(t.progress, v.progress),
+        current_step = CASE WHEN v.progress >= t.progress
+                            THEN COALESCE(v.current_step, t.current_step)
+                            ELSE t.current_step END,
+        updated_at = NOW()
+    FROM jsonb_to_recordset(CAST(:rows AS jsonb)) AS v(task_id TEXT, progress INTEGER, current_step TEXT)
+    WHERE t.task_id = v.task_id
+""")
+
+
+def _clamp_progress(progress: int) -> int:
+    """进度限制在 0-100"""
+    return max(0, min(100, int(progress)))
+
+
 # --- Manager Class ---
 class VideoTaskManager:
     """视频生成任务管理器"""
@@ -75,10 +97,7 @@ class VideoTaskManager:
         Returns:
             创建的任务对象
         """
-        task_data = task_in.model_dump()
-        task_data["total_parts"] = total_parts
-
-        db_task = VideoGenerationTask(**task_data)
+        db_task = self._new_task(task_in, total_parts)
         db.add(db_task)
         try:
             db.commit()
@@ -88,6 +107,23 @@ class VideoTaskManager:
             db.rollback()
             raise
 
+    async def create_task_async(self, db: AsyncSession, task_in: VideoTaskCreate, total_parts: int = 1) -> VideoGenerationTask:
+        """创建新的视频生成任务（异步会话版本，参数同 create_task）"""
+        db_task = self._new_task(task_in, total_parts)
+        db.add(db_task)
+        try:
+            await db.commit()
+            await db.refresh(db_task)
+            return db_task
+        except Exception:
+            await db.rollback()
+            raise
+
+    def _new_task(self, task_in: VideoTaskCreate, total_parts: int) -> VideoGenerationTask:
+        task_data = task_in.model_dump()
+        task_data["total_parts"] = total_parts
+        return VideoGenerationTask(**task_data)
+
     def get_task_by_id(self, db: Session, task_id: str) -> Optional[VideoGenerationTask]:
         """
         根据任务ID获取任务
@@ -101,6 +137,11 @@ class VideoTaskManager:
         """
         return db.query(VideoGenerationTask).filter(VideoGenerationTask.task_id == task_id).first()
 
+    async def get_task_by_id_async(self, db: AsyncSession, task_id: str) -> Optional[VideoGenerationTask]:
+        """根据任务ID获取任务（异步会话版本）"""
+        stmt = select(VideoGenerationTask).where(VideoGenerationTask.task_id == task_id).limit(1)
+        return await db.scalar(stmt)
+
     def get_tasks_by_session(self, db: Session, session_id: str, skip: int = 0, limit: int = 10) -> List[VideoGenerationTask]:
         """
         根据会话ID获取任务列表
@@ -121,7 +162,8 @@ class VideoTaskManager:
             .limit(limit)\
             .all()
 
-    def update_task(self, db: Session, task_id: str, task_in: VideoTaskUpdate) -> Optional[VideoGenerationTask]:
+    def update_task(self, db: Session, task_id: str, task_in: VideoTaskUpdate,
+                    lease_owner: Optional[str] = None) -> Optional[VideoGenerationTask]:
         """
         更新任务状态
 
@@ -129,51 +171,151 @@ class VideoTaskManager:
             db: 数据库会话
             task_id: 任务ID
             task_in: 更新数据
+            lease_owner: 队列任务的租约持有者；指定时仅在仍持有租约时更新（租约已被其他 worker 接管时不写入）
 
         Returns:
-            更新后的任务对象或None
+            更新后的任务对象或None（任务不存在或租约已丢失）
         """
-        db_task = self.get_task_by_id(db, task_id)
-        if not db_task:
-            return None
+        return self._update_returning(db, task_id, self._update_values(task_in), lease_owner)
 
+    async def update_task_async(self, db: AsyncSession, task_id: str, task_in: VideoTaskUpdate,
+                                lease_owner: Optional[str] = None) -> Optional[VideoGenerationTask]:
+        """更新任务状态（异步会话版本，参数同 update_task）"""
+        return await self._update_returning_async(db, task_id, self._update_values(task_in), lease_owner)
+
+    def _update_values(self, task_in: VideoTaskUpdate) -> dict:
         update_data = task_in.model_dump(exclude_unset=True)
+        values = {field: value for field, value in update_data.items() if hasattr(VideoGenerationTask, field)}
+
+        # 进度只增不减
+        if "progress" in values:
+            values["progress"] = func.greatest(VideoGenerationTask.progress, values["progress"])
+        # 如果状态更新为 completed，设置 completed_at（已有时保留）
+        if values.get("status") == "completed":
+            values["completed_at"] = func.coalesce(VideoGenerationTask.completed_at, func.now())
+        return values
 
-        # 如果状态更新为 completed，设置 completed_at
-        if "status" in update_data and update_data["status"] == "completed" and not db_task.completed_at:
-            update_data["completed_at"] = datetime.now()
+    def _update_stmt(self, task_id: str, values: dict, lease_owner: Optional[str] = None):
+        """
+        单条 UPDATE ... RETURNING 更新任务并返回更新后的行
 
-        for field, value in update_data.items():
-            if hasattr(db_task, field):
-                setattr(db_task, field, value)
+        SET 中引用的列取更新前的值，读-改-写在数据库内原子完成；指定 lease_owner 时租约校验也在同一条语句中。
+        """
+        values["updated_at"] = func.now()
+        stmt = update(VideoGenerationTask).where(VideoGenerationTask.task_id == task_id)
+        if lease_owner is not None:
+            stmt = stmt.where(VideoGenerationTask.lease_owner == lease_owner)
+        # RETURNING 的值覆盖会话中已加载的同一行，返回的对象即为更新后的值
+        return stmt.values(**values).returning(VideoGenerationTask).execution_options(populate_existing=True)
+
+    def _update_returning(self, db: Session, task_id: str, values: dict,
+                          lease_owner: Optional[str] = None) -> Optional[VideoGenerationTask]:
+        """
+        执行 _update_stmt 并提交，提交后失效该任务的进度缓存
 
-        db.add(db_task)
+        同步会话提交时会使会话内对象过期（再次读取属性需要额外查询，会话关闭后报错），
+        因此提交前把返回的行移出会话：调用方拿到的是 RETURNING 读回的值，会话关闭后仍可读取
+        """
         try:
+            db_task = db.execute(self._update_stmt(task_id, values, lease_owner)).scalar_one_or_none()
+            if db_task is not None:
+                db.expunge(db_task)
             db.commit()
-            db.refresh(db_task)
+            invalidate_task_progress(task_id)
             return db_task
         except Exception:
             db.rollback()
             raise
 
+    async def _update_returning_async(self, db: AsyncSession, task_id: str, values: dict,
+                                      lease_owner: Optional[str] = None) -> Optional[VideoGenerationTask]:
+        """_update_returning 的异步会话版本"""
+        try:
+            db_task = (await db.execute(self._update_stmt(task_id, values, lease_owner))).scalar_one_or_none()
+            await db.commit()
+            invalidate_task_progress(task_id)
+            return db_task
+        except Exception:
+            await db.rollback()
+            raise
+
     def update_progress(self, db: Session, task_id: str, progress: int, current_step: str = None) -> Optional[VideoGenerationTask]:
         """
-        快速更新任务进度
+        快速更新任务进度（单条语句）
+
+        进度只增不减：乱序到达的较小进度不会覆盖已有进度，对应的步骤描述也不会覆盖。
 
         Args:
             db: 数据库会话
             task_id: 任务ID
-            progress: 进度百分比（0-100）
-            current_step: 当前步骤描述（可选）
+            progress: 进度百分比（超出 0-100 时按边界值写入）
+            current_step: 当前步骤描述（可选，为空时保留原描述）
 
         Returns:
             更新后的任务对象或None
         """
-        return self.update_task(db, task_id, VideoTaskUpdate(progress=progress, current_step=current_step))
+        return self._update_returning(db, task_id, self._progress_values(progress, current_step))
+
+    async def update_progress_async(self, db: AsyncSession, task_id: str, progress: int, current_step: str = None) -> Optional[VideoGenerationTask]:
+        """快速更新任务进度（异步会话版本，参数同 update_progress）"""
+        return await self._update_returning_async(db, task_id, self._progress_values(progress, current_step))
+
+    def _progress_values(self, progress: int, current_step: Optional[str]) -> dict:
+        # 超出范围的进度按边界值写入，不因回调传入的异常值中断任务
+        progress = _clamp_progress(progress)
+        values = {"progress": func.greatest(VideoGenerationTask.progress, progress)}
+        if current_step is not None:
+            values["current_step"] = case(
+                (VideoGenerationTask.progress <= progress, current_step),
+                else_=VideoGenerationTask.current_step,
+            )
+        return values
+
+    def update_progress_batch(self, db: Session, updates: dict) -> int:
+        """
+        批量更新多个任务的进度（单条多行 UPDATE，规则同 update_progress）
+
+        Args:
+            db: 数据库会话
+            updates: 任务ID -> (进度百分比, 当前步骤描述或None)
+
+        Returns:
+            实际更新的任务数
+        """
+        if not updates:
+            return 0
+        try:
+            result = db.execute(_PROGRESS_BATCH_SQL, self._batch_params(updates))
+            db.commit()
+            invalidate_task_progress(*updates)
+            return result.rowcount
+        except Exception:
+            db.rollback()
+            raise
+
+    async def update_progress_batch_async(self, db: AsyncSession, updates: dict) -> int:
+        """批量更新多个任务的进度（异步会话版本，参数同 update_progress_batch）"""
+        if not updates:
+            return 0
+        try:
+            result = await db.execute(_PROGRESS_BATCH_SQL, self._batch_params(updates))
+            await db.commit()
+            invalidate_task_progress(*updates)
+            return result.rowcount
+        except Exception:
+            await db.rollback()
+            raise
+
+    def _batch_params(self, updates: dict) -> dict:
+        rows = [
+            {"task_id": task_id, "progress": _clamp_progress(progress), "current_step": current_step}
+            for task_id, (progress, current_step) in updates.items()
+        ]
+        return {"rows": json.dumps(rows, ensure_ascii=False)}
 
     def increment_completed_parts(self, db: Session, task_id: str) -> Optional[VideoGenerationTask]:
         """
-        增加已完成段数
+        增加已完成段数（单条语句原子自增，多个分段同时完成时不丢失计数）
 
         Args:
             db: 数据库会话
@@ -182,20 +324,23 @@ class VideoTaskManager:
         Returns:
             更新后的任务对象或None
         """
-        db_task = self.get_task_by_id(db, task_id)
-        if not db_task:
-            return None
-
-        new_count = db_task.completed_parts + 1
-        # 计算进度：生成阶段 70%，拼接阶段 20%，上传阶段 10%
-        if new_count <= db_task.total_parts:
-            progress = int((new_count / db_task.total_parts) * 70)
-        else:
-            progress = 70
-
-        return self.update_task(db, task_id, VideoTaskUpdate(completed_parts=new_count, progress=progress))
+        return self._update_returning(db, task_id, self._increment_values())
+
+    async def increment_completed_parts_async(self, db: AsyncSession, task_id: str) -> Optional[VideoGenerationTask]:
+        """增加已完成段数（异步会话版本）"""
+        return await self._update_returning_async(db, task_id, self._increment_values())
+
+    def _increment_values(self) -> dict:
+        new_count = VideoGenerationTask.completed_parts + 1
+        # 计算进度：生成阶段 70%，拼接阶段 20%，上传阶段 10%（整数除法，与进度只增不减）
+        progress = func.least(new_count * 70 // func.greatest(VideoGenerationTask.total_parts, 1), 70)
+        return {
+            "completed_parts": new_count,
+            "progress": func.greatest(VideoGenerationTask.progress, progress),
+        }
 
-    def mark_as_failed(self, db: Session, task_id: str, error_message: str) -> Optional[VideoGenerationTask]:
+    def mark_as_failed(self, db: Session, task_id: str, error_message: str,
+                       lease_owner: Optional[str] = None) -> Optional[VideoGenerationTask]:
         """
         标记任务为失败
 
@@ -203,6 +348,7 @@ class VideoTaskManager:
             db: 数据库会话
             task_id: 任务ID
             error_message: 错误信息
+            lease_owner: 租约持有者（见 update_task）
 
         Returns:
             更新后的任务对象或None
@@ -210,9 +356,18 @@ class VideoTaskManager:
         return self.update_task(db, task_id, VideoTaskUpdate(
             status="failed",
             error_message=error_message
-        ))
+        ), lease_owner)
 
-    def mark_as_completed(self, db: Session, task_id: str, result: dict) -> Optional[VideoGenerationTask]:
+    async def mark_as_failed_async(self, db: AsyncSession, task_id: str, error_message: str,
+                                   lease_owner: Optional[str] = None) -> Optional[VideoGenerationTask]:
+        """标记任务为失败（异步会话版本）"""
+        return await self.update_task_async(db, task_id, VideoTaskUpdate(
+            status="failed",
+            error_message=error_message
+        ), lease_owner)
+
+    def mark_as_completed(self, db: Session, task_id: str, result: dict,
+                          lease_owner: Optional[str] = None) -> Optional[VideoGenerationTask]:
         """
         标记任务为完成
 
@@ -220,10 +375,19 @@ class VideoTaskManager:
             db: 数据库会话
             task_id: 任务ID
             result: 结果数据（包含 video_urls, merged_video_url 或 script_content）
+            lease_owner: 租约持有者（见 update_task）
 
         Returns:
             更新后的任务对象或None
         """
+        return self.update_task(db, task_id, self._completed_update(result), lease_owner)
+
+    async def mark_as_completed_async(self, db: AsyncSession, task_id: str, result: dict,
+                                      lease_owner: Optional[str] = None) -> Optional[VideoGenerationTask]:
+        """标记任务为完成（异步会话版本，参数同 mark_as_completed）"""
+        return await self.update_task_async(db, task_id, self._completed_update(result), lease_owner)
+
+    def _completed_update(self, result: dict) -> VideoTaskUpdate:
         update_data = {
             "status": "completed",
             "progress": 100
@@ -235,8 +399,51 @@ class VideoTaskManager:
             update_data["merged_video_url"] = result["merged_video_url"]
         if "script_content" in result:
             update_data["script_content"] = result["script_content"]
+        return VideoTaskUpdate(**update_data)
+
+    def get_checkpoints(self, db: Session, task_id: str) -> dict:
+        """
+        获取任务已完成阶段的检查点
 
-        return self.update_task(db, task_id, VideoTaskUpdate(**update_data))
+        Args:
+            db: 数据库会话
+            task_id: 任务ID
+
+        Returns:
+            检查点字典（任务不存在或尚无检查点时为空字典）
+        """
+        db_task = self.get_task_by_id(db, task_id)
+        if not db_task or not db_task.stage_checkpoints:
+            return {}
+        return dict(db_task.stage_checkpoints)
+
+    def save_checkpoint(self, db: Session, task_id: str, stages: dict) -> bool:
+        """
+        记录已完成的阶段（与已有检查点按键合并）
+
+        合并在单条 UPDATE 中完成，多个分段同时完成时不会互相覆盖。
+
+        Args:
+            db: 数据库会话
+            task_id: 任务ID
+            stages: 阶段名 -> 结果，如 {"segment_0": url}
+
+        Returns:
+            任务是否存在
+        """
+        stmt = text("""
+            UPDATE video_generation_tasks
+            SET stage_checkpoints = (COALESCE(stage_checkpoints::jsonb, '{}'::jsonb) || CAST(:patch AS jsonb))::json,
+                updated_at = NOW()
+            WHERE task_id = :task_id
+        """)
+        try:
+            result = db.execute(stmt, {"patch": json.dumps(stages, ensure_ascii=False), "task_id": task_id})
+            db.commit()
+            return result.rowcount > 0
+        except Exception:
+            db.rollback()
+            raise
 
     def to_response(self, task: VideoGenerationTask) -> VideoTaskResponse:
         """
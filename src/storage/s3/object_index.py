@@ -0,0 +1,187 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import logging
+logger = logging.getLogger(__name__)
+
+# 本地对象索引（默认关闭）：STORAGE_INDEX_PATH 非空时启用
+DEFAULT_INDEX_PATH = os.getenv("STORAGE_INDEX_PATH", "")
+# 全量对账间隔（秒）：写入/删除实时记录，全量对账用于发现其他进程或外部的变更
+DEFAULT_RECONCILE_INTERVAL = int(os.getenv("STORAGE_INDEX_RECONCILE_SECONDS", "21600"))
+
+
+class ObjectIndex:
+    """对象存储的本地 SQLite 索引（key、大小、修改时间）
+
+    - 本进程通过 S3SyncStorage 写入或删除对象时实时更新（见 record_put / record_delete）
+    - refresh 按前缀全量遍历一次，新增/更新看到的对象并删除本轮未看到的对象；
+      距上次对账不足 reconcile_interval 时跳过
+    - 查询“最近 N 个对象”、存储用量等直接读本地索引，不遍历存储桶
+    """
+
+    def __init__(self, path: str, reconcile_interval: int = DEFAULT_RECONCILE_INTERVAL):
+        self.path = path
+        self.reconcile_interval = reconcile_interval
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._lock = threading.Lock()
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS objects (
+                bucket TEXT NOT NULL,
+                key TEXT NOT NULL,
+                size INTEGER,
+                last_modified REAL,
+                seen_at REAL NOT NULL,
+                PRIMARY KEY (bucket, key)
+            );
+            CREATE INDEX IF NOT EXISTS idx_objects_modified ON objects (bucket, last_modified DESC);
+            CREATE TABLE IF NOT EXISTS sync_state (
+                bucket TEXT NOT NULL,
+                prefix TEXT NOT NULL,
+                synced_at REAL NOT NULL,
+                PRIMARY KEY (bucket, prefix)
+            );
+        """)
+
+    # ==================== 写入 ====================
+
+    def record_put(self, bucket: str, key: str, size: Optional[int], last_modified: Optional[float] = None) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO objects (bucket, key, size, last_modified, seen_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (bucket, key) DO UPDATE SET size = excluded.size, "
+                "last_modified = excluded.last_modified, seen_at = excluded.seen_at",
+                (bucket, key, size, last_modified or now, now),
+            )
+
+    def record_delete(self, bucket: str, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM objects WHERE bucket = ? AND key = ?", (bucket, key))
+
+    def refresh(self, storage, *, prefix: str = "", bucket: Optional[str] = None, force: bool = False,
+                batch_size: int = 1000) -> int:
+        """
+        按前缀与存储对账
+
+        Args:
+            storage: S3SyncStorage 实例
+            prefix: 对象前缀
+            bucket: 目标桶；为空时取存储实例默认值
+            force: 忽略对账间隔，立即对账
+
+        Returns:
+            本轮看到的对象数；跳过对账时返回 0
+        """
+        target_bucket = storage._resolve_bucket(bucket)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT synced_at FROM sync_state WHERE bucket = ? AND prefix = ?", (target_bucket, prefix)
+            ).fetchone()
+        if row and not force and time.time() - row[0] < self.reconcile_interval:
+            return 0
+
+        started = time.time()
+        seen = 0
+        batch: List[tuple] = []
+
+        def _flush():
+            with self._lock:
+                self._conn.executemany(
+                    "INSERT INTO objects (bucket, key, size, last_modified, seen_at) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (bucket, key) DO UPDATE SET size = excluded.size, "
+                    "last_modified = excluded.last_modified, seen_at = excluded.seen_at",
+                    batch,
+                )
+            batch.clear()
+
+        for item in storage.iter_files(prefix=prefix or None, bucket=target_bucket, with_metadata=True):
+            batch.append((target_bucket, item["key"], item["size"], item["last_modified"], time.time()))
+            seen += 1
+            if len(batch) >= batch_size:
+                _flush()
+        if batch:
+            _flush()
+
+        with self._lock:
+            # 本轮遍历开始后未被看到（也未被实时写入）的对象已在存储中删除
+            self._conn.execute(
+                "DELETE FROM objects WHERE bucket = ? AND key LIKE ? ESCAPE '\\' AND seen_at < ?",
+                (target_bucket, _like_prefix(prefix), started),
+            )
+            self._conn.execute(
+                "INSERT INTO sync_state (bucket, prefix, synced_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (bucket, prefix) DO UPDATE SET synced_at = excluded.synced_at",
+                (target_bucket, prefix, started),
+            )
+        logger.info(f"Object index refreshed for {target_bucket}/{prefix}: {seen} objects")
+        return seen
+
+    # ==================== 查询 ====================
+
+    def latest(self, bucket: str, *, prefix: str = "", limit: int = 20) -> List[Dict[str, Any]]:
+        """按修改时间倒序返回最近的对象"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, size, last_modified FROM objects WHERE bucket = ? AND key LIKE ? ESCAPE '\\' "
+                "ORDER BY last_modified DESC LIMIT ?",
+                (bucket, _like_prefix(prefix), limit),
+            ).fetchall()
+        return [{"key": key, "size": size, "last_modified": modified} for key, size, modified in rows]
+
+    def usage(self, bucket: str, *, prefix: str = "") -> Dict[str, int]:
+        """统计前缀下的对象数与总字节数"""
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects WHERE bucket = ? AND key LIKE ? ESCAPE '\\'",
+                (bucket, _like_prefix(prefix)),
+            ).fetchone()
+        return {"count": count, "bytes": total}
+
+
+def _like_prefix(prefix: str) -> str:
+    escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "%"
+
+
+_index: Optional[ObjectIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_object_index() -> Optional[ObjectIndex]:
+    """获取进程内共享的对象索引；未配置 STORAGE_INDEX_PATH 时返回 None"""
+    global _index
+    if not DEFAULT_INDEX_PATH:
+        return None
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = ObjectIndex(DEFAULT_INDEX_PATH)
+    return _index
+
+
+def record_object_put(bucket: str, key: str, size: Optional[int]) -> None:
+    """对象写入后更新索引（未启用索引或更新失败时忽略）"""
+    try:
+        index = get_object_index()
+        if index:
+            index.record_put(bucket, key, size)
+    except Exception as e:
+        logger.warning(f"Object index update failed for {key}: {e}")
+
+
+def record_object_delete(bucket: str, key: str) -> None:
+    """对象删除后更新索引（未启用索引或更新失败时忽略）"""
+    try:
+        index = get_object_index()
+        if index:
+            index.record_delete(bucket, key)
+    except Exception as e:
+        logger.warning(f"Object index update failed for {key}: {e}")
+
+
+__all__ = ["ObjectIndex", "get_object_index", "record_object_put", "record_object_delete"]
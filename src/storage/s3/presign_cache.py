@@ -0,0 +1,133 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Set, Tuple
+
+import logging
+logger = logging.getLogger(__name__)
+
+# 签名 URL 到期前的安全余量（秒），余量内的缓存视为已过期
+PRESIGN_SAFETY_MARGIN = int(os.getenv("STORAGE_PRESIGN_SAFETY_MARGIN", "60"))
+# 有效期过半后命中缓存时在后台重新签名
+PRESIGN_REFRESH_RATIO = float(os.getenv("STORAGE_PRESIGN_REFRESH_RATIO", "0.5"))
+PRESIGN_CACHE_MAX_ENTRIES = int(os.getenv("STORAGE_PRESIGN_CACHE_MAX_ENTRIES", "10000"))
+
+# 缓存键：(签名端点, bucket, key, 有效期)
+CacheKey = Tuple[str, str, str, int]
+
+
+class _Entry:
+    __slots__ = ("url", "signed_at", "expire_time")
+
+    def __init__(self, url: str, signed_at: float, expire_time: int):
+        self.url = url
+        self.signed_at = signed_at
+        self.expire_time = expire_time
+
+    def valid_until(self, margin: int) -> float:
+        # 有效期较短时余量不超过有效期的一半
+        return self.signed_at + self.expire_time - min(margin, self.expire_time / 2)
+
+    def refresh_at(self, ratio: float) -> float:
+        return self.signed_at + self.expire_time * ratio
+
+
+class PresignedUrlCache:
+    """进程内签名 URL 缓存（线程安全，LRU 淘汰）"""
+
+    def __init__(
+        self,
+        safety_margin: int = PRESIGN_SAFETY_MARGIN,
+        refresh_ratio: float = PRESIGN_REFRESH_RATIO,
+        max_entries: int = PRESIGN_CACHE_MAX_ENTRIES,
+        refresh_workers: int = 4,
+    ):
+        self.safety_margin = safety_margin
+        self.refresh_ratio = refresh_ratio
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[CacheKey, _Entry]" = OrderedDict()
+        self._refreshing: Set[CacheKey] = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="presign-refresh")
+
+    def get(self, cache_key: CacheKey, sign: Callable[[], str]) -> str:
+        """
+        获取签名 URL：缓存有效时直接返回（过了刷新点则在后台重新签名），否则同步签名
+
+        Args:
+            cache_key: 缓存键
+            sign: 实际签名函数
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None and now < entry.valid_until(self.safety_margin):
+                self._entries.move_to_end(cache_key)
+                if now >= entry.refresh_at(self.refresh_ratio) and cache_key not in self._refreshing:
+                    self._refreshing.add(cache_key)
+                    self._executor.submit(self._refresh, cache_key, sign)
+                return entry.url
+
+        return self._sign_and_store(cache_key, sign)
+
+    def peek(self, cache_key: CacheKey) -> Optional[str]:
+        """仅查询缓存，不触发签名"""
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None and time.time() < entry.valid_until(self.safety_margin):
+                return entry.url
+        return None
+
+    def put(self, cache_key: CacheKey, url: str, signed_at: float) -> None:
+        """写入已签名的 URL（供异步签名路径使用）"""
+        with self._lock:
+            self._entries[cache_key] = _Entry(url, signed_at, cache_key[3])
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def needs_refresh(self, cache_key: CacheKey) -> bool:
+        """缓存仍有效但已过刷新点"""
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            return entry is not None and time.time() >= entry.refresh_at(self.refresh_ratio)
+
+    def invalidate(self, cache_key: CacheKey) -> None:
+        with self._lock:
+            self._entries.pop(cache_key, None)
+
+    def _sign_and_store(self, cache_key: CacheKey, sign: Callable[[], str]) -> str:
+        # 按请求发出的时间计算有效期，保守估计
+        signed_at = time.time()
+        url = sign()
+        self.put(cache_key, url, signed_at)
+        return url
+
+    def _refresh(self, cache_key: CacheKey, sign: Callable[[], str]) -> None:
+        try:
+            self._sign_and_store(cache_key, sign)
+        except Exception as e:
+            # 刷新失败时保留旧 URL，直到其过期后由调用方同步签名
+            logger.warning(f"Background presign refresh failed for {cache_key[2]}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(cache_key)
+
+
+_presign_cache: Optional[PresignedUrlCache] = None
+_presign_cache_lock = threading.Lock()
+
+
+def get_presign_cache() -> PresignedUrlCache:
+    """获取进程内共享的签名 URL 缓存（S3SyncStorage 实例之间共享）"""
+    global _presign_cache
+    if _presign_cache is None:
+        with _presign_cache_lock:
+            if _presign_cache is None:
+                _presign_cache = PresignedUrlCache()
+    return _presign_cache
+
+
+__all__ = ["PresignedUrlCache", "get_presign_cache"]
@@ -0,0 +1,359 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+import httpx
+
+from storage.s3.object_index import record_object_put
+from storage.s3.presign_cache import get_presign_cache
+from storage.s3.s3_storage import S3SyncStorage, ListFilesResult, MIN_PART_SIZE, parse_sign_response
+from storage.workload_identity import get_workload_identity
+import logging
+logger = logging.getLogger(__name__)
+
+
+def _raise_failed(tasks: List[asyncio.Task]) -> None:
+    """已有分片最终失败时尽早结束，不再继续读取源数据"""
+    for task in tasks:
+        if task.done() and not task.cancelled() and task.exception() is not None:
+            raise task.exception()
+
+
+class S3AsyncStorage:
+    """S3兼容存储的异步实现
+
+    boto3 没有原生异步接口：S3 API 调用在专用线程池中执行（共享一个带连接池的 boto3 客户端），
+    事件循环只负责调度；签名与 URL 下载使用 httpx.AsyncClient。接口与 S3SyncStorage 一致。
+    """
+
+    def __init__(
+        self,
+        *,
+        endpoint_url: Optional[str] = None,
+        access_key: str,
+        secret_key: str,
+        bucket_name: str,
+        region: str = "cn-beijing",
+        max_concurrency: int = 8,
+        sync_storage: Optional[S3SyncStorage] = None,
+    ):
+        """sync_storage: 复用已有的同步存储实例（如离线存储替身），提供时忽略连接参数"""
+        self.max_concurrency = max(1, max_concurrency)
+        self._sync = sync_storage or S3SyncStorage(
+            endpoint_url=endpoint_url,
+            access_key=access_key,
+            secret_key=secret_key,
+            bucket_name=bucket_name,
+            region=region,
+            max_pool_connections=max(10, self.max_concurrency),
+        )
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="s3-async")
+        self._http: Optional[httpx.AsyncClient] = None
+        self._refreshing: Set[tuple] = set()
+        # 后台刷新签名的任务：持有引用避免被回收，关闭时取消
+        self._background: Set[asyncio.Task] = set()
+
+    async def _run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
+
+    def _get_http(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                timeout=httpx.Timeout(30.0),
+                limits=httpx.Limits(max_connections=self.max_concurrency * 2, max_keepalive_connections=self.max_concurrency),
+            )
+        return self._http
+
+    async def aclose(self) -> None:
+        background = list(self._background)
+        for task in background:
+            task.cancel()
+        if background:
+            await asyncio.gather(*background, return_exceptions=True)
+        if self._http is not None:
+            await self._http.aclose()
+        self._executor.shutdown(wait=False)
+
+    async def __aenter__(self) -> "S3AsyncStorage":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    # ==================== 基本操作 ====================
+
+    async def upload_file(self, *, file_content: bytes, file_name: str, content_type: str = "application/octet-stream", bucket: Optional[str] = None) -> str:
+        return await self._run(self._sync.upload_file, file_content=file_content, file_name=file_name,
+                               content_type=content_type, bucket=bucket)
+
+    async def delete_file(self, *, file_key: str, bucket: Optional[str] = None) -> bool:
+        return await self._run(self._sync.delete_file, file_key=file_key, bucket=bucket)
+
+    async def file_exists(self, *, file_key: str, bucket: Optional[str] = None) -> bool:
+        return await self._run(self._sync.file_exists, file_key=file_key, bucket=bucket)
+
+    async def read_file(self, *, file_key: str, bucket: Optional[str] = None) -> bytes:
+        return await self._run(self._sync.read_file, file_key=file_key, bucket=bucket)
+
+    async def read_range(self, *, file_key: str, start: int, end: Optional[int] = None, bucket: Optional[str] = None) -> bytes:
+        return await self._run(self._sync.read_range, file_key=file_key, start=start, end=end, bucket=bucket)
+
+    async def iter_file_chunks(self, *, file_key: str, bucket: Optional[str] = None, chunk_size: int = 1024 * 1024,
+                               start: Optional[int] = None, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        """流式读取对象（每块在线程池中读取），语义同 S3SyncStorage.iter_file_chunks"""
+        body = await self._run(self._sync._open_body, file_key=file_key, bucket=bucket, start=start, end=end)
+        try:
+            while True:
+                chunk = await self._run(body.read, chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            self._sync._close_body(body)
+
+    async def download_to_file(self, *, file_key: str, file_path: str, bucket: Optional[str] = None,
+                               chunk_size: int = 1024 * 1024) -> int:
+        return await self._run(self._sync.download_to_file, file_key=file_key, file_path=file_path, bucket=bucket,
+                               chunk_size=chunk_size)
+
+    async def list_files(self, *, prefix: Optional[str] = None, bucket: Optional[str] = None, max_keys: int = 1000, continuation_token: Optional[str] = None) -> ListFilesResult:
+        return await self._run(self._sync.list_files, prefix=prefix, bucket=bucket, max_keys=max_keys,
+                               continuation_token=continuation_token)
+
+    # ==================== 签名 URL ====================
+
+    async def _sign_url(self, *, key: str, bucket: Optional[str] = None, expire_time: int = 1800) -> str:
+        """通过 S3 Proxy 生成签名 URL（异步请求）。"""
+        if getattr(self._sync, "local_signing", False):
+            return await self._run(self._sync._sign_url, key=key, bucket=bucket, expire_time=expire_time)
+        try:
+            token = await get_workload_identity().aget_access_token()
+        except Exception as e:
+            logger.error(f"Error loading x-storage-token: {e}")
+            raise RuntimeError(f"获取 x-storage-token 失败: {e}")
+
+        sign_base = os.environ.get("COZE_BUCKET_ENDPOINT_URL") or self._sync.endpoint_url
+        if not sign_base:
+            raise ValueError("未配置签名端点：请设置 COZE_BUCKET_ENDPOINT_URL 或传入 endpoint_url")
+        payload = {"bucket_name": self._sync._resolve_bucket(bucket), "path": key, "expire_time": expire_time}
+
+        try:
+            resp = await self._get_http().post(
+                sign_base.rstrip("/") + "/sign-url",
+                json=payload,
+                headers={"x-storage-token": token},
+            )
+            resp.raise_for_status()
+            return parse_sign_response(resp.headers.get("Content-Type", ""), resp.text)
+        except Exception as e:
+            raise RuntimeError(f"生成签名URL失败: {e}")
+
+    async def _sign_and_cache(self, cache_key: tuple, key: str, bucket: Optional[str], expire_time: int) -> str:
+        signed_at = time.time()
+        url = await self._sign_url(key=key, bucket=bucket, expire_time=expire_time)
+        get_presign_cache().put(cache_key, url, signed_at)
+        return url
+
+    async def _refresh(self, cache_key: tuple, key: str, bucket: Optional[str], expire_time: int) -> None:
+        try:
+            await self._sign_and_cache(cache_key, key, bucket, expire_time)
+        except Exception as e:
+            logger.warning(f"Background presign refresh failed for {key}: {e}")
+
+    def _on_refresh_done(self, cache_key: tuple, task: asyncio.Task) -> None:
+        # 在回调中清理：开始执行前就被取消的任务不会执行 _refresh 内的代码
+        self._refreshing.discard(cache_key)
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Background presign refresh failed for {cache_key[2]}: {task.exception()}")
+
+    async def generate_presigned_url(self, *, key: str, bucket: Optional[str] = None, expire_time: int = 1800, use_cache: bool = True) -> str:
+        """生成签名 URL（与 S3SyncStorage 共享进程内缓存）。"""
+        if not use_cache:
+            return await self._sign_url(key=key, bucket=bucket, expire_time=expire_time)
+
+        cache = get_presign_cache()
+        cache_key = self._sync._sign_cache_key(key, bucket, expire_time)
+        url = cache.peek(cache_key)
+        if url:
+            if cache.needs_refresh(cache_key) and cache_key not in self._refreshing:
+                self._refreshing.add(cache_key)
+                task = asyncio.create_task(self._refresh(cache_key, key, bucket, expire_time))
+                self._background.add(task)
+                task.add_done_callback(partial(self._on_refresh_done, cache_key))
+            return url
+        return await self._sign_and_cache(cache_key, key, bucket, expire_time)
+
+    async def generate_presigned_urls(self, *, keys: List[str], bucket: Optional[str] = None, expire_time: int = 1800) -> Dict[str, str]:
+        """批量生成签名 URL；签名失败的 key 不在结果中"""
+        keys = list(dict.fromkeys(keys))
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def _sign(key: str):
+            async with semaphore:
+                try:
+                    return await self.generate_presigned_url(key=key, bucket=bucket, expire_time=expire_time)
+                except Exception as e:
+                    logger.error(f"Error signing {key}: {e}")
+                    return None
+
+        urls = await asyncio.gather(*[_sign(key) for key in keys])
+        return {key: url for key, url in zip(keys, urls) if url}
+
+    # ==================== 分片上传 ====================
+
+    async def _multipart_upload(
+        self,
+        chunks: AsyncIterator[bytes],
+        *,
+        file_name: str,
+        content_type: str,
+        bucket: Optional[str],
+        part_size: int,
+        max_concurrency: int,
+        max_retries: int = 3,
+    ) -> str:
+        """把异步字节流按 part_size 切片并发上传；不足一片时直接 put_object。
+        同时缓冲的分片数不超过 max_concurrency，内存占用约为 part_size × max_concurrency。"""
+        part_size = max(part_size, MIN_PART_SIZE)
+        client = await self._run(self._sync._get_client)
+        target_bucket = self._sync._resolve_bucket(bucket)
+        key = self._sync._generate_object_key(original_name=file_name)
+
+        upload_id: Optional[str] = None
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        tasks: List[asyncio.Task] = []
+
+        async def _upload_part(part_number: int, data: bytes) -> Dict[str, Any]:
+            try:
+                for attempt in range(max_retries + 1):
+                    try:
+                        resp = await self._run(client.upload_part, Bucket=target_bucket, Key=key, UploadId=upload_id,
+                                               PartNumber=part_number, Body=data)
+                        return {"PartNumber": part_number, "ETag": resp["ETag"]}
+                    except Exception as e:
+                        if attempt >= max_retries:
+                            raise
+                        delay = min(0.5 * (2 ** attempt), 8)
+                        logger.warning(self._sync._error_msg(f"upload_part {part_number} failed, retry in {delay}s", e))
+                        await asyncio.sleep(delay)
+            finally:
+                semaphore.release()
+
+        buffer = bytearray()
+        part_number = 1
+        total = 0
+        try:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                buffer.extend(chunk)
+                total += len(chunk)
+                while len(buffer) >= part_size:
+                    if upload_id is None:
+                        init_resp = await self._run(client.create_multipart_upload, Bucket=target_bucket, Key=key,
+                                                    ContentType=content_type)
+                        upload_id = init_resp["UploadId"]
+                    data = bytes(buffer[:part_size])
+                    del buffer[:part_size]
+                    # 在途分片达到上限时暂停读取，形成背压
+                    await semaphore.acquire()
+                    _raise_failed(tasks)
+                    tasks.append(asyncio.create_task(_upload_part(part_number, data)))
+                    part_number += 1
+
+            if upload_id is None:
+                # 整个文件不足一片
+                await self._run(client.put_object, Bucket=target_bucket, Key=key, Body=bytes(buffer),
+                                ContentType=content_type)
+                record_object_put(target_bucket, key, total)
+                return key
+
+            if buffer:
+                await semaphore.acquire()
+                tasks.append(asyncio.create_task(_upload_part(part_number, bytes(buffer))))
+                buffer = bytearray()
+
+            parts = await asyncio.gather(*tasks)
+            await self._run(client.complete_multipart_upload, Bucket=target_bucket, Key=key, UploadId=upload_id,
+                            MultipartUpload={"Parts": list(parts)})
+            record_object_put(target_bucket, key, total)
+            return key
+        except BaseException as e:
+            for task in tasks:
+                task.cancel()
+            logger.error(self._sync._error_msg("async multipart upload failed", e))
+            if upload_id is not None:
+                try:
+                    await asyncio.shield(self._run(client.abort_multipart_upload, Bucket=target_bucket, Key=key,
+                                                   UploadId=upload_id))
+                except Exception as ae:
+                    logger.error(self._sync._error_msg("abort_multipart_upload failed", ae))
+            raise
+
+    async def stream_upload_file(
+            self,
+            *,
+            fileobj,
+            file_name: str,
+            content_type: str = "application/octet-stream",
+            bucket: Optional[str] = None,
+            multipart_chunksize: int = 5 * 1024 * 1024,
+            max_concurrency: Optional[int] = None,
+    ) -> str:
+        """流式上传（文件对象或异步字节迭代器），分片并发上传
+        - fileobj: 带 read() 的文件对象（在线程池中读取），或 async 迭代器逐块产生 bytes
+        - multipart_chunksize: 分片大小（不小于 5MB）
+        - max_concurrency: 同时上传的分片数，默认取实例并发数
+        返回：最终写入的对象 key
+        """
+        if hasattr(fileobj, "__aiter__"):
+            chunks = fileobj
+        else:
+            async def _read_chunks():
+                while True:
+                    data = await self._run(fileobj.read, multipart_chunksize)
+                    if not data:
+                        break
+                    yield data
+            chunks = _read_chunks()
+
+        return await self._multipart_upload(
+            chunks,
+            file_name=file_name,
+            content_type=content_type,
+            bucket=bucket,
+            part_size=multipart_chunksize,
+            max_concurrency=max_concurrency or self.max_concurrency,
+        )
+
+    async def upload_from_url(
+            self,
+            *,
+            url: str,
+            bucket: Optional[str] = None,
+            timeout: int = 30,
+    ) -> str:
+        """从 URL 流式下载并分片上传到 S3（下载与上传并行）
+        返回：最终写入的对象 key
+        """
+        from urllib.parse import urlparse, unquote
+        try:
+            async with self._get_http().stream("GET", url, timeout=timeout, follow_redirects=True) as resp:
+                resp.raise_for_status()
+                file_name = Path(unquote(urlparse(url).path)).name or "file"
+                content_type = resp.headers.get("Content-Type", "application/octet-stream")
+                return await self.stream_upload_file(
+                    fileobj=resp.aiter_bytes(chunk_size=1024 * 1024),
+                    file_name=file_name,
+                    content_type=content_type,
+                    bucket=bucket,
+                )
+        except Exception as e:
+            logger.error(self._sync._error_msg("Error uploading from URL to S3", e))
+            raise e
@@ -1,18 +1,133 @@
+import heapq
+import io
+import math
 import os
+import queue
 import re
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Optional, Any, Dict, List, TypedDict, Iterable
+from typing import Optional, Any, Dict, List, TypedDict, Iterable, Iterator
 from uuid import uuid4
 
 import boto3
+from botocore.config import Config as BotoConfig
 from botocore.exceptions import ClientError
 from boto3.s3.transfer import TransferConfig
+
+from storage.s3.object_index import get_object_index, record_object_delete, record_object_put
+from storage.s3.presign_cache import get_presign_cache
+from storage.s3.upload_journal import DEFAULT_UPLOAD_TTL, get_upload_journal
+from storage.workload_identity import get_workload_identity
 import logging
 logger = logging.getLogger(__name__)
 
 # 允许的文件名字符集（面向用户输入的约束）
 FILE_NAME_ALLOWED_RE = re.compile(r"^[A-Za-z0-9._\-/]+$")
 
+# 分片上传限制：S3 要求除最后一片外每片不小于 5MB，且不超过 10000 片
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+
+
+def choose_part_size(file_size: int, max_concurrency: int, max_part_size: int) -> int:
+    """按文件大小与并发数选择分片大小：每个并发约 2 片，限制在 [5MB, max_part_size]，
+    超大文件再放大以满足 10000 片上限。"""
+    target = math.ceil(file_size / max(1, max_concurrency * 2))
+    part_size = min(max(target, MIN_PART_SIZE), max(max_part_size, MIN_PART_SIZE))
+    part_size = max(part_size, math.ceil(file_size / MAX_PARTS))
+    # 按 1MB 对齐
+    return math.ceil(part_size / (1024 * 1024)) * 1024 * 1024
+
+
+def parse_sign_response(content_type: str, text: str) -> str:
+    """解析 /sign-url 返回：JSON 中的 data.url/url/signed_url/presigned_url，或纯文本 URL"""
+    import json
+    if "application/json" in content_type or text.strip().startswith("{"):
+        try:
+            obj = json.loads(text)
+        except Exception:
+            return text
+        data = obj.get("data")
+        if isinstance(data, dict) and "url" in data:
+            return data["url"]
+        url_value = obj.get("url") or obj.get("signed_url") or obj.get("presigned_url")
+        if url_value:
+            return url_value
+        raise ValueError("签名服务返回缺少 data.url/url 字段")
+    return text
+
+
+class _BufferReader(io.RawIOBase):
+    """只读文件对象包装 memoryview，上传分片时不复制缓冲区；支持 seek 以便 botocore 重试"""
+
+    def __init__(self, view: memoryview):
+        self._view = view
+        self._pos = 0
+
+    def __len__(self) -> int:
+        return len(self._view)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = min(max(base + offset, 0), len(self._view))
+        return self._pos
+
+    def readinto(self, b) -> int:
+        n = min(len(b), len(self._view) - self._pos)
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size is None or size < 0 else min(self._pos + size, len(self._view))
+        data = self._view[self._pos:end].tobytes()
+        self._pos = end
+        return data
+
+
+def _raise_failed(futures) -> None:
+    """已有分片上传失败时尽早结束，不再继续读取数据"""
+    for future in futures:
+        if future.done() and future.exception() is not None:
+            raise future.exception()
+
+
+def map_parts(fn, part_numbers: Iterable[int], max_workers: int) -> List[Any]:
+    """
+    并发执行各分片的传输，返回各分片结果（按完成顺序）
+    任一分片失败时取消尚未开始的分片并立即抛出，不等待其余分片传输完成
+    """
+    stop = threading.Event()
+
+    def _run(part_number: int) -> Any:
+        if stop.is_set():
+            raise CancelledError()
+        return fn(part_number)
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_run, n) for n in part_numbers]
+        try:
+            for future in as_completed(futures):
+                results.append(future.result())
+        except BaseException:
+            stop.set()
+            for future in futures:
+                future.cancel()
+            raise
+    return results
+
 
 class ListFilesResult(TypedDict):
     # list_files 的返回结构类型
@@ -23,12 +138,14 @@ class ListFilesResult(TypedDict):
 class S3SyncStorage:
     """S3兼容存储实现"""
 
-    def __init__(self, *, endpoint_url: Optional[str] = None, access_key: str, secret_key: str, bucket_name: str, region: str = "cn-beijing"):
+    def __init__(self, *, endpoint_url: Optional[str] = None, access_key: str, secret_key: str, bucket_name: str, region: str = "cn-beijing", max_pool_connections: int = 10):
         self.endpoint_url = os.environ.get("COZE_BUCKET_ENDPOINT_URL") or endpoint_url or ''
         self.access_key = access_key
         self.secret_key = secret_key
         self.bucket_name = bucket_name
         self.region = region
+        # 连接池大小需不小于并发分片上传数，否则多出的连接会被反复新建
+        self.max_pool_connections = max_pool_connections
         self._client = None
 
     def _get_client(self):
@@ -36,15 +153,10 @@ class S3SyncStorage:
             endpoint = self.endpoint_url
             if endpoint is None or endpoint == "":
                 try:
-                    from coze_workload_identity import Client as CozeEnvClient
-                    coze_env_client = CozeEnvClient()
-                    env_vars = coze_env_client.get_project_env_vars()
-                    coze_env_client.close()
-                    for env_var in env_vars:
-                        if env_var.key == "COZE_BUCKET_ENDPOINT_URL":
-                            endpoint = env_var.value.replace("'", "'\\''")
-                            self.endpoint_url = endpoint
-                            break
+                    value = get_workload_identity().get_env_var("COZE_BUCKET_ENDPOINT_URL")
+                    if value:
+                        endpoint = value.replace("'", "'\\''")
+                        self.endpoint_url = endpoint
                 except Exception as e:
                     logger.error(f"Error loading COZE_BUCKET_ENDPOINT_URL: {e}")
                     # 保持向下校验逻辑，避免在此处中断
@@ -58,21 +170,13 @@ class S3SyncStorage:
                 aws_access_key_id=self.access_key,
                 aws_secret_access_key=self.secret_key,
                 region_name=self.region,
+                config=BotoConfig(max_pool_connections=self.max_pool_connections),
             )
 
-            # 注册 before-call 钩子，发送前注入 x-storage-token 头
+            # 注册 before-call 钩子，发送前注入 x-storage-token 头（令牌进程内缓存，过期前后台刷新）
             def _inject_header(**kwargs):
                 try:
-                    from coze_workload_identity import Client as CozeClient
-                    coze_client = CozeClient()
-                    try:
-                        token = coze_client.get_access_token()
-                    except Exception as e:
-                        logger.error("Error loading COZE_WORKLOAD_IDENTITY_TOKEN: %s", e)
-                        token = None
-                        raise e
-                    finally:
-                        coze_client.close()
+                    token = get_workload_identity().get_access_token()
                     params = kwargs.get("params", {})
                     headers = params.setdefault("headers", {})
                     headers["x-storage-token"] = token
@@ -147,6 +251,7 @@ class S3SyncStorage:
             object_key = self._generate_object_key(original_name=file_name)
             target_bucket = self._resolve_bucket(bucket)
             client.put_object(Bucket=target_bucket, Key=object_key, Body=file_content, ContentType=content_type)
+            record_object_put(target_bucket, object_key, len(file_content))
             return object_key
         except Exception as e:
             logger.error(self._error_msg("Error uploading file to S3", e))
@@ -157,6 +262,7 @@ class S3SyncStorage:
             client = self._get_client()
             target_bucket = self._resolve_bucket(bucket)
             client.delete_object(Bucket=target_bucket, Key=file_key)
+            record_object_delete(target_bucket, file_key)
             return True
         except Exception as e:
             logger.error(self._error_msg("Error deleting file from S3", e))
@@ -178,25 +284,105 @@ class S3SyncStorage:
             logger.error(self._error_msg("Error checking file existence in S3", e))
             return False
 
+    def _open_body(self, *, file_key: str, bucket: Optional[str], start: Optional[int] = None, end: Optional[int] = None):
+        """get_object 并返回响应体；给定 start/end 时按字节范围读取（end 为包含的末字节）"""
+        client = self._get_client()
+        target_bucket = self._resolve_bucket(bucket)
+        kwargs: Dict[str, Any] = {"Bucket": target_bucket, "Key": file_key}
+        if start is not None or end is not None:
+            if start is not None and start < 0:
+                raise ValueError("start 不能为负数")
+            if end is not None and start is not None and end < start:
+                raise ValueError("end 不能小于 start")
+            # start 为空时 bytes=-N 表示末尾 N 字节
+            kwargs["Range"] = f"bytes={'' if start is None else start}-{'' if end is None else end}"
+        resp = client.get_object(**kwargs)
+        body = resp.get("Body")
+        if body is None:
+            raise RuntimeError("S3 get_object returned no Body")
+        return body
+
+    def _close_body(self, body) -> None:
+        try:
+            body.close()
+        except Exception as ce:
+            # 资源关闭失败不影响读取结果，仅记录以便排查
+            logger.debug("Failed to close S3 response body: %s", ce)
+
     def read_file(self, *, file_key: str, bucket: Optional[str] = None) -> bytes:
+        """读取整个对象；大文件请使用 iter_file_chunks / download_to_file"""
         try:
-            client = self._get_client()
-            target_bucket = self._resolve_bucket(bucket)
-            resp = client.get_object(Bucket=target_bucket, Key=file_key)
-            body = resp.get("Body")
-            if body is None:
-                raise RuntimeError("S3 get_object returned no Body")
+            body = self._open_body(file_key=file_key, bucket=bucket)
             try:
                 return body.read()
             finally:
-                try:
-                    body.close()
-                except Exception as ce:
-                    # 资源关闭失败不影响读取结果，仅记录以便排查
-                    logger.debug("Failed to close S3 response body: %s", ce)
+                self._close_body(body)
+        except Exception as e:
+            logger.error(self._error_msg("Error reading file from S3", e))
+            raise e
+
+    def read_range(self, *, file_key: str, start: int, end: Optional[int] = None, bucket: Optional[str] = None) -> bytes:
+        """按字节范围读取对象
+        - start: 起始偏移（包含）
+        - end: 结束偏移（包含）；为空时读到对象末尾
+        """
+        try:
+            body = self._open_body(file_key=file_key, bucket=bucket, start=start, end=end)
+            try:
+                return body.read()
+            finally:
+                self._close_body(body)
+        except Exception as e:
+            logger.error(self._error_msg("Error reading file range from S3", e))
+            raise e
+
+    def iter_file_chunks(self, *, file_key: str, bucket: Optional[str] = None, chunk_size: int = 1024 * 1024,
+                         start: Optional[int] = None, end: Optional[int] = None) -> Iterator[bytes]:
+        """流式读取对象，逐块产生 bytes，内存占用约为 chunk_size
+        - chunk_size: 每块大小（默认 1MB）
+        - start/end: 可选字节范围（含两端），语义同 read_range
+        调用方提前结束迭代时响应体随生成器关闭
+        """
+        try:
+            body = self._open_body(file_key=file_key, bucket=bucket, start=start, end=end)
         except Exception as e:
             logger.error(self._error_msg("Error reading file from S3", e))
             raise e
+        try:
+            while True:
+                chunk = body.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        except Exception as e:
+            logger.error(self._error_msg("Error streaming file from S3", e))
+            raise e
+        finally:
+            self._close_body(body)
+
+    def download_to_file(self, *, file_key: str, file_path: str, bucket: Optional[str] = None,
+                         chunk_size: int = 1024 * 1024) -> int:
+        """把对象流式写入本地文件，返回写入字节数
+        - file_path: 目标路径；先写入同目录临时文件，完成后原子替换，失败时不留下半截文件
+        - chunk_size: 每次读写的块大小（默认 1MB）
+        """
+        directory = os.path.dirname(os.path.abspath(file_path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = os.path.join(directory, f".{os.path.basename(file_path)}.{uuid4().hex[:8]}.part")
+        written = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in self.iter_file_chunks(file_key=file_key, bucket=bucket, chunk_size=chunk_size):
+                    f.write(chunk)
+                    written += len(chunk)
+            os.replace(tmp_path, file_path)
+            return written
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
 
     def list_files(self, *, prefix: Optional[str] = None, bucket: Optional[str] = None, max_keys: int = 1000, continuation_token: Optional[str] = None) -> ListFilesResult:
         """列出对象，支持前缀过滤与分页；返回 keys/is_truncated/next_continuation_token。"""
@@ -230,21 +416,133 @@ class S3SyncStorage:
             logger.error(self._error_msg("Error listing files in S3", e))
             raise e
 
-    def generate_presigned_url(self, *, key: str, bucket: Optional[str] = None, expire_time: int = 1800) -> str:
+    def iter_files(self, *, prefix: Optional[str] = None, bucket: Optional[str] = None, page_size: int = 1000,
+                   with_metadata: bool = False, prefetch: bool = True) -> Iterator[Any]:
+        """遍历前缀下的全部对象，自动处理分页
+        - page_size: 每页数量（1–1000）
+        - with_metadata: 为 True 时产生 {"key", "size", "last_modified"}（last_modified 为时间戳），否则只产生 key
+        - prefetch: 调用方处理当前页时在后台线程预取下一页
+        """
+        client = self._get_client()
+        target_bucket = self._resolve_bucket(bucket)
+        if page_size <= 0 or page_size > 1000:
+            raise ValueError("page_size 必须在 1 到 1000 之间")
+
+        def _fetch(token: Optional[str]) -> Dict[str, Any]:
+            kwargs: Dict[str, Any] = {"Bucket": target_bucket, "MaxKeys": page_size}
+            if prefix:
+                kwargs["Prefix"] = prefix
+            if token:
+                kwargs["ContinuationToken"] = token
+            try:
+                return client.list_objects_v2(**kwargs)
+            except Exception as e:
+                logger.error(self._error_msg("Error listing files in S3", e))
+                raise e
+
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="s3-list") if prefetch else None
+        try:
+            resp = _fetch(None)
+            while True:
+                token = resp.get("NextContinuationToken") if resp.get("IsTruncated") else None
+                next_page = executor.submit(_fetch, token) if (executor and token) else None
+
+                for item in resp.get("Contents", []) or []:
+                    key = item.get("Key")
+                    if not key:
+                        continue
+                    if with_metadata:
+                        modified = item.get("LastModified")
+                        yield {
+                            "key": key,
+                            "size": item.get("Size"),
+                            "last_modified": modified.timestamp() if modified is not None else None,
+                        }
+                    else:
+                        yield key
+
+                if not token:
+                    break
+                resp = next_page.result() if next_page else _fetch(token)
+        finally:
+            if executor:
+                executor.shutdown(wait=False)
+
+    def latest_files(self, *, prefix: Optional[str] = None, bucket: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """按修改时间倒序返回前缀下最近的对象（{"key", "size", "last_modified"}）
+        - 启用本地对象索引（STORAGE_INDEX_PATH）时查询索引，必要时先对账；否则遍历前缀
+        """
+        target_bucket = self._resolve_bucket(bucket)
+        index = get_object_index()
+        if index:
+            index.refresh(self, prefix=prefix or "", bucket=target_bucket)
+            return index.latest(target_bucket, prefix=prefix or "", limit=limit)
+        items = self.iter_files(prefix=prefix, bucket=target_bucket, with_metadata=True)
+        return heapq.nlargest(limit, items, key=lambda item: item["last_modified"] or 0)
+
+    def storage_usage(self, *, prefix: Optional[str] = None, bucket: Optional[str] = None) -> Dict[str, int]:
+        """统计前缀下的对象数与总字节数（{"count", "bytes"}），索引使用方式同 latest_files"""
+        target_bucket = self._resolve_bucket(bucket)
+        index = get_object_index()
+        if index:
+            index.refresh(self, prefix=prefix or "", bucket=target_bucket)
+            return index.usage(target_bucket, prefix=prefix or "")
+        count = total = 0
+        for item in self.iter_files(prefix=prefix, bucket=target_bucket, with_metadata=True):
+            count += 1
+            total += item["size"] or 0
+        return {"count": count, "bytes": total}
+
+    def _sign_cache_key(self, key: str, bucket: Optional[str], expire_time: int):
+        sign_base = os.environ.get("COZE_BUCKET_ENDPOINT_URL") or self.endpoint_url or ""
+        return (sign_base, self._resolve_bucket(bucket), key, int(expire_time))
+
+    def generate_presigned_url(self, *, key: str, bucket: Optional[str] = None, expire_time: int = 1800, use_cache: bool = True) -> str:
+        """生成签名 URL。
+        - use_cache: 是否使用进程内缓存；缓存的 URL 在到期前一段安全余量内视为过期，有效期过半后在后台重新签名
+        """
+        if not use_cache:
+            return self._sign_url(key=key, bucket=bucket, expire_time=expire_time)
+        cache_key = self._sign_cache_key(key, bucket, expire_time)
+        return get_presign_cache().get(
+            cache_key,
+            lambda: self._sign_url(key=key, bucket=bucket, expire_time=expire_time),
+        )
+
+    def generate_presigned_urls(self, *, keys: Iterable[str], bucket: Optional[str] = None, expire_time: int = 1800, max_workers: int = 8) -> Dict[str, str]:
+        """批量生成签名 URL：缓存命中的直接返回，其余并发签名。
+        返回：key -> 签名 URL；签名失败的 key 不在结果中
+        """
+        cache = get_presign_cache()
+        result: Dict[str, str] = {}
+        missing: List[str] = []
+        for key in dict.fromkeys(keys):
+            url = cache.peek(self._sign_cache_key(key, bucket, expire_time))
+            if url:
+                result[key] = url
+            else:
+                missing.append(key)
+
+        def _sign(key: str):
+            try:
+                return key, self.generate_presigned_url(key=key, bucket=bucket, expire_time=expire_time)
+            except Exception as e:
+                logger.error(f"Error signing {key}: {e}")
+                return key, None
+
+        if missing:
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(missing)))) as executor:
+                for key, url in executor.map(_sign, missing):
+                    if url:
+                        result[key] = url
+        return result
+
+    def _sign_url(self, *, key: str, bucket: Optional[str] = None, expire_time: int = 1800) -> str:
         """通过 S3 Proxy 生成签名 URL。"""
         import json
         import urllib.request as urllib_request
         try:
-            from coze_workload_identity import Client as CozeClient
-            coze_client = CozeClient()
-            try:
-                token = coze_client.get_access_token()
-            finally:
-                try:
-                    coze_client.close()
-                except Exception:
-                    # 资源释放失败不影响后续流程
-                    pass
+            token = get_workload_identity().get_access_token()
         except Exception as e:
             logger.error(f"Error loading x-storage-token: {e}")
             raise RuntimeError(f"获取 x-storage-token 失败: {e}")
@@ -271,23 +569,126 @@ class S3SyncStorage:
             with urllib_request.urlopen(request) as resp:
                 resp_bytes = resp.read()
                 content_type = resp.headers.get("Content-Type", "")
-                text = resp_bytes.decode("utf-8", errors="replace")
-                if "application/json" in content_type or text.strip().startswith("{"):
-                    try:
-                        obj = json.loads(text)
-                    except Exception:
-                        return text
-                    data = obj.get("data")
-                    if isinstance(data, dict) and "url" in data:
-                        return data["url"]
-                    url_value = obj.get("url") or obj.get("signed_url") or obj.get("presigned_url")
-                    if url_value:
-                        return url_value
-                    raise ValueError("签名服务返回缺少 data.url/url 字段")
-                return text
+                return parse_sign_response(content_type, resp_bytes.decode("utf-8", errors="replace"))
         except Exception as e:
             raise RuntimeError(f"生成签名URL失败: {e}")
 
+    def _open_multipart(self, client, *, bucket: str, file_name: str, content_type: str, part_size: int,
+                        resume_id: Optional[str]):
+        """开始或续传分片上传
+        - 有续传标识且日志中的上传仍存在：沿用原 key、UploadId、分片大小，返回服务端已有的分片
+        - 否则新建分片上传，有续传标识时写入日志
+        返回：(key, upload_id, part_size, {分片号: ETag})
+        """
+        journal = get_upload_journal()
+        entry = journal.load(resume_id) if resume_id else None
+        if entry and entry.get("bucket") == bucket:
+            try:
+                done: Dict[int, str] = {}
+                marker = None
+                while True:
+                    kwargs = {"Bucket": bucket, "Key": entry["key"], "UploadId": entry["upload_id"]}
+                    if marker:
+                        kwargs["PartNumberMarker"] = marker
+                    resp = client.list_parts(**kwargs)
+                    for part in resp.get("Parts", []) or []:
+                        done[part["PartNumber"]] = part["ETag"]
+                    if not resp.get("IsTruncated"):
+                        break
+                    marker = resp.get("NextPartNumberMarker")
+                logger.info(f"Resume multipart upload {entry['key']}: {len(done)} parts already uploaded")
+                return entry["key"], entry["upload_id"], entry["part_size"], done
+            except Exception as e:
+                # 上传已被中止或过期，重新开始
+                logger.warning(self._error_msg("Journaled multipart upload not resumable", e))
+                journal.finish(resume_id)
+
+        key = self._generate_object_key(original_name=file_name)
+        try:
+            init_resp = client.create_multipart_upload(Bucket=bucket, Key=key, ContentType=content_type)
+            upload_id = init_resp["UploadId"]
+        except Exception as e:
+            logger.error(self._error_msg("create_multipart_upload failed", e))
+            raise e
+        if resume_id:
+            journal.start(resume_id, bucket=bucket, key=key, upload_id=upload_id, part_size=part_size)
+        return key, upload_id, part_size, {}
+
+    def _complete_multipart(self, client, *, bucket: str, key: str, upload_id: str, parts: List[Dict[str, Any]],
+                            resume_id: Optional[str], size: Optional[int] = None) -> None:
+        client.complete_multipart_upload(
+            Bucket=bucket,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": sorted(parts, key=lambda part: part["PartNumber"])},
+        )
+        if resume_id:
+            get_upload_journal().finish(resume_id)
+        record_object_put(bucket, key, size)
+
+    def _fail_multipart(self, client, *, bucket: str, key: str, upload_id: str, resume_id: Optional[str]) -> None:
+        """上传失败：调用方给出续传标识的保留已上传分片等待重试（不再重试时调用 abort_journaled_uploads，
+        或超期后由 janitor 中止），否则立即中止"""
+        if resume_id:
+            logger.warning(f"Multipart upload {key} kept for resume (upload_id={upload_id})")
+            return
+        try:
+            client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        except Exception as ae:
+            logger.error(self._error_msg("abort_multipart_upload failed", ae))
+
+    def abort_journaled_uploads(self, *, resume_prefix: str) -> int:
+        """中止本机日志中续传标识以 resume_prefix 开头的分片上传（确定不再续传时调用，如任务最终失败）
+        返回：中止的上传数
+        """
+        client = self._get_client()
+        journal = get_upload_journal()
+        aborted = 0
+        for entry in journal.entries():
+            if not entry["resume_id"].startswith(resume_prefix):
+                continue
+            try:
+                client.abort_multipart_upload(Bucket=entry["bucket"], Key=entry["key"], UploadId=entry["upload_id"])
+                aborted += 1
+            except Exception as e:
+                logger.warning(self._error_msg(f"abort journaled upload {entry['key']} failed", e))
+            journal.finish(entry["resume_id"])
+        return aborted
+
+    def abort_stale_multipart_uploads(self, *, prefix: str, older_than: int = DEFAULT_UPLOAD_TTL,
+                                      bucket: Optional[str] = None) -> int:
+        """janitor：中止 key 以 prefix 开头、发起时间早于 older_than 秒的未完成分片上传，释放其分片占用的存储
+        - prefix: 本服务可续传上传的 key 前缀；必须指定，不触碰桶内其他用途的分片上传
+        返回：中止的上传数
+        """
+        client = self._get_client()
+        target_bucket = self._resolve_bucket(bucket)
+        journal = get_upload_journal()
+        cutoff = time.time() - older_than
+        aborted = 0
+
+        kwargs: Dict[str, Any] = {"Bucket": target_bucket, "Prefix": prefix}
+        while True:
+            resp = client.list_multipart_uploads(**kwargs)
+            for upload in resp.get("Uploads", []) or []:
+                initiated = upload.get("Initiated")
+                if initiated is None or initiated.timestamp() > cutoff:
+                    continue
+                try:
+                    client.abort_multipart_upload(Bucket=target_bucket, Key=upload["Key"], UploadId=upload["UploadId"])
+                    journal.forget_upload(upload["UploadId"])
+                    aborted += 1
+                except Exception as e:
+                    logger.error(self._error_msg(f"abort stale upload {upload['Key']} failed", e))
+            if not resp.get("IsTruncated"):
+                break
+            kwargs["KeyMarker"] = resp.get("NextKeyMarker")
+            kwargs["UploadIdMarker"] = resp.get("NextUploadIdMarker")
+
+        if aborted:
+            logger.info(f"Aborted {aborted} stale multipart uploads in {target_bucket}")
+        return aborted
+
     def stream_upload_file(
             self,
             *,
@@ -299,6 +700,7 @@ class S3SyncStorage:
             multipart_threshold: int = 5 * 1024 * 1024,
             max_concurrency: int = 1,
             use_threads: bool = False,
+            resume_id: Optional[str] = None,
     ) -> str:
         """流式上传（文件对象）
         - fileobj: 任何带有 read() 方法的文件对象（如 open(..., 'rb') 返回的对象、io.BytesIO 等）
@@ -309,8 +711,20 @@ class S3SyncStorage:
         - multipart_threshold: 触发分片上传的阈值（默认 5MB）
         - max_concurrency: 并发分片上传的并发数（默认 1，避免代理层节流影响）
         - use_threads: 是否启用线程并发（默认 False）
+        - resume_id: 续传标识；提供时改用 trunk_upload_file 分片上传并记录日志，
+          进程重启后以相同标识和相同内容重新调用即可从已完成的分片继续
         返回：最终写入的对象 key
         """
+        if resume_id:
+            return self.trunk_upload_file(
+                chunk_iter=iter(lambda: fileobj.read(multipart_chunksize), b""),
+                file_name=file_name,
+                content_type=content_type,
+                bucket=bucket,
+                part_size=multipart_chunksize,
+                max_in_flight=max_concurrency,
+                resume_id=resume_id,
+            )
         try:
             client = self._get_client()
             target_bucket = self._resolve_bucket(bucket)
@@ -326,17 +740,128 @@ class S3SyncStorage:
                 use_threads=use_threads,
             )
             client.upload_fileobj(Fileobj=fileobj, Bucket=target_bucket, Key=key, ExtraArgs=extra_args, Config=config)
+            try:
+                size = fileobj.tell()
+            except Exception:
+                size = None
+            record_object_put(target_bucket, key, size)
             return key
         except Exception as e:
             logger.error(self._error_msg("Error streaming upload (fileobj) to S3", e))
             raise e
 
+    def parallel_upload_file(
+            self,
+            *,
+            file_path: str,
+            file_name: str,
+            content_type: str = "application/octet-stream",
+            bucket: Optional[str] = None,
+            max_concurrency: int = 4,
+            max_part_size: int = 16 * 1024 * 1024,
+            max_retries: int = 3,
+            resume_id: Optional[str] = None,
+    ) -> str:
+        """并发分片上传（本地文件）
+        - file_path: 本地文件路径
+        - file_name: 原始文件名，用于生成唯一 key
+        - content_type: MIME 类型
+        - bucket: 目标桶；为空时取环境变量或实例默认值
+        - max_concurrency: 同时上传的分片数（受代理层节流限制，按部署配置）
+        - max_part_size: 分片大小上限；实际分片大小按文件大小与并发数自适应
+        - max_retries: 单个分片失败后的重试次数（指数退避），只重传失败的分片
+        - resume_id: 续传标识（见 upload_journal.upload_resume_id）；提供时记录上传日志，失败时保留已上传分片，
+          以相同标识、相同内容再次调用时只上传缺失的分片。不提供时失败立即中止上传
+        返回：最终写入的对象 key
+        """
+        client = self._get_client()
+        target_bucket = self._resolve_bucket(bucket)
+        file_size = os.path.getsize(file_path)
+        part_size = choose_part_size(file_size, max_concurrency, max_part_size)
+
+        def _with_retry(action: str, fn):
+            for attempt in range(max_retries + 1):
+                try:
+                    return fn()
+                except Exception as e:
+                    if attempt >= max_retries:
+                        raise
+                    delay = min(0.5 * (2 ** attempt), 8)
+                    logger.warning(self._error_msg(f"{action} failed, retry in {delay}s", e))
+                    time.sleep(delay)
+
+        # 单片即可上传完的小文件直接 put_object
+        if file_size <= part_size:
+            key = self._generate_object_key(original_name=file_name)
+
+            def _put():
+                with open(file_path, "rb") as f:
+                    client.put_object(Bucket=target_bucket, Key=key, Body=f.read(), ContentType=content_type)
+            try:
+                _with_retry("put_object", _put)
+                record_object_put(target_bucket, key, file_size)
+                return key
+            except Exception as e:
+                logger.error(self._error_msg("Error uploading file to S3", e))
+                raise e
+
+        key, upload_id, part_size, done = self._open_multipart(
+            client, bucket=target_bucket, file_name=file_name, content_type=content_type,
+            part_size=part_size, resume_id=resume_id,
+        )
+
+        def _upload_part(part_number: int) -> Dict[str, Any]:
+            offset = (part_number - 1) * part_size
+            with open(file_path, "rb") as f:
+                f.seek(offset)
+                data = f.read(part_size)
+            resp = _with_retry(
+                f"upload_part {part_number}",
+                lambda: client.upload_part(Bucket=target_bucket, Key=key, UploadId=upload_id,
+                                           PartNumber=part_number, Body=data),
+            )
+            if resume_id:
+                get_upload_journal().record_part(resume_id, part_number, resp["ETag"])
+            return {"PartNumber": part_number, "ETag": resp["ETag"]}
+
+        part_count = math.ceil(file_size / part_size)
+        pending = [n for n in range(1, part_count + 1) if n not in done]
+        parts = [{"PartNumber": n, "ETag": etag} for n, etag in done.items() if n <= part_count]
+        try:
+            if pending:
+                parts.extend(map_parts(_upload_part, pending, max(1, min(max_concurrency, len(pending)))))
+
+            self._complete_multipart(client, bucket=target_bucket, key=key, upload_id=upload_id, parts=parts,
+                                     resume_id=resume_id, size=file_size)
+            return key
+        except Exception as e:
+            logger.error(self._error_msg("parallel multipart upload failed", e))
+            self._fail_multipart(client, bucket=target_bucket, key=key, upload_id=upload_id, resume_id=resume_id)
+            raise e
+
     def upload_from_url(
             self,
             *,
             url: str,
             bucket: Optional[str] = None,
             timeout: int = 30,
+            max_concurrency: int = 4,
+    ) -> str:
+        """从 URL 转存到 S3（见 storage.s3.transfer.TransferEngine）
+        - 源文件就在当前存储中：服务端复制，数据不经过本机
+        - 源站支持 Range：分片并发下载并直接上传为对应分片
+        - 其他情况：顺序流式转存
+        返回：最终写入的对象 key
+        """
+        from storage.s3.transfer import TransferEngine
+        return TransferEngine(self, concurrency=max_concurrency).transfer_from_url(url, bucket=bucket, timeout=timeout)
+
+    def _stream_upload_from_url(
+            self,
+            *,
+            url: str,
+            bucket: Optional[str] = None,
+            timeout: int = 30,
     ) -> str:
         """从 URL 流式下载并上传到 S3
         - url: 源文件 URL
@@ -364,61 +889,88 @@ class S3SyncStorage:
 
     def trunk_upload_file(self, *, chunk_iter: Iterable[bytes], file_name: str,
                            content_type: str = "application/octet-stream", bucket: Optional[str] = None,
-                           part_size: int = 5 * 1024 * 1024) -> str:
+                           part_size: int = 5 * 1024 * 1024, max_in_flight: int = 2,
+                           resume_id: Optional[str] = None) -> str:
         """流式上传（字节迭代器，显式分片 Multipart Upload）
         - chunk_iter: 可迭代对象，逐块产生 bytes；每块大小可变（内部累积到 part_size 再上传），最后一块可小于 5MB
         - file_name: 原始文件名，用于生成唯一 key
         - content_type: MIME 类型
         - bucket: 目标桶；为空时取环境或实例默认值
         - part_size: 每个 part 的最小大小（除最后一个）；默认 5MB
+        - max_in_flight: 同时上传的分片数；分片缓冲区预先分配并循环复用，
+          峰值内存为 part_size × max_in_flight，与文件大小无关
+        - resume_id: 续传标识；提供时记录上传日志，进程重启后以相同标识、相同数据重新调用，
+          已完成的分片只读取不重传
         返回：最终写入的对象 key
         """
         client = self._get_client()
         target_bucket = self._resolve_bucket(bucket)
-        key = self._generate_object_key(original_name=file_name)
+        max_in_flight = max(1, max_in_flight)
 
-        # 初始化分片上传
-        try:
-            init_resp = client.create_multipart_upload(Bucket=target_bucket, Key=key, ContentType=content_type)
-            upload_id = init_resp["UploadId"]
-        except Exception as e:
-            logger.error(self._error_msg("create_multipart_upload failed", e))
-            raise e
+        # 初始化（或续传）分片上传
+        key, upload_id, part_size, done = self._open_multipart(
+            client, bucket=target_bucket, file_name=file_name, content_type=content_type,
+            part_size=part_size, resume_id=resume_id,
+        )
 
+        # 分片缓冲环：空闲缓冲区队列，取不到时等待在途分片上传完成（背压）
+        free_buffers: "queue.Queue[bytearray]" = queue.Queue()
+        for _ in range(max_in_flight):
+            free_buffers.put(bytearray(part_size))
+
+        def _upload(part_number: int, buf: bytearray, length: int) -> Dict[str, Any]:
+            try:
+                resp = client.upload_part(Bucket=target_bucket, Key=key, UploadId=upload_id, PartNumber=part_number,
+                                          Body=_BufferReader(memoryview(buf)[:length]))
+                if resume_id:
+                    get_upload_journal().record_part(resume_id, part_number, resp["ETag"])
+                return {"PartNumber": part_number, "ETag": resp["ETag"]}
+            finally:
+                free_buffers.put(buf)
+
+        futures = []
         parts = []
         part_number = 1
-        buffer = bytearray()
+
+        def _submit(buf: bytearray, length: int) -> bytearray:
+            """提交分片，返回下一个可写缓冲区；已上传的分片（续传）直接复用缓冲区"""
+            if part_number in done:
+                parts.append({"PartNumber": part_number, "ETag": done[part_number]})
+                return buf
+            _raise_failed(futures)
+            futures.append(executor.submit(_upload, part_number, buf, length))
+            return free_buffers.get()
+
         try:
-            for chunk in chunk_iter:
-                if not chunk:
-                    continue
-                buffer.extend(chunk)
-                while len(buffer) >= part_size:
-                    data = bytes(buffer[:part_size])
-                    buffer = buffer[part_size:]
-                    resp = client.upload_part(Bucket=target_bucket, Key=key, UploadId=upload_id, PartNumber=part_number,
-                                              Body=data)
-                    parts.append({"PartNumber": part_number, "ETag": resp["ETag"]})
-                    part_number += 1
-
-            # 上传最后不足 part_size 的余量
-            if len(buffer) > 0:
-                resp = client.upload_part(Bucket=target_bucket, Key=key, UploadId=upload_id, PartNumber=part_number,
-                                          Body=bytes(buffer))
-                parts.append({"PartNumber": part_number, "ETag": resp["ETag"]})
+            with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+                buf = free_buffers.get()
+                filled = 0
+                for chunk in chunk_iter:
+                    if not chunk:
+                        continue
+                    view = memoryview(chunk)
+                    offset = 0
+                    while offset < len(view):
+                        # 直接写入预分配缓冲区，不产生中间副本
+                        n = min(part_size - filled, len(view) - offset)
+                        buf[filled:filled + n] = view[offset:offset + n]
+                        filled += n
+                        offset += n
+                        if filled == part_size:
+                            buf = _submit(buf, filled)
+                            part_number += 1
+                            filled = 0
+
+                # 上传最后不足 part_size 的余量
+                if filled > 0:
+                    _submit(buf, filled)
+                parts.extend(future.result() for future in futures)
 
             # 完成分片
-            client.complete_multipart_upload(
-                Bucket=target_bucket,
-                Key=key,
-                UploadId=upload_id,
-                MultipartUpload={"Parts": parts},
-            )
+            self._complete_multipart(client, bucket=target_bucket, key=key, upload_id=upload_id, parts=parts,
+                                     resume_id=resume_id, size=(part_number - 1) * part_size + filled)
             return key
         except Exception as e:
             logger.error(self._error_msg("multipart upload failed", e))
-            try:
-                client.abort_multipart_upload(Bucket=target_bucket, Key=key, UploadId=upload_id)
-            except Exception as ae:
-                logger.error(self._error_msg("abort_multipart_upload failed", ae))
+            self._fail_multipart(client, bucket=target_bucket, key=key, upload_id=upload_id, resume_id=resume_id)
             raise e
@@ -0,0 +1,463 @@
+import io
+import mimetypes
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote
+from uuid import uuid4
+
+from botocore.exceptions import ClientError
+
+from storage.s3.s3_storage import S3SyncStorage
+import logging
+logger = logging.getLogger(__name__)
+
+# 模拟链路：每次请求的固定延迟（毫秒）、单连接带宽与全部连接共享的总带宽（字节/秒，0 表示不限）
+DEFAULT_SIM_LATENCY_MS = float(os.getenv("STORAGE_SIM_LATENCY_MS", "0"))
+DEFAULT_SIM_BANDWIDTH = int(os.getenv("STORAGE_SIM_BANDWIDTH", "0"))
+DEFAULT_SIM_TOTAL_BANDWIDTH = int(os.getenv("STORAGE_SIM_TOTAL_BANDWIDTH", "0"))
+DEFAULT_LOCAL_ROOT = os.getenv("STORAGE_LOCAL_ROOT", "/tmp/tnho_local_storage")
+
+
+_uploads_lock = threading.Lock()
+
+
+def _client_error(code: str, message: str, operation: str) -> ClientError:
+    return ClientError({"Error": {"Code": code, "Message": message}}, operation)
+
+
+class SimulatedLink:
+    """模拟网络链路
+
+    - latency: 每次请求的往返延迟（秒）
+    - bandwidth: 单个请求的传输速率（字节/秒），对应单连接吞吐
+    - total_bandwidth: 所有请求共享的出口带宽（字节/秒），并发请求按顺序占用
+    """
+
+    def __init__(self, *, latency: float = 0.0, bandwidth: int = 0, total_bandwidth: int = 0):
+        self.latency = max(0.0, latency)
+        self.bandwidth = max(0, bandwidth)
+        self.total_bandwidth = max(0, total_bandwidth)
+        self._lock = threading.Lock()
+        self._link_free_at = 0.0
+
+    def request(self) -> None:
+        if self.latency:
+            time.sleep(self.latency)
+
+    def transfer(self, nbytes: int) -> None:
+        if nbytes <= 0:
+            return
+        deadline = time.monotonic() + (nbytes / self.bandwidth if self.bandwidth else 0)
+        if self.total_bandwidth:
+            with self._lock:
+                start = max(time.monotonic(), self._link_free_at)
+                self._link_free_at = start + nbytes / self.total_bandwidth
+                deadline = max(deadline, self._link_free_at)
+        delay = deadline - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class _ThrottledBody:
+    """get_object 响应体：按链路带宽限速读取"""
+
+    def __init__(self, raw, link: SimulatedLink):
+        self._raw = raw
+        self._link = link
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._raw.read() if size is None or size < 0 else self._raw.read(size)
+        self._link.transfer(len(data))
+        return data
+
+    def iter_chunks(self, chunk_size: int = 1024 * 1024):
+        while True:
+            data = self.read(chunk_size)
+            if not data:
+                break
+            yield data
+
+    def close(self) -> None:
+        self._raw.close()
+
+
+class MemoryObjectStore:
+    """进程内对象存储：(bucket, key) -> (内容, Content-Type, 修改时间)"""
+
+    def __init__(self):
+        self._objects: Dict[Tuple[str, str], Tuple[bytes, str, float]] = {}
+        self._lock = threading.Lock()
+        # 进行中的分片上传（UploadId -> 状态），由 SimulatedS3Client 维护
+        self.uploads: Dict[str, Dict[str, Any]] = {}
+
+    def put(self, bucket: str, key: str, data: bytes, content_type: str) -> None:
+        with self._lock:
+            self._objects[(bucket, key)] = (bytes(data), content_type, time.time())
+
+    def compose(self, bucket: str, key: str, sources: List[Tuple[str, str]], content_type: str) -> None:
+        with self._lock:
+            data = b"".join(self._objects[source][0] for source in sources)
+            self._objects[(bucket, key)] = (data, content_type, time.time())
+
+    def open(self, bucket: str, key: str):
+        with self._lock:
+            data, _, _ = self._objects[(bucket, key)]
+        return io.BytesIO(data)
+
+    def head(self, bucket: str, key: str) -> Tuple[int, str, float]:
+        with self._lock:
+            data, content_type, modified = self._objects[(bucket, key)]
+        return len(data), content_type, modified
+
+    def delete(self, bucket: str, key: str) -> None:
+        with self._lock:
+            self._objects.pop((bucket, key), None)
+
+    def list(self, bucket: str, prefix: str) -> List[Tuple[str, int, float]]:
+        with self._lock:
+            items = [(key, len(data), modified) for (b, key), (data, _, modified) in self._objects.items()
+                     if b == bucket and key.startswith(prefix)]
+        return sorted(items)
+
+    def uri(self, bucket: str, key: str) -> str:
+        return f"memory://{bucket}/{quote(key)}"
+
+
+class LocalObjectStore:
+    """本地目录对象存储：对象保存为 root/<bucket>/<key>，写入先落临时文件再原子替换"""
+
+    def __init__(self, root: str = DEFAULT_LOCAL_ROOT):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        # 进行中的分片上传（UploadId -> 状态），仅在本进程内有效
+        self.uploads: Dict[str, Dict[str, Any]] = {}
+
+    def _path(self, bucket: str, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, bucket, key))
+        if not path.startswith(os.path.abspath(os.path.join(self.root, bucket)) + os.sep):
+            raise ValueError(f"非法对象 key: {key}")
+        return path
+
+    def _replace(self, path: str, write) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid4().hex[:8]}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                write(f)
+            os.replace(tmp_path, path)
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def put(self, bucket: str, key: str, data: bytes, content_type: str) -> None:
+        self._replace(self._path(bucket, key), lambda f: f.write(data))
+
+    def compose(self, bucket: str, key: str, sources: List[Tuple[str, str]], content_type: str) -> None:
+        def _write(f):
+            for source_bucket, source_key in sources:
+                with open(self._path(source_bucket, source_key), "rb") as src:
+                    shutil.copyfileobj(src, f, 1024 * 1024)
+        self._replace(self._path(bucket, key), _write)
+
+    def open(self, bucket: str, key: str):
+        try:
+            return open(self._path(bucket, key), "rb")
+        except FileNotFoundError:
+            raise KeyError(key)
+
+    def head(self, bucket: str, key: str) -> Tuple[int, str, float]:
+        try:
+            stat = os.stat(self._path(bucket, key))
+        except FileNotFoundError:
+            raise KeyError(key)
+        return stat.st_size, mimetypes.guess_type(key)[0] or "application/octet-stream", stat.st_mtime
+
+    def delete(self, bucket: str, key: str) -> None:
+        try:
+            os.remove(self._path(bucket, key))
+        except FileNotFoundError:
+            pass
+
+    def list(self, bucket: str, prefix: str) -> List[Tuple[str, int, float]]:
+        base = os.path.join(self.root, bucket)
+        items = []
+        for dirpath, _, filenames in os.walk(base):
+            for name in filenames:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(dirpath, name)
+                key = os.path.relpath(path, base).replace(os.sep, "/")
+                if not key.startswith(prefix):
+                    continue
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                items.append((key, stat.st_size, stat.st_mtime))
+        return sorted(items)
+
+    def uri(self, bucket: str, key: str) -> str:
+        return Path(self._path(bucket, key)).as_uri()
+
+
+class SimulatedS3Client:
+    """实现 S3SyncStorage / TransferEngine 用到的 boto3 S3 客户端接口子集，数据保存在对象存储替身中"""
+
+    # 未完成分片保存在该桶下，不出现在业务桶的列举结果中
+    MULTIPART_BUCKET = ".multipart"
+
+    def __init__(self, store, link: SimulatedLink):
+        self.store = store
+        self.link = link
+        # 分片上传状态放在对象存储替身上，同一替身的多个客户端实例共享（续传、janitor 依赖）
+        self._uploads: Dict[str, Dict[str, Any]] = store.uploads
+        self._lock = _uploads_lock
+
+    # ==================== 对象 ====================
+
+    def put_object(self, *, Bucket: str, Key: str, Body=b"", ContentType: str = "application/octet-stream", **_) -> Dict[str, Any]:
+        data = Body.read() if hasattr(Body, "read") else bytes(Body)
+        self.link.request()
+        self.link.transfer(len(data))
+        self.store.put(Bucket, Key, data, ContentType)
+        return {"ETag": f'"{uuid4().hex}"'}
+
+    def upload_fileobj(self, *, Fileobj, Bucket: str, Key: str, ExtraArgs: Optional[Dict[str, Any]] = None, Config=None) -> None:
+        # boto3 托管传输（TransferConfig 分片与线程）不模拟，按单次 PUT 计
+        self.put_object(Bucket=Bucket, Key=Key, Body=Fileobj.read(),
+                        ContentType=(ExtraArgs or {}).get("ContentType", "application/octet-stream"))
+
+    def get_object(self, *, Bucket: str, Key: str, Range: Optional[str] = None, **_) -> Dict[str, Any]:
+        self.link.request()
+        try:
+            size, content_type, _ = self.store.head(Bucket, Key)
+            raw = self.store.open(Bucket, Key)
+        except KeyError:
+            raise _client_error("NoSuchKey", f"{Key} not found", "GetObject")
+        if Range:
+            start_text, _, end_text = Range[len("bytes="):].partition("-")
+            if start_text:
+                start = int(start_text)
+                end = min(int(end_text), size - 1) if end_text else size - 1
+            else:
+                start, end = max(size - int(end_text), 0), size - 1
+            if start >= size:
+                # 与 S3 一致：起始偏移超出对象大小（包括空对象）时返回 416 InvalidRange
+                raise _client_error("InvalidRange", "The requested range is not satisfiable", "GetObject")
+            raw.seek(start)
+            raw = io.BytesIO(raw.read(max(end - start + 1, 0)))
+            size = end - start + 1
+        return {"Body": _ThrottledBody(raw, self.link), "ContentLength": size, "ContentType": content_type}
+
+    def head_object(self, *, Bucket: str, Key: str, **_) -> Dict[str, Any]:
+        self.link.request()
+        try:
+            size, content_type, modified = self.store.head(Bucket, Key)
+        except KeyError:
+            raise _client_error("404", f"{Key} not found", "HeadObject")
+        return {"ContentLength": size, "ContentType": content_type,
+                "LastModified": datetime.fromtimestamp(modified, tz=timezone.utc)}
+
+    def delete_object(self, *, Bucket: str, Key: str, **_) -> Dict[str, Any]:
+        self.link.request()
+        self.store.delete(Bucket, Key)
+        return {}
+
+    def copy_object(self, *, Bucket: str, Key: str, CopySource: Dict[str, str], **_) -> Dict[str, Any]:
+        # 服务端复制不经过客户端链路，只计请求延迟
+        self.link.request()
+        try:
+            _, content_type, _ = self.store.head(CopySource["Bucket"], CopySource["Key"])
+            self.store.compose(Bucket, Key, [(CopySource["Bucket"], CopySource["Key"])], content_type)
+        except KeyError:
+            raise _client_error("NoSuchKey", f"{CopySource['Key']} not found", "CopyObject")
+        return {}
+
+    def list_objects_v2(self, *, Bucket: str, MaxKeys: int = 1000, Prefix: str = "", ContinuationToken: Optional[str] = None, **_) -> Dict[str, Any]:
+        self.link.request()
+        items = self.store.list(Bucket, Prefix or "")
+        if ContinuationToken:
+            items = [item for item in items if item[0] > ContinuationToken]
+        page = items[:MaxKeys]
+        truncated = len(items) > MaxKeys
+        return {
+            "Contents": [{"Key": key, "Size": size, "LastModified": datetime.fromtimestamp(modified, tz=timezone.utc)}
+                         for key, size, modified in page],
+            "IsTruncated": truncated,
+            "NextContinuationToken": page[-1][0] if truncated else None,
+        }
+
+    # ==================== 分片上传 ====================
+
+    def _get_upload(self, upload_id: str, operation: str) -> Dict[str, Any]:
+        with self._lock:
+            upload = self._uploads.get(upload_id)
+        if upload is None:
+            raise _client_error("NoSuchUpload", f"upload {upload_id} not found", operation)
+        return upload
+
+    def create_multipart_upload(self, *, Bucket: str, Key: str, ContentType: str = "application/octet-stream", **_) -> Dict[str, Any]:
+        self.link.request()
+        upload_id = uuid4().hex
+        with self._lock:
+            self._uploads[upload_id] = {"Bucket": Bucket, "Key": Key, "ContentType": ContentType,
+                                        "Parts": {}, "Initiated": datetime.now(timezone.utc)}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, *, Bucket: str, Key: str, UploadId: str, PartNumber: int, Body, **_) -> Dict[str, Any]:
+        upload = self._get_upload(UploadId, "UploadPart")
+        data = Body.read() if hasattr(Body, "read") else bytes(Body)
+        self.link.request()
+        self.link.transfer(len(data))
+        self.store.put(self.MULTIPART_BUCKET, f"{UploadId}/{PartNumber}", data, "application/octet-stream")
+        etag = f'"{uuid4().hex}"'
+        with self._lock:
+            upload["Parts"][PartNumber] = (etag, len(data))
+        return {"ETag": etag}
+
+    def upload_part_copy(self, *, Bucket: str, Key: str, UploadId: str, PartNumber: int, CopySource: Dict[str, str],
+                         CopySourceRange: str, **_) -> Dict[str, Any]:
+        upload = self._get_upload(UploadId, "UploadPartCopy")
+        self.link.request()
+        start, end = (int(v) for v in CopySourceRange[len("bytes="):].split("-"))
+        with self.store.open(CopySource["Bucket"], CopySource["Key"]) as raw:
+            raw.seek(start)
+            data = raw.read(end - start + 1)
+        self.store.put(self.MULTIPART_BUCKET, f"{UploadId}/{PartNumber}", data, "application/octet-stream")
+        etag = f'"{uuid4().hex}"'
+        with self._lock:
+            upload["Parts"][PartNumber] = (etag, len(data))
+        return {"CopyPartResult": {"ETag": etag}}
+
+    def list_parts(self, *, Bucket: str, Key: str, UploadId: str, **_) -> Dict[str, Any]:
+        upload = self._get_upload(UploadId, "ListParts")
+        self.link.request()
+        with self._lock:
+            parts = [{"PartNumber": n, "ETag": etag, "Size": size} for n, (etag, size) in sorted(upload["Parts"].items())]
+        return {"Parts": parts, "IsTruncated": False}
+
+    def list_multipart_uploads(self, *, Bucket: str, Prefix: str = "", **_) -> Dict[str, Any]:
+        self.link.request()
+        with self._lock:
+            uploads = [{"Key": u["Key"], "UploadId": upload_id, "Initiated": u["Initiated"]}
+                       for upload_id, u in self._uploads.items()
+                       if u["Bucket"] == Bucket and u["Key"].startswith(Prefix or "")]
+        return {"Uploads": uploads, "IsTruncated": False}
+
+    def _drop_parts(self, upload_id: str, part_numbers) -> None:
+        for n in part_numbers:
+            self.store.delete(self.MULTIPART_BUCKET, f"{upload_id}/{n}")
+
+    def complete_multipart_upload(self, *, Bucket: str, Key: str, UploadId: str, MultipartUpload: Dict[str, Any], **_) -> Dict[str, Any]:
+        upload = self._get_upload(UploadId, "CompleteMultipartUpload")
+        self.link.request()
+        numbers = [part["PartNumber"] for part in MultipartUpload.get("Parts", [])]
+        for part in MultipartUpload.get("Parts", []):
+            stored = upload["Parts"].get(part["PartNumber"])
+            if stored is None or stored[0] != part["ETag"]:
+                raise _client_error("InvalidPart", f"part {part['PartNumber']} not uploaded", "CompleteMultipartUpload")
+        self.store.compose(Bucket, Key, [(self.MULTIPART_BUCKET, f"{UploadId}/{n}") for n in numbers], upload["ContentType"])
+        with self._lock:
+            self._uploads.pop(UploadId, None)
+        self._drop_parts(UploadId, upload["Parts"].keys())
+        return {"Key": Key}
+
+    def abort_multipart_upload(self, *, Bucket: str, Key: str, UploadId: str, **_) -> Dict[str, Any]:
+        upload = self._get_upload(UploadId, "AbortMultipartUpload")
+        self.link.request()
+        with self._lock:
+            self._uploads.pop(UploadId, None)
+        self._drop_parts(UploadId, upload["Parts"].keys())
+        return {}
+
+
+class SimulatedSyncStorage(S3SyncStorage):
+    """离线存储替身：接口与 S3SyncStorage 完全一致，S3 调用落到本地目录或内存，
+    并按 SimulatedLink 注入延迟与带宽限制；签名 URL 为 file:// 或 memory:// 地址，
+    同样经过进程内签名缓存。用于开发机和 CI 上的压测与基准测试，不需要网络和工作负载身份令牌。
+    """
+
+    # 签名在本地完成，S3AsyncStorage 不再请求 /sign-url
+    local_signing = True
+
+    def __init__(self, *, store, bucket_name: str = "local", link: Optional[SimulatedLink] = None,
+                 max_pool_connections: int = 10):
+        super().__init__(endpoint_url=None, access_key="", secret_key="", bucket_name=bucket_name,
+                         max_pool_connections=max_pool_connections)
+        self.store = store
+        self.link = link or get_default_link()
+        self._client = SimulatedS3Client(store, self.link)
+
+    def _get_client(self):
+        return self._client
+
+    def _resolve_bucket(self, bucket: Optional[str]) -> str:
+        # 不读取 COZE_BUCKET_NAME，避免与真实存储的配置混用
+        return bucket or self.bucket_name
+
+    def _sign_url(self, *, key: str, bucket: Optional[str] = None, expire_time: int = 1800) -> str:
+        self.link.request()
+        return f"{self.store.uri(self._resolve_bucket(bucket), key)}?expires={int(time.time()) + expire_time}"
+
+
+_default_link: Optional[SimulatedLink] = None
+_stores: Dict[str, Any] = {}
+_stores_lock = threading.Lock()
+
+
+def get_default_link() -> SimulatedLink:
+    """按 STORAGE_SIM_* 环境变量创建的进程内共享链路（总带宽限制对所有存储实例生效）"""
+    global _default_link
+    if _default_link is None:
+        with _stores_lock:
+            if _default_link is None:
+                _default_link = SimulatedLink(latency=DEFAULT_SIM_LATENCY_MS / 1000, bandwidth=DEFAULT_SIM_BANDWIDTH,
+                                              total_bandwidth=DEFAULT_SIM_TOTAL_BANDWIDTH)
+    return _default_link
+
+
+def get_object_store(backend: str):
+    """进程内共享的对象存储替身，使多次 get_storage() 得到的实例看到同一份数据与分片上传状态"""
+    if backend not in ("local", "memory"):
+        raise ValueError(f"未知的存储后端: {backend}")
+    store = _stores.get(backend)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(backend)
+            if store is None:
+                store = MemoryObjectStore() if backend == "memory" else LocalObjectStore(DEFAULT_LOCAL_ROOT)
+                _stores[backend] = store
+    return store
+
+
+def create_simulated_storage(backend: str, *, bucket_name: Optional[str] = None,
+                             max_pool_connections: int = 10) -> SimulatedSyncStorage:
+    """
+    创建存储替身
+
+    Args:
+        backend: local（本地目录 STORAGE_LOCAL_ROOT）或 memory（进程内共享）
+        bucket_name: 桶名，默认 local
+    """
+    return SimulatedSyncStorage(store=get_object_store(backend), bucket_name=bucket_name or "local",
+                                max_pool_connections=max_pool_connections)
+
+
+__all__ = [
+    "SimulatedLink",
+    "MemoryObjectStore",
+    "LocalObjectStore",
+    "SimulatedS3Client",
+    "SimulatedSyncStorage",
+    "create_simulated_storage",
+    "get_default_link",
+    "get_object_store",
+]
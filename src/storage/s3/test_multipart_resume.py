@@ -0,0 +1,105 @@
+"""
+可续传分片上传测试：失败后续传只上传缺失分片、不续传时立即中止、按任务中止保留的上传
+使用内存存储替身（SimulatedSyncStorage），不需要网络
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# 添加src目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+pytest.importorskip("boto3")
+
+from storage.s3 import upload_journal
+from storage.s3.simulated_storage import MemoryObjectStore, SimulatedLink, SimulatedSyncStorage
+from storage.s3.upload_journal import UploadJournal, upload_resume_id
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def journal(tmp_path, monkeypatch):
+    journal = UploadJournal(root=str(tmp_path / "journal"))
+    monkeypatch.setattr(upload_journal, "_journal", journal)
+    return journal
+
+
+@pytest.fixture
+def storage():
+    return SimulatedSyncStorage(store=MemoryObjectStore(), link=SimulatedLink())
+
+
+@pytest.fixture
+def video_file(tmp_path):
+    # 12MB，并发 2 时分为 3 片（5MB + 5MB + 2MB）
+    path = tmp_path / "merged.mp4"
+    path.write_bytes(os.urandom(12 * MB))
+    return str(path)
+
+
+def _fail_part(storage, part_number: int, times: int = 1):
+    """让指定分片前 times 次上传失败，返回记录所有上传分片号的列表"""
+    uploaded = []
+    original = storage._client.upload_part
+    remaining = {"n": times}
+
+    def _upload_part(**kwargs):
+        if kwargs["PartNumber"] == part_number and remaining["n"] > 0:
+            remaining["n"] -= 1
+            raise RuntimeError(f"part {part_number} failed")
+        uploaded.append(kwargs["PartNumber"])
+        return original(**kwargs)
+
+    storage._client.upload_part = _upload_part
+    return uploaded
+
+
+def _upload(storage, path, resume_id=None):
+    return storage.parallel_upload_file(file_path=path, file_name="merged.mp4", max_concurrency=2,
+                                        max_part_size=16 * MB, max_retries=0, resume_id=resume_id)
+
+
+def test_failed_upload_resumes_missing_parts(storage, journal, video_file):
+    resume_id = upload_resume_id("task1__uploaded_key", "hash", storage._resolve_bucket(None))
+    uploaded = _fail_part(storage, 2)
+    with pytest.raises(RuntimeError):
+        _upload(storage, video_file, resume_id)
+
+    # 失败后保留上传与日志，等待续传
+    entry = journal.load(resume_id)
+    assert entry is not None
+    assert len(storage.store.uploads) == 1
+
+    uploaded.clear()
+    key = _upload(storage, video_file, resume_id)
+    # 只上传失败（缺失）的分片，沿用原 key
+    assert 2 in uploaded
+    assert set(uploaded) <= {2, 3}
+    assert key == entry["key"]
+    assert storage.read_file(file_key=key) == Path(video_file).read_bytes()
+    assert journal.load(resume_id) is None
+    assert storage.store.uploads == {}
+
+
+def test_failed_upload_without_resume_id_is_aborted(storage, journal, video_file):
+    _fail_part(storage, 1)
+    with pytest.raises(RuntimeError):
+        _upload(storage, video_file)
+    assert storage.store.uploads == {}
+    assert journal.entries() == []
+
+
+def test_abort_journaled_uploads_by_task_prefix(storage, journal, video_file):
+    bucket = storage._resolve_bucket(None)
+    _fail_part(storage, 2, times=2)
+    for task_id in ("task1", "task2"):
+        with pytest.raises(RuntimeError):
+            _upload(storage, video_file, upload_resume_id(f"{task_id}__uploaded_key", "hash", bucket))
+    assert len(storage.store.uploads) == 2
+
+    assert storage.abort_journaled_uploads(resume_prefix="task1__") == 1
+    assert len(storage.store.uploads) == 1
+    assert [entry["resume_id"].startswith("task2__") for entry in journal.entries()] == [True]
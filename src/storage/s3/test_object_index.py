@@ -0,0 +1,105 @@
+"""
+对象遍历与本地索引测试：分页遍历（含预取下一页）、SQLite 索引按前缀对账（跳过间隔内的对账、删除已不存在的对象）、
+前缀中的 LIKE 通配符按字面匹配、启用索引时最近对象与用量查询读索引
+使用内存存储替身（SimulatedSyncStorage），不需要网络
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+# 添加src目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+pytest.importorskip("boto3")
+
+from storage.s3 import object_index as object_index_module
+from storage.s3 import s3_storage
+from storage.s3.object_index import ObjectIndex
+from storage.s3.simulated_storage import MemoryObjectStore, SimulatedLink, SimulatedSyncStorage
+
+
+@pytest.fixture
+def storage():
+    storage = SimulatedSyncStorage(store=MemoryObjectStore(), link=SimulatedLink())
+    client = storage._get_client()
+    for key in ("a/1.mp4", "a/2.mp4", "a/3.mp4", "a_b/4.mp4", "b/5.mp4"):
+        client.put_object(Bucket="local", Key=key, Body=key.encode())
+    return storage
+
+
+@pytest.fixture
+def index(tmp_path):
+    return ObjectIndex(str(tmp_path / "index.db"), reconcile_interval=3600)
+
+
+@pytest.mark.parametrize("prefetch", [True, False])
+def test_iter_files_follows_pages(storage, prefetch):
+    keys = list(storage.iter_files(page_size=2, prefetch=prefetch))
+    assert keys == ["a/1.mp4", "a/2.mp4", "a/3.mp4", "a_b/4.mp4", "b/5.mp4"]
+    assert list(storage.iter_files(prefix="a/", page_size=1, prefetch=prefetch)) == ["a/1.mp4", "a/2.mp4", "a/3.mp4"]
+
+
+def test_iter_files_with_metadata(storage):
+    items = list(storage.iter_files(prefix="b/", with_metadata=True))
+    assert [(item["key"], item["size"]) for item in items] == [("b/5.mp4", len(b"b/5.mp4"))]
+    assert isinstance(items[0]["last_modified"], float)
+
+
+def test_iter_files_rejects_invalid_page_size(storage):
+    with pytest.raises(ValueError):
+        list(storage.iter_files(page_size=0))
+
+
+def test_refresh_indexes_prefix_and_skips_within_interval(storage, index):
+    assert index.refresh(storage, prefix="a/") == 3
+    assert index.usage("local", prefix="a/") == {"count": 3, "bytes": 3 * len(b"a/1.mp4")}
+    # 对账间隔内跳过
+    assert index.refresh(storage, prefix="a/") == 0
+    # 其他前缀单独对账
+    assert index.refresh(storage, prefix="b/") == 1
+
+
+def test_force_refresh_removes_deleted_objects_in_prefix_only(storage, index):
+    index.refresh(storage)
+    storage._get_client().delete_object(Bucket="local", Key="a/2.mp4")
+    storage._get_client().delete_object(Bucket="local", Key="b/5.mp4")
+
+    assert index.refresh(storage, prefix="a/", force=True) == 2
+    keys = {item["key"] for item in index.latest("local", limit=10)}
+    # a/ 下已删除的对象从索引移除；b/ 未对账，仍保留
+    assert keys == {"a/1.mp4", "a/3.mp4", "a_b/4.mp4", "b/5.mp4"}
+
+
+def test_prefix_wildcards_match_literally(storage, index):
+    index.refresh(storage)
+    # "_" 在 LIKE 中匹配任意字符，需按字面匹配
+    assert index.usage("local", prefix="a_")["count"] == 1
+    assert [item["key"] for item in index.latest("local", prefix="a_")] == ["a_b/4.mp4"]
+
+
+def test_record_put_and_delete(index):
+    index.record_put("local", "x.mp4", 10, last_modified=100)
+    index.record_put("local", "y.mp4", 20, last_modified=200)
+    index.record_put("local", "x.mp4", 30, last_modified=300)
+    assert [(i["key"], i["size"]) for i in index.latest("local")] == [("x.mp4", 30), ("y.mp4", 20)]
+    index.record_delete("local", "x.mp4")
+    assert index.usage("local") == {"count": 1, "bytes": 20}
+
+
+def test_storage_queries_use_index_when_enabled(storage, index, monkeypatch):
+    monkeypatch.setattr(s3_storage, "get_object_index", lambda: index)
+    monkeypatch.setattr(object_index_module, "get_object_index", lambda: index)
+
+    assert storage.storage_usage(prefix="a/")["count"] == 3
+    # 本进程写入实时更新索引，不需要重新对账
+    storage.upload_file(file_content=b"new", file_name="new.mp4")
+    latest = storage.latest_files(limit=1)
+    assert latest[0]["size"] == 3
+    assert storage.storage_usage()["count"] == 6
+
+
+def test_storage_queries_without_index_list_prefix(storage, monkeypatch):
+    monkeypatch.setattr(s3_storage, "get_object_index", lambda: None)
+    assert storage.storage_usage(prefix="a/") == {"count": 3, "bytes": 3 * len(b"a/1.mp4")}
+    assert len(storage.latest_files(prefix="a", limit=2)) == 2
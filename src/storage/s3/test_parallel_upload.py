@@ -0,0 +1,66 @@
+"""
+并发分片上传测试：分片大小选择、分片并发执行与首个分片失败即停止
+使用内存存储替身（SimulatedSyncStorage），不需要网络
+"""
+import os
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+# 添加src目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+pytest.importorskip("boto3")
+
+from storage.s3.s3_storage import MAX_PARTS, MIN_PART_SIZE, choose_part_size, map_parts
+from storage.s3.simulated_storage import MemoryObjectStore, SimulatedLink, SimulatedSyncStorage
+
+MB = 1024 * 1024
+
+
+def test_choose_part_size():
+    # 小文件：不小于 5MB
+    assert choose_part_size(1 * MB, 4, 16 * MB) == MIN_PART_SIZE
+    # 每个并发约 2 片，按 1MB 对齐
+    assert choose_part_size(100 * MB, 4, 64 * MB) == 13 * MB
+    # 不超过 max_part_size
+    assert choose_part_size(1024 * MB, 4, 16 * MB) == 16 * MB
+    # max_part_size 小于 5MB 时按 5MB
+    assert choose_part_size(1024 * MB, 4, 1 * MB) == MIN_PART_SIZE
+    # 超大文件放大分片以满足 10000 片上限
+    size = 200 * 1024 * MB
+    part_size = choose_part_size(size, 4, 16 * MB)
+    assert part_size % MB == 0
+    assert -(-size // part_size) <= MAX_PARTS
+
+
+def test_parallel_upload_round_trip(tmp_path):
+    storage = SimulatedSyncStorage(store=MemoryObjectStore(), link=SimulatedLink())
+    path = tmp_path / "merged.mp4"
+    path.write_bytes(os.urandom(12 * MB))
+    key = storage.parallel_upload_file(file_path=str(path), file_name="merged.mp4", max_concurrency=2,
+                                       max_part_size=16 * MB)
+    assert storage.read_file(file_key=key) == path.read_bytes()
+    # 分片上传已完成，不残留未完成的上传
+    assert storage.store.uploads == {}
+
+
+def test_map_parts_stops_after_first_failure():
+    started = []
+    lock = threading.Lock()
+
+    def _part(n):
+        with lock:
+            started.append(n)
+        if n == 1:
+            raise RuntimeError("boom")
+        threading.Event().wait(0.02)
+        return n
+
+    with pytest.raises(RuntimeError):
+        map_parts(_part, range(1, 51), max_workers=2)
+    # 失败后尚未开始的分片被取消
+    assert len(started) < 10
+    assert sorted(map_parts(lambda n: n, range(1, 6), max_workers=3)) == [1, 2, 3, 4, 5]
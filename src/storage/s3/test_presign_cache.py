@@ -0,0 +1,165 @@
+"""
+签名 URL 缓存测试：有效期内命中、过刷新点后返回旧 URL 并在后台只刷新一次、安全余量内同步重新签名、
+刷新失败保留旧 URL、按容量淘汰；S3SyncStorage 经缓存签名
+时间替换为可调的时钟，签名替换为计数函数，不需要网络
+"""
+import sys
+import threading
+import time
+import types
+from pathlib import Path
+
+import pytest
+
+# 添加src目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+pytest.importorskip("boto3")
+
+from storage.s3 import presign_cache as presign_cache_module
+from storage.s3 import s3_storage
+from storage.s3.presign_cache import PresignedUrlCache
+from storage.s3.simulated_storage import MemoryObjectStore, SimulatedLink, SimulatedSyncStorage
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+class _Signer:
+    """每次签名返回带序号的 URL；blocked 时等待放行，failing 时抛出异常"""
+
+    def __init__(self):
+        self.count = 0
+        self.failing = False
+        self.signed = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self):
+        self.release.wait(5)
+        self.count += 1
+        try:
+            if self.failing:
+                raise RuntimeError("sign failed")
+            return f"https://signed/v{self.count}"
+        finally:
+            self.signed.set()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(presign_cache_module, "time", types.SimpleNamespace(time=clock.time))
+    return clock
+
+
+def _key(expire_time: int = 1000):
+    return ("https://sign", "bucket", "a.mp4", expire_time)
+
+
+def _wait_refresh(cache: PresignedUrlCache, signer: _Signer) -> None:
+    assert signer.signed.wait(5)
+    # 签名返回后刷新线程还需写入缓存并清除进行中标记
+    deadline = time.monotonic() + 5
+    while cache._refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_hit_before_refresh_point_does_not_sign(clock):
+    cache = PresignedUrlCache(safety_margin=60, refresh_ratio=0.5)
+    signer = _Signer()
+    assert cache.get(_key(), signer) == "https://signed/v1"
+    clock.now += 400
+    assert cache.get(_key(), signer) == "https://signed/v1"
+    assert signer.count == 1
+    assert not cache.needs_refresh(_key())
+
+
+def test_refresh_ahead_returns_cached_url_and_refreshes_once(clock):
+    cache = PresignedUrlCache(safety_margin=60, refresh_ratio=0.5)
+    signer = _Signer()
+    cache.get(_key(), signer)
+
+    clock.now += 600
+    signer.signed.clear()
+    signer.release.clear()
+    # 过了刷新点：立即返回旧 URL，后台刷新进行中时不重复提交
+    assert cache.get(_key(), signer) == "https://signed/v1"
+    assert cache.get(_key(), signer) == "https://signed/v1"
+    signer.release.set()
+    _wait_refresh(cache, signer)
+
+    assert signer.count == 2
+    assert cache.get(_key(), signer) == "https://signed/v2"
+    assert not cache.needs_refresh(_key())
+
+
+def test_url_within_safety_margin_is_resigned_synchronously(clock):
+    cache = PresignedUrlCache(safety_margin=60, refresh_ratio=0.5)
+    signer = _Signer()
+    cache.get(_key(), signer)
+    clock.now += 950
+    assert cache.peek(_key()) is None
+    assert cache.get(_key(), signer) == "https://signed/v2"
+
+
+def test_short_lived_url_margin_is_capped_to_half(clock):
+    cache = PresignedUrlCache(safety_margin=60, refresh_ratio=0.9)
+    signer = _Signer()
+    cache.get(_key(expire_time=60), signer)
+    # 有效期 60 秒时余量为 30 秒，而不是整个有效期
+    clock.now += 29
+    assert cache.peek(_key(expire_time=60)) == "https://signed/v1"
+    clock.now += 2
+    assert cache.peek(_key(expire_time=60)) is None
+
+
+def test_failed_refresh_keeps_old_url(clock):
+    cache = PresignedUrlCache(safety_margin=60, refresh_ratio=0.5)
+    signer = _Signer()
+    cache.get(_key(), signer)
+
+    clock.now += 600
+    signer.failing = True
+    signer.signed.clear()
+    assert cache.get(_key(), signer) == "https://signed/v1"
+    _wait_refresh(cache, signer)
+    assert cache.peek(_key()) == "https://signed/v1"
+    assert cache._refreshing == set()
+
+
+def test_evicts_least_recently_used(clock):
+    cache = PresignedUrlCache(max_entries=2)
+    signer = _Signer()
+    for name in ("a", "b"):
+        cache.get(("s", "bucket", name, 1000), signer)
+    cache.get(("s", "bucket", "a", 1000), signer)
+    cache.get(("s", "bucket", "c", 1000), signer)
+    assert cache.peek(("s", "bucket", "a", 1000)) is not None
+    assert cache.peek(("s", "bucket", "b", 1000)) is None
+
+
+def test_storage_signs_through_shared_cache(monkeypatch):
+    cache = PresignedUrlCache()
+    monkeypatch.setattr(s3_storage, "get_presign_cache", lambda: cache)
+    storage = SimulatedSyncStorage(store=MemoryObjectStore(), link=SimulatedLink())
+    signed = []
+    original = storage._sign_url
+
+    def _counting_sign(**kwargs):
+        signed.append(kwargs["key"])
+        return original(**kwargs)
+
+    monkeypatch.setattr(storage, "_sign_url", _counting_sign)
+    first = storage.generate_presigned_url(key="a.mp4")
+    assert storage.generate_presigned_url(key="a.mp4") == first
+    # 有效期不同的签名分别缓存
+    storage.generate_presigned_url(key="a.mp4", expire_time=600)
+    # 不使用缓存时每次签名
+    storage.generate_presigned_url(key="a.mp4", use_cache=False)
+    assert signed == ["a.mp4", "a.mp4", "a.mp4"]
@@ -0,0 +1,100 @@
+"""
+范围读取与流式下载测试：末尾不足一块的范围、结束偏移超出对象末尾、末尾 N 字节、非法范围、空对象，
+流式下载失败时不留下半截文件
+使用内存存储替身（SimulatedSyncStorage），不需要网络
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# 添加src目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+pytest.importorskip("boto3")
+
+from botocore.exceptions import ClientError
+
+from storage.s3.simulated_storage import MemoryObjectStore, SimulatedLink, SimulatedSyncStorage
+
+DATA = bytes(range(256)) * 40  # 10240 字节
+
+
+@pytest.fixture
+def storage():
+    storage = SimulatedSyncStorage(store=MemoryObjectStore(), link=SimulatedLink())
+    client = storage._get_client()
+    client.put_object(Bucket="local", Key="data.bin", Body=DATA)
+    client.put_object(Bucket="local", Key="empty.bin", Body=b"")
+    return storage
+
+
+def test_read_range(storage):
+    assert storage.read_range(file_key="data.bin", start=0, end=9) == DATA[:10]
+    assert storage.read_range(file_key="data.bin", start=100, end=100) == DATA[100:101]
+    # 未给出 end：读到末尾
+    assert storage.read_range(file_key="data.bin", start=10000) == DATA[10000:]
+    # end 超出对象末尾：截断到末尾
+    assert storage.read_range(file_key="data.bin", start=10200, end=99999) == DATA[10200:]
+    # 只给出 end：末尾 N 字节
+    assert storage.read_range(file_key="data.bin", start=None, end=16) == DATA[-16:]
+
+
+def test_read_range_rejects_invalid_ranges(storage):
+    with pytest.raises(ValueError):
+        storage.read_range(file_key="data.bin", start=-1)
+    with pytest.raises(ValueError):
+        storage.read_range(file_key="data.bin", start=10, end=9)
+    # 起始偏移超出对象大小
+    with pytest.raises(ClientError) as excinfo:
+        storage.read_range(file_key="data.bin", start=len(DATA))
+    assert excinfo.value.response["Error"]["Code"] == "InvalidRange"
+
+
+def test_iter_file_chunks_with_final_partial_chunk(storage):
+    chunks = list(storage.iter_file_chunks(file_key="data.bin", chunk_size=4096))
+    assert [len(c) for c in chunks] == [4096, 4096, 2048]
+    assert b"".join(chunks) == DATA
+
+
+def test_iter_file_chunks_over_range(storage):
+    chunks = list(storage.iter_file_chunks(file_key="data.bin", chunk_size=1000, start=9000, end=99999))
+    assert [len(c) for c in chunks] == [1000, 240]
+    assert b"".join(chunks) == DATA[9000:]
+
+
+def test_empty_object(storage, tmp_path):
+    assert storage.read_file(file_key="empty.bin") == b""
+    assert list(storage.iter_file_chunks(file_key="empty.bin")) == []
+    target = tmp_path / "empty.bin"
+    assert storage.download_to_file(file_key="empty.bin", file_path=str(target)) == 0
+    assert target.read_bytes() == b""
+
+
+def test_download_to_file(storage, tmp_path):
+    target = tmp_path / "nested" / "data.bin"
+    assert storage.download_to_file(file_key="data.bin", file_path=str(target), chunk_size=3000) == len(DATA)
+    assert target.read_bytes() == DATA
+    assert os.listdir(target.parent) == ["data.bin"]
+
+
+def test_failed_download_keeps_existing_file(storage, tmp_path):
+    target = tmp_path / "data.bin"
+    target.write_bytes(b"previous")
+    with pytest.raises(ClientError):
+        storage.download_to_file(file_key="missing.bin", file_path=str(target))
+    # 不留下半截文件，已有文件不被覆盖
+    assert target.read_bytes() == b"previous"
+    assert os.listdir(tmp_path) == ["data.bin"]
+
+
+def test_failed_stream_removes_partial_file(storage, tmp_path, monkeypatch):
+    def _broken_chunks(**kwargs):
+        yield DATA[:1000]
+        raise ConnectionError("connection reset")
+
+    monkeypatch.setattr(storage, "iter_file_chunks", _broken_chunks)
+    with pytest.raises(ConnectionError):
+        storage.download_to_file(file_key="data.bin", file_path=str(tmp_path / "data.bin"))
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,85 @@
+"""
+异步存储签名 URL 测试：缓存命中过刷新点时在后台重新签名，后台任务被持有引用并在 aclose 时取消
+使用内存存储替身（SimulatedSyncStorage），签名替换为计数的协程，不需要网络
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+# 添加src目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+pytest.importorskip("boto3")
+pytest.importorskip("httpx")
+
+from storage.s3 import s3_async_storage
+from storage.s3.presign_cache import PresignedUrlCache
+from storage.s3.s3_async_storage import S3AsyncStorage
+from storage.s3.simulated_storage import MemoryObjectStore, SimulatedLink, SimulatedSyncStorage
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    # 刷新点为 0：第二次命中即触发后台刷新
+    cache = PresignedUrlCache(refresh_ratio=0)
+    monkeypatch.setattr(s3_async_storage, "get_presign_cache", lambda: cache)
+    sync = SimulatedSyncStorage(store=MemoryObjectStore(), link=SimulatedLink())
+    return S3AsyncStorage(access_key="", secret_key="", bucket_name="", sync_storage=sync)
+
+
+def test_background_refresh_replaces_cached_url(storage):
+    signed = []
+
+    async def _sign_url(*, key, bucket=None, expire_time=1800):
+        signed.append(key)
+        return f"https://signed/{key}?v={len(signed)}"
+
+    storage._sign_url = _sign_url
+
+    async def _run():
+        first = await storage.generate_presigned_url(key="a.mp4")
+        # 命中缓存立即返回旧 URL，同时在后台重新签名
+        second = await storage.generate_presigned_url(key="a.mp4")
+        assert second == first
+        assert len(storage._background) == 1
+        await asyncio.gather(*storage._background)
+        third = await storage.generate_presigned_url(key="a.mp4", use_cache=True)
+        await storage.aclose()
+        return first, third
+
+    first, third = asyncio.run(_run())
+    assert first.endswith("v=1")
+    assert third.endswith("v=2")
+    assert storage._background == set()
+    assert storage._refreshing == set()
+
+
+def test_aclose_cancels_pending_refresh(storage):
+    async def _run():
+        release = asyncio.Event()
+        calls = []
+
+        async def _sign_url(*, key, bucket=None, expire_time=1800):
+            calls.append(key)
+            if len(calls) > 1:
+                await release.wait()
+            return f"https://signed/{key}"
+
+        storage._sign_url = _sign_url
+        await storage.generate_presigned_url(key="a.mp4")
+        await storage.generate_presigned_url(key="a.mp4")
+        # 同一个 key 的刷新进行中时不重复创建
+        await storage.generate_presigned_url(key="a.mp4")
+        await asyncio.sleep(0)
+        assert len(storage._background) == 1
+        refresh = next(iter(storage._background))
+
+        await storage.aclose()
+        return refresh
+
+    refresh = asyncio.run(_run())
+    assert refresh.cancelled()
+    assert storage._background == set()
+    assert storage._refreshing == set()
@@ -0,0 +1,176 @@
+"""
+URL 转存测试：按源地址选择服务端复制 / 分片 Range 下载 / 顺序流式转存，各方式写入的对象与源文件逐字节一致
+使用内存存储替身（SimulatedSyncStorage）与本机 HTTP 源站，不需要外网
+"""
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+# 添加src目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+pytest.importorskip("boto3")
+
+from storage.s3 import transfer as transfer_module
+from storage.s3.s3_storage import MIN_PART_SIZE
+from storage.s3.simulated_storage import MemoryObjectStore, SimulatedLink, SimulatedSyncStorage
+from storage.s3.transfer import TransferEngine
+
+MB = 1024 * 1024
+
+
+class _SourceHandler(BaseHTTPRequestHandler):
+    """源站：HEAD 返回大小，GET 支持单个 bytes=start-end 区间（accept_ranges 关闭时忽略 Range）"""
+
+    def log_message(self, *args):
+        pass
+
+    def _body(self):
+        return self.server.files.get(self.path)
+
+    def do_HEAD(self):
+        body = self._body()
+        self.server.requests.append(("HEAD", None))
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Content-Type", "video/mp4")
+        if self.server.accept_ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+
+    def do_GET(self):
+        body = self._body()
+        requested = self.headers.get("Range")
+        self.server.requests.append(("GET", requested))
+        if body is None:
+            self.send_error(404)
+            return
+        if requested and self.server.accept_ranges:
+            start, end = (int(v) for v in requested[len("bytes="):].split("-"))
+            part = body[start:end + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{start + len(part) - 1}/{len(body)}")
+        else:
+            part = body
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(part)))
+        self.send_header("Content-Type", "video/mp4")
+        self.end_headers()
+        self.wfile.write(part)
+
+
+@pytest.fixture
+def source():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _SourceHandler)
+    server.files = {}
+    server.requests = []
+    server.accept_ranges = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def storage():
+    storage = SimulatedSyncStorage(store=MemoryObjectStore(), link=SimulatedLink())
+    # 源 URL 以该地址开头时视为存储内对象
+    storage.endpoint_url = "http://s3.internal"
+    return storage
+
+
+def _read(storage, key: str) -> bytes:
+    return storage._get_client().get_object(Bucket=storage.bucket_name, Key=key)["Body"].read()
+
+
+def _url(server, path: str) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}{path}"
+
+
+def test_internal_source_uses_server_side_copy(storage):
+    data = os.urandom(3 * MB)
+    storage._get_client().put_object(Bucket="local", Key="videos/src.mp4", Body=data)
+    engine = TransferEngine(storage)
+
+    for url in ("http://s3.internal/local/videos/src.mp4", "http://local.s3.internal/videos/src.mp4"):
+        key = engine.transfer_from_url(url)
+        assert _read(storage, key) == data
+        assert engine.last_stats["mode"] == "copy"
+        assert engine.last_stats["bytes_through_app"] == 0
+
+
+def test_large_internal_source_is_copied_in_parts(storage, monkeypatch):
+    monkeypatch.setattr(transfer_module, "MAX_COPY_OBJECT_SIZE", MIN_PART_SIZE)
+    data = os.urandom(2 * MIN_PART_SIZE + 123)
+    storage._get_client().put_object(Bucket="local", Key="big.mp4", Body=data)
+
+    engine = TransferEngine(storage, part_size=MIN_PART_SIZE)
+    key = engine.transfer_from_url("http://s3.internal/local/big.mp4")
+    assert _read(storage, key) == data
+    assert engine.last_stats["size"] == len(data)
+
+
+def test_copy_mode_rejects_external_source(storage, source):
+    with pytest.raises(ValueError):
+        TransferEngine(storage).transfer_from_url(_url(source, "/a.mp4"), mode="copy")
+
+
+def test_range_capable_source_uses_ranged_transfer(storage, source):
+    # 最后一个分片不足 part_size
+    data = os.urandom(2 * MIN_PART_SIZE + 4321)
+    source.files["/clip.mp4"] = data
+    engine = TransferEngine(storage, part_size=MIN_PART_SIZE, concurrency=3)
+
+    key = engine.transfer_from_url(_url(source, "/clip.mp4"))
+    assert _read(storage, key) == data
+    assert engine.last_stats["mode"] == "ranged"
+    assert engine.last_stats["bytes_through_app"] == 2 * len(data)
+    ranges = [r for method, r in source.requests if method == "GET"]
+    assert sorted(ranges) == sorted([
+        f"bytes=0-{MIN_PART_SIZE - 1}",
+        f"bytes={MIN_PART_SIZE}-{2 * MIN_PART_SIZE - 1}",
+        f"bytes={2 * MIN_PART_SIZE}-{len(data) - 1}",
+    ])
+
+
+@pytest.mark.parametrize("accept_ranges, size, mode", [
+    (False, 2 * MIN_PART_SIZE, None),   # 源站不支持 Range
+    (True, MB, None),                   # 不足一个分片
+    (True, 2 * MIN_PART_SIZE, "stream"),  # 强制流式
+])
+def test_falls_back_to_stream(storage, source, accept_ranges, size, mode):
+    data = os.urandom(size)
+    source.files["/clip.mp4"] = data
+    source.accept_ranges = accept_ranges
+    engine = TransferEngine(storage, part_size=MIN_PART_SIZE)
+
+    key = engine.transfer_from_url(_url(source, "/clip.mp4"), mode=mode)
+    assert _read(storage, key) == data
+    assert engine.last_stats["mode"] == "stream"
+    # 流式转存只发起一次不带 Range 的下载
+    assert [r for method, r in source.requests if method == "GET"] == [None]
+    assert (("HEAD", None) in source.requests) == (mode != "stream")
+
+
+def test_failed_ranged_transfer_aborts_multipart_upload(storage, source, monkeypatch):
+    source.files["/clip.mp4"] = os.urandom(2 * MIN_PART_SIZE + 1)
+    engine = TransferEngine(storage, part_size=MIN_PART_SIZE, max_retries=0)
+    # HEAD 声明支持 Range，但下载时源站忽略 Range 返回整个文件
+    original = _SourceHandler.do_GET
+
+    def _ignore_range(handler):
+        handler.server.accept_ranges = False
+        original(handler)
+
+    monkeypatch.setattr(_SourceHandler, "do_GET", _ignore_range)
+    with pytest.raises(RuntimeError):
+        engine.transfer_from_url(_url(source, "/clip.mp4"))
+    assert storage._get_client().list_multipart_uploads(Bucket="local").get("Uploads", []) == []
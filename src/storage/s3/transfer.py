@@ -0,0 +1,203 @@
+import math
+import time
+import urllib.request as urllib_request
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse, unquote
+
+from storage.s3.object_index import record_object_put
+from storage.s3.s3_storage import MIN_PART_SIZE, MAX_PARTS, map_parts
+import logging
+logger = logging.getLogger(__name__)
+
+# S3 单次 copy_object 的大小上限，超过时需分片复制
+MAX_COPY_OBJECT_SIZE = 5 * 1024 * 1024 * 1024
+
+
+class TransferStats(dict):
+    """单次传输统计：mode（copy/ranged/stream）、size、bytes_through_app、seconds"""
+
+    @property
+    def seconds_per_gb(self) -> Optional[float]:
+        size = self.get("size") or 0
+        if not size:
+            return None
+        return self["seconds"] / (size / 1024 ** 3)
+
+
+class TransferEngine:
+    """URL 到对象存储的传输引擎
+
+    按代价从低到高选择传输方式：
+    1. copy：源 URL 就在当前存储中，使用服务端复制，数据不经过本机
+    2. ranged：源站支持 Range 且已知大小，按分片并发下载并直接上传为对应分片；
+       每个工作线程同时只持有一个分片，缓冲上限为 part_size × concurrency
+    3. stream：其他情况回退为顺序流式转存
+    """
+
+    def __init__(self, storage, *, part_size: int = 8 * 1024 * 1024, concurrency: int = 4, max_retries: int = 3):
+        self.storage = storage
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.last_stats: Optional[TransferStats] = None
+
+    # ==================== 源地址识别 ====================
+
+    def _resolve_internal_source(self, url: str, bucket: str) -> Optional[Tuple[str, str]]:
+        """源 URL 指向当前存储时返回 (bucket, key)，支持 path-style 与 virtual-hosted-style"""
+        endpoint = urlparse(self.storage.endpoint_url or "")
+        parsed = urlparse(url)
+        if not endpoint.hostname or not parsed.hostname:
+            return None
+
+        path = unquote(parsed.path).lstrip("/")
+        if parsed.hostname == endpoint.hostname:
+            source_bucket, _, key = path.partition("/")
+            if source_bucket == bucket and key:
+                return source_bucket, key
+        elif parsed.hostname == f"{bucket}.{endpoint.hostname}" and path:
+            return bucket, path
+        return None
+
+    def _probe(self, url: str, timeout: int) -> Tuple[Optional[int], bool, Optional[str]]:
+        """HEAD 源地址，返回 (大小, 是否支持 Range, Content-Type)；探测失败时返回 (None, False, None)"""
+        try:
+            request = urllib_request.Request(url, method="HEAD")
+            with urllib_request.urlopen(request, timeout=timeout) as resp:
+                length = resp.headers.get("Content-Length")
+                accept_ranges = (resp.headers.get("Accept-Ranges") or "").lower()
+                return (int(length) if length else None), accept_ranges == "bytes", resp.headers.get("Content-Type")
+        except Exception as e:
+            logger.debug(f"HEAD {url} failed, fall back to streaming: {e}")
+            return None, False, None
+
+    # ==================== 传输方式 ====================
+
+    def _retry(self, action: str, fn):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return fn()
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = min(0.5 * (2 ** attempt), 8)
+                logger.warning(f"{action} failed, retry in {delay}s: {e}")
+                time.sleep(delay)
+
+    def _copy(self, source_bucket: str, source_key: str, target_bucket: str, key: str) -> int:
+        """服务端复制，返回对象大小"""
+        client = self.storage._get_client()
+        size = client.head_object(Bucket=source_bucket, Key=source_key)["ContentLength"]
+        copy_source = {"Bucket": source_bucket, "Key": source_key}
+
+        if size <= MAX_COPY_OBJECT_SIZE:
+            client.copy_object(Bucket=target_bucket, Key=key, CopySource=copy_source)
+            return size
+
+        part_size = max(self.part_size, math.ceil(size / MAX_PARTS))
+        upload_id = client.create_multipart_upload(Bucket=target_bucket, Key=key)["UploadId"]
+
+        def _copy_part(part_number: int) -> Dict[str, Any]:
+            start = (part_number - 1) * part_size
+            end = min(start + part_size, size) - 1
+            resp = self._retry(
+                f"upload_part_copy {part_number}",
+                lambda: client.upload_part_copy(Bucket=target_bucket, Key=key, UploadId=upload_id,
+                                                PartNumber=part_number, CopySource=copy_source,
+                                                CopySourceRange=f"bytes={start}-{end}"),
+            )
+            return {"PartNumber": part_number, "ETag": resp["CopyPartResult"]["ETag"]}
+
+        self._run_parts(client, target_bucket, key, upload_id, _copy_part, math.ceil(size / part_size))
+        return size
+
+    def _ranged(self, url: str, size: int, target_bucket: str, key: str, content_type: str, timeout: int) -> int:
+        """分片并发 Range 下载，每片下载完成后立即上传为同序号分片"""
+        client = self.storage._get_client()
+        part_size = max(self.part_size, math.ceil(size / MAX_PARTS))
+        upload_id = client.create_multipart_upload(Bucket=target_bucket, Key=key, ContentType=content_type)["UploadId"]
+
+        def _fetch(start: int, end: int) -> bytes:
+            request = urllib_request.Request(url, headers={"Range": f"bytes={start}-{end}"})
+            with urllib_request.urlopen(request, timeout=timeout) as resp:
+                if resp.status != 206:
+                    raise RuntimeError(f"源站未按 Range 返回分片（HTTP {resp.status}）")
+                data = resp.read()
+            if len(data) != end - start + 1:
+                raise RuntimeError(f"分片长度不符：期望 {end - start + 1}，实际 {len(data)}")
+            return data
+
+        def _transfer_part(part_number: int) -> Dict[str, Any]:
+            start = (part_number - 1) * part_size
+            end = min(start + part_size, size) - 1
+            data = self._retry(f"range get {start}-{end}", lambda: _fetch(start, end))
+            resp = self._retry(
+                f"upload_part {part_number}",
+                lambda: client.upload_part(Bucket=target_bucket, Key=key, UploadId=upload_id,
+                                           PartNumber=part_number, Body=data),
+            )
+            return {"PartNumber": part_number, "ETag": resp["ETag"]}
+
+        self._run_parts(client, target_bucket, key, upload_id, _transfer_part, math.ceil(size / part_size))
+        return size
+
+    def _run_parts(self, client, bucket: str, key: str, upload_id: str, fn, part_count: int) -> None:
+        try:
+            parts = map_parts(fn, range(1, part_count + 1), min(self.concurrency, part_count))
+            client.complete_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id,
+                                             MultipartUpload={"Parts": sorted(parts, key=lambda p: p["PartNumber"])})
+        except Exception:
+            try:
+                client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+            except Exception as ae:
+                logger.error(f"abort_multipart_upload failed: {ae}")
+            raise
+
+    # ==================== 入口 ====================
+
+    def transfer_from_url(self, url: str, *, bucket: Optional[str] = None, timeout: int = 30, mode: Optional[str] = None) -> str:
+        """
+        把 URL 指向的文件转存到对象存储
+
+        Args:
+            url: 源文件 URL
+            bucket: 目标桶；为空时取环境变量或实例默认值
+            timeout: 单次 HTTP 请求超时时间（秒）
+            mode: 强制使用的传输方式（copy/ranged/stream），默认自动选择
+
+        Returns:
+            最终写入的对象 key；本次统计记录在 last_stats
+        """
+        target_bucket = self.storage._resolve_bucket(bucket)
+        file_name = Path(unquote(urlparse(url).path)).name or "file"
+        started = time.monotonic()
+
+        internal = self._resolve_internal_source(url, target_bucket) if mode in (None, "copy") else None
+        if mode == "copy" and not internal:
+            raise ValueError(f"源地址不在当前存储中，无法服务端复制: {url}")
+        if internal:
+            key = self.storage._generate_object_key(original_name=file_name)
+            size = self._copy(internal[0], internal[1], target_bucket, key)
+            record_object_put(target_bucket, key, size)
+            self.last_stats = TransferStats(mode="copy", size=size, bytes_through_app=0,
+                                            seconds=time.monotonic() - started)
+            return key
+
+        size, accepts_ranges, content_type = (None, False, None) if mode == "stream" else self._probe(url, timeout)
+        if size and accepts_ranges and size > self.part_size and mode in (None, "ranged"):
+            key = self.storage._generate_object_key(original_name=file_name)
+            self._ranged(url, size, target_bucket, key, content_type or "application/octet-stream", timeout)
+            record_object_put(target_bucket, key, size)
+            # 数据经本机下载一次、上传一次
+            self.last_stats = TransferStats(mode="ranged", size=size, bytes_through_app=size * 2,
+                                            seconds=time.monotonic() - started)
+            return key
+
+        key = self.storage._stream_upload_from_url(url=url, bucket=bucket, timeout=timeout)
+        self.last_stats = TransferStats(mode="stream", size=size, bytes_through_app=(size * 2 if size else None),
+                                        seconds=time.monotonic() - started)
+        return key
+
+
+__all__ = ["TransferEngine", "TransferStats"]
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOURNAL_DIR = os.getenv("STORAGE_UPLOAD_JOURNAL_DIR", "/tmp/tnho_upload_journal")
+# 超过该时间未完成的分片上传视为废弃：日志不再用于续传，janitor 中止服务端上传
+DEFAULT_UPLOAD_TTL = int(os.getenv("STORAGE_UPLOAD_TTL", str(24 * 3600)))
+
+
+def upload_resume_id(scope: str, content_hash: str, bucket: str) -> str:
+    """
+    续传标识：调用方给出的稳定范围（如 任务ID + 阶段）+ 内容哈希 + 桶
+
+    同一任务阶段重试时上传相同内容得到相同标识；内容不同（如重新拼接的结果不一致）时标识不同，
+    不会把不同内容的分片拼成一个对象。范围作为前缀，便于按任务清理（见 S3SyncStorage.abort_journaled_uploads）。
+    """
+    safe_scope = re.sub(r"[^A-Za-z0-9_.-]", "_", scope)
+    digest = hashlib.sha256(f"{content_hash}|{bucket}".encode("utf-8")).hexdigest()[:32]
+    return f"{safe_scope}__{digest}"
+
+
+class UploadJournal:
+    """分片上传日志
+
+    每个进行中的分片上传一个 JSON 文件，记录 UploadId、对象 key、分片大小与已完成分片的 ETag；
+    进程崩溃重启后按续传标识找回，只上传缺失的分片。
+    """
+
+    def __init__(self, root: str = DEFAULT_JOURNAL_DIR, ttl: int = DEFAULT_UPLOAD_TTL):
+        self.root = root
+        self.ttl = ttl
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _path(self, resume_id: str) -> str:
+        return os.path.join(self.root, f"{resume_id}.json")
+
+    def _write(self, resume_id: str, entry: Dict[str, Any]) -> None:
+        tmp_path = os.path.join(self.root, f".{resume_id}.{uuid.uuid4().hex[:8]}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, self._path(resume_id))
+
+    def load(self, resume_id: str) -> Optional[Dict[str, Any]]:
+        """读取未过期的上传记录"""
+        try:
+            with open(self._path(resume_id), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get("created_at", 0) > self.ttl:
+            self.finish(resume_id)
+            return None
+        return entry
+
+    def start(self, resume_id: str, *, bucket: str, key: str, upload_id: str, part_size: int) -> Dict[str, Any]:
+        entry = {
+            "bucket": bucket,
+            "key": key,
+            "upload_id": upload_id,
+            "part_size": part_size,
+            "parts": {},
+            "created_at": time.time(),
+        }
+        with self._lock:
+            self._write(resume_id, entry)
+        return entry
+
+    def record_part(self, resume_id: str, part_number: int, etag: str) -> None:
+        """记录已完成的分片（多线程上传时串行写入）"""
+        with self._lock:
+            try:
+                with open(self._path(resume_id), "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                return
+            entry["parts"][str(part_number)] = etag
+            self._write(resume_id, entry)
+
+    def finish(self, resume_id: str) -> None:
+        """上传完成或中止后删除记录"""
+        try:
+            os.remove(self._path(resume_id))
+        except OSError:
+            pass
+
+    def entries(self) -> List[Dict[str, Any]]:
+        result = []
+        for name in os.listdir(self.root):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.root, name), "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                continue
+            entry["resume_id"] = name[:-len(".json")]
+            result.append(entry)
+        return result
+
+    def forget_upload(self, upload_id: str) -> None:
+        """删除指向某个 UploadId 的记录（janitor 中止上传后调用）"""
+        for entry in self.entries():
+            if entry.get("upload_id") == upload_id:
+                self.finish(entry["resume_id"])
+
+
+_journal: Optional[UploadJournal] = None
+_journal_lock = threading.Lock()
+
+
+def get_upload_journal() -> UploadJournal:
+    """获取进程内共享的分片上传日志"""
+    global _journal
+    if _journal is None:
+        with _journal_lock:
+            if _journal is None:
+                _journal = UploadJournal()
+    return _journal
+
+
+__all__ = ["UploadJournal", "get_upload_journal", "upload_resume_id", "DEFAULT_UPLOAD_TTL"]
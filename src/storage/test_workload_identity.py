@@ -0,0 +1,183 @@
+"""
+工作负载身份凭证测试：令牌缓存与 JWT 过期时间解析、并发只获取一次、到达刷新点前由后台线程提前刷新、
+后台刷新失败时继续使用旧令牌并重试、stop() 结束刷新线程且不再重启
+coze_workload_identity 客户端替换为返回短有效期 JWT 的替身，不需要网络
+"""
+import asyncio
+import base64
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+# 添加src目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from storage import workload_identity as workload_identity_module
+from storage.workload_identity import WorkloadIdentityProvider
+
+
+def _jwt(exp: float, seq: int) -> str:
+    def _part(data):
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip("=")
+    return f"{_part({'alg': 'none'})}.{_part({'exp': exp, 'seq': seq})}.sig"
+
+
+class _Issuer:
+    """令牌签发替身：每次获取返回新序号的令牌；failing 时抛出异常"""
+
+    def __init__(self, lifetime: float):
+        self.lifetime = lifetime
+        self.calls = 0
+        self.tokens = []
+        self.failing = False
+        self.delay = 0.0
+        self._lock = threading.Lock()
+
+    def client(self):
+        issuer = self
+
+        class _Client:
+            def get_access_token(self):
+                time.sleep(issuer.delay)
+                with issuer._lock:
+                    issuer.calls += 1
+                    if issuer.failing:
+                        raise RuntimeError("token service unavailable")
+                    token = _jwt(time.time() + issuer.lifetime, issuer.calls)
+                    issuer.tokens.append(token)
+                    return token
+
+            def close(self):
+                pass
+
+        return _Client()
+
+
+def _wait_until(condition, timeout: float = 5) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+@pytest.fixture
+def make_provider(monkeypatch):
+    providers = []
+
+    def _make(issuer: _Issuer, **kwargs):
+        provider = WorkloadIdentityProvider(**kwargs)
+        monkeypatch.setattr(provider, "_new_client", issuer.client)
+        providers.append(provider)
+        return provider
+
+    yield _make
+    for provider in providers:
+        provider.stop()
+
+
+def test_token_is_cached_until_jwt_expiry(make_provider):
+    issuer = _Issuer(lifetime=3600)
+    provider = make_provider(issuer, safety_margin=30, refresh_ratio=0.2)
+
+    token = provider.get_access_token()
+    assert provider.get_access_token() == token
+    assert asyncio.run(provider.aget_access_token()) == token
+    assert issuer.calls == 1
+    # 过期时间取自 JWT 的 exp，而不是默认有效期
+    assert provider._token_expires_at == pytest.approx(time.time() + 3600, abs=5)
+
+    assert provider.get_access_token(force_refresh=True) != token
+    assert issuer.calls == 2
+
+
+def test_concurrent_callers_fetch_once(make_provider):
+    issuer = _Issuer(lifetime=3600)
+    issuer.delay = 0.1
+    provider = make_provider(issuer)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(provider.get_access_token())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert issuer.calls == 1
+    assert set(results) == {issuer.tokens[0]}
+
+
+def test_background_refresh_before_expiry(make_provider):
+    # 有效期 3 秒、刷新比例 0.5：约 1.5 秒后到达刷新点，远早于过期
+    issuer = _Issuer(lifetime=3)
+    provider = make_provider(issuer, safety_margin=0, refresh_ratio=0.5)
+
+    first = provider.get_access_token()
+    issuer.lifetime = 3600
+    assert _wait_until(lambda: issuer.calls == 2)
+    # 请求路径上直接拿到新令牌，不再获取
+    assert provider.get_access_token() == issuer.tokens[1] != first
+    assert issuer.calls == 2
+
+
+def test_failed_background_refresh_keeps_token_and_retries(make_provider):
+    issuer = _Issuer(lifetime=3)
+    provider = make_provider(issuer, safety_margin=0, refresh_ratio=0.5)
+
+    first = provider.get_access_token()
+    issuer.failing = True
+    # 到达刷新点后刷新失败，按退避重试
+    assert _wait_until(lambda: issuer.calls >= 3)
+    # 旧令牌尚未过期，仍直接返回，不在请求路径上重试
+    calls = issuer.calls
+    assert provider.get_access_token() == first
+    assert issuer.calls == calls
+
+    issuer.failing = False
+    issuer.lifetime = 3600
+    assert _wait_until(lambda: issuer.tokens[-1] != first)
+    assert provider.get_access_token() == issuer.tokens[-1]
+
+
+def test_expired_token_with_failing_fetch_raises(make_provider):
+    issuer = _Issuer(lifetime=3600)
+    provider = make_provider(issuer)
+    provider.get_access_token()
+    provider.invalidate_token()
+
+    issuer.failing = True
+    with pytest.raises(RuntimeError):
+        provider.get_access_token()
+
+
+def test_stop_ends_refresher_and_does_not_restart(make_provider):
+    issuer = _Issuer(lifetime=3600)
+    provider = make_provider(issuer)
+    provider.get_access_token()
+    refresher = provider._refresher
+    assert refresher.is_alive()
+
+    provider.stop(timeout=2)
+    assert not refresher.is_alive()
+
+    # 停止后仍可获取令牌，只是不再启动刷新线程
+    provider.get_access_token(force_refresh=True)
+    assert provider._refresher is refresher and not refresher.is_alive()
+
+
+def test_stop_workload_identity(monkeypatch):
+    monkeypatch.setattr(workload_identity_module, "_provider", None)
+    # 未创建共享凭证时不做任何事
+    workload_identity_module.stop_workload_identity()
+
+    issuer = _Issuer(lifetime=3600)
+    provider = workload_identity_module.get_workload_identity()
+    monkeypatch.setattr(provider, "_new_client", issuer.client)
+    provider.get_access_token()
+    workload_identity_module.stop_workload_identity()
+    assert not provider._refresher.is_alive()
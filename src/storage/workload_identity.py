@@ -0,0 +1,215 @@
+"""
+工作负载身份凭证
+统一获取并缓存 coze_workload_identity 的访问令牌与项目环境变量：
+- 令牌缓存到过期前的安全余量，临近过期时由后台线程提前刷新
+- 并发调用只触发一次实际获取（线程安全；协程中使用 aget_access_token）
+- 项目环境变量按 TTL 缓存
+"""
+import asyncio
+import base64
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import logging
+logger = logging.getLogger(__name__)
+
+# 无法从令牌中解析过期时间时使用的有效期（秒）
+DEFAULT_TOKEN_TTL = int(os.getenv("WORKLOAD_TOKEN_TTL", "300"))
+# 过期前多久视为已过期（秒）
+TOKEN_SAFETY_MARGIN = int(os.getenv("WORKLOAD_TOKEN_SAFETY_MARGIN", "30"))
+# 剩余有效期低于该比例时后台提前刷新
+TOKEN_REFRESH_RATIO = float(os.getenv("WORKLOAD_TOKEN_REFRESH_RATIO", "0.2"))
+# 项目环境变量缓存时间（秒）
+ENV_VARS_TTL = int(os.getenv("WORKLOAD_ENV_VARS_TTL", "300"))
+
+
+def _jwt_expiry(token: str) -> Optional[float]:
+    """解析 JWT 的 exp 字段；不是 JWT 或没有 exp 时返回 None"""
+    parts = token.split(".")
+    if len(parts) != 3:
+        return None
+    try:
+        payload = parts[1] + "=" * (-len(parts[1]) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get("exp")
+        return float(exp) if exp else None
+    except Exception:
+        return None
+
+
+class WorkloadIdentityProvider:
+    """工作负载身份令牌与环境变量的进程内缓存"""
+
+    def __init__(
+        self,
+        default_ttl: int = DEFAULT_TOKEN_TTL,
+        safety_margin: int = TOKEN_SAFETY_MARGIN,
+        refresh_ratio: float = TOKEN_REFRESH_RATIO,
+        env_vars_ttl: int = ENV_VARS_TTL
+    ):
+        self.default_ttl = default_ttl
+        self.safety_margin = safety_margin
+        self.refresh_ratio = refresh_ratio
+        self.env_vars_ttl = env_vars_ttl
+
+        self._token: Optional[str] = None
+        self._token_fetched_at = 0.0
+        self._token_expires_at = 0.0
+        self._token_lock = threading.Lock()
+        self._refresh_wakeup = threading.Event()
+        self._refresher: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+        self._env_vars: Optional[Dict[str, str]] = None
+        self._env_vars_loaded_at = 0.0
+        self._env_lock = threading.Lock()
+
+    @staticmethod
+    def _new_client():
+        from coze_workload_identity import Client
+        return Client()
+
+    # ==================== 访问令牌 ====================
+
+    def _token_valid(self, now: float) -> bool:
+        return self._token is not None and now < self._token_expires_at - self.safety_margin
+
+    def _refresh_point(self) -> float:
+        lifetime = self._token_expires_at - self._token_fetched_at
+        return self._token_expires_at - max(lifetime * self.refresh_ratio, self.safety_margin * 2)
+
+    def _fetch_token(self) -> str:
+        """实际获取令牌（调用方持有 _token_lock）"""
+        client = self._new_client()
+        try:
+            token = client.get_access_token()
+        finally:
+            try:
+                client.close()
+            except Exception:
+                pass
+
+        now = time.time()
+        self._token = token
+        self._token_fetched_at = now
+        self._token_expires_at = _jwt_expiry(token) or (now + self.default_ttl)
+        self._ensure_refresher()
+        self._refresh_wakeup.set()
+        return token
+
+    def get_access_token(self, force_refresh: bool = False) -> str:
+        """
+        获取访问令牌，缓存有效时直接返回
+
+        Args:
+            force_refresh: 强制重新获取（如服务端返回令牌失效）
+
+        Raises:
+            ImportError: 未安装 coze_workload_identity
+            Exception: 获取失败
+        """
+        if not force_refresh:
+            token = self._token
+            if self._token_valid(time.time()):
+                return token
+
+        with self._token_lock:
+            # 等锁期间其他线程可能已完成刷新
+            if not force_refresh and self._token_valid(time.time()):
+                return self._token
+            return self._fetch_token()
+
+    async def aget_access_token(self, force_refresh: bool = False) -> str:
+        """get_access_token 的异步版本：缓存有效时不切换线程"""
+        if not force_refresh and self._token_valid(time.time()):
+            return self._token
+        return await asyncio.to_thread(self.get_access_token, force_refresh)
+
+    def invalidate_token(self) -> None:
+        with self._token_lock:
+            self._token = None
+            self._token_expires_at = 0.0
+
+    def _ensure_refresher(self) -> None:
+        if self._stopping.is_set() or (self._refresher and self._refresher.is_alive()):
+            return
+        self._refresher = threading.Thread(target=self._refresh_loop, name="workload-token-refresh", daemon=True)
+        self._refresher.start()
+
+    def _refresh_loop(self) -> None:
+        """在令牌到达刷新点时提前获取新令牌，请求路径上不必等待"""
+        retry_delay = 1.0
+        while not self._stopping.is_set():
+            self._refresh_wakeup.clear()
+            wait = self._refresh_point() - time.time()
+            if wait > 0:
+                # 令牌被外部刷新或停止时提前唤醒，重新计算刷新点
+                self._refresh_wakeup.wait(wait)
+                continue
+            try:
+                with self._token_lock:
+                    if time.time() >= self._refresh_point():
+                        self._fetch_token()
+                retry_delay = 1.0
+                # 有效期极短的令牌刷新后可能立即到达刷新点，限制刷新频率
+                self._stopping.wait(1)
+            except Exception as e:
+                logger.warning(f"Background workload token refresh failed: {e}")
+                self._stopping.wait(retry_delay)
+                retry_delay = min(retry_delay * 2, 30)
+
+    def stop(self, timeout: float = 5) -> None:
+        """停止后台刷新线程（进程退出时调用）；之后获取令牌仍可用，只是不再提前刷新"""
+        self._stopping.set()
+        self._refresh_wakeup.set()
+        refresher = self._refresher
+        if refresher and refresher.is_alive() and refresher is not threading.current_thread():
+            refresher.join(timeout)
+
+    # ==================== 项目环境变量 ====================
+
+    def get_env_vars(self) -> Dict[str, str]:
+        """获取项目环境变量（按 TTL 缓存）"""
+        with self._env_lock:
+            now = time.time()
+            if self._env_vars is None or now - self._env_vars_loaded_at > self.env_vars_ttl:
+                client = self._new_client()
+                try:
+                    env_vars = client.get_project_env_vars()
+                finally:
+                    try:
+                        client.close()
+                    except Exception:
+                        pass
+                self._env_vars = {env_var.key: env_var.value for env_var in env_vars}
+                self._env_vars_loaded_at = now
+            return self._env_vars
+
+    def get_env_var(self, key: str) -> Optional[str]:
+        """获取单个项目环境变量，不存在时返回 None"""
+        return self.get_env_vars().get(key)
+
+
+_provider: Optional[WorkloadIdentityProvider] = None
+_provider_lock = threading.Lock()
+
+
+def get_workload_identity() -> WorkloadIdentityProvider:
+    """获取进程内共享的工作负载身份凭证"""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = WorkloadIdentityProvider()
+    return _provider
+
+
+def stop_workload_identity() -> None:
+    """停止共享凭证的后台刷新线程（应用退出时调用）"""
+    if _provider is not None:
+        _provider.stop()
+
+
+__all__ = ["WorkloadIdentityProvider", "get_workload_identity", "stop_workload_identity"]
@@ -3,16 +3,28 @@
 完整流程：脚本生成 → 首尾帧图片生成 → 视频生成
 """
 from langchain.tools import tool, ToolRuntime
-import requests
-import time
+import asyncio
 import json
 import os
 from typing import Optional
 
+from llm.ark_video_client import DEFAULT_VIDEO_MODEL, get_ark_video_client, get_video_api_key
+from storage.database.video_checkpoint import (
+    STAGE_MERGED_PATH,
+    STAGE_SCRIPT,
+    STAGE_UPLOADED_KEY,
+    VideoTaskCheckpoint,
+    get_task_id_from_runtime,
+    segment_stage,
+)
+from utils.file.scratch import get_scratch_space
+
 try:
-    from .video_merge_tool import merge_videos_from_urls
+    from .video_merge_tool import merge_videos_from_urls, download_video_async, MERGE_RESERVE_BYTES
+    from .storage_upload_tool import task_upload_scope
 except ImportError:
-    from tools.video_merge_tool import merge_videos_from_urls
+    from tools.video_merge_tool import merge_videos_from_urls, download_video_async, MERGE_RESERVE_BYTES
+    from tools.storage_upload_tool import task_upload_scope
 
 
 @tool
@@ -153,7 +165,7 @@ def generate_frame_images(
 
 
 @tool
-def generate_miniprogram_video(
+async def generate_miniprogram_video(
     script: str,
     product_name: str,
     product_image_url: str,
@@ -167,10 +179,13 @@ def generate_miniprogram_video(
     工作流程：
     1. 将20秒脚本分成两段（各10秒）
     2. 第一段使用产品图片+首帧图片生成
-    3. 第二段使用尾帧图片生成
+    3. 第二段使用尾帧图片生成（两段同时提交、并行生成）
     4. 自动拼接两段视频
     5. 上传到对象存储，返回URL
 
+    在任务中执行时（运行时配置包含 task_id），每个阶段完成后都会记录检查点，
+    任务重试时跳过已完成的阶段。
+
     Args:
         script: 20秒视频脚本
         product_name: 产品名称
@@ -181,14 +196,20 @@ def generate_miniprogram_video(
     Returns:
         JSON字符串，包含生成的视频URL
     """
-    MODEL_NAME = "doubao-seedance-1-5-pro-251215"
-    API_KEY = os.getenv("ARK_VIDEO_API_KEY") or "39bf20d0-55b5-4957-baa1-02f4529a3076"
+    client = get_ark_video_client(get_video_api_key())
+
+    # 加载检查点：重试时沿用首次执行的脚本，保证各段内容一致
+    checkpoint = VideoTaskCheckpoint(get_task_id_from_runtime(runtime))
+    await checkpoint.aload()
+    if checkpoint.get(STAGE_SCRIPT):
+        script = checkpoint.get(STAGE_SCRIPT)
+    else:
+        await checkpoint.asave(**{STAGE_SCRIPT: script})
 
     # 解析脚本，分成两段
     script_parts = split_script(script)
 
-    # 生成第一段视频（0-10秒）：使用产品图片和首帧图片
-    print("生成第一段视频（0-10秒）...")
+    # 第一段视频（0-10秒）：使用产品图片和首帧图片
     first_prompt = f"""{script_parts['first_part']}
 
 重要要求：
@@ -201,26 +222,7 @@ def generate_miniprogram_video(
 
 --duration 10 --camerafixed false --watermark true"""
 
-    first_video_result = generate_video_internal(
-        prompt=first_prompt,
-        image_url=product_image_url,  # 使用产品图片
-        api_key=API_KEY,
-        model=MODEL_NAME
-    )
-    first_video_data = json.loads(first_video_result)
-
-    if not first_video_data.get("success"):
-        return json.dumps({
-            "error": "第一段视频生成失败",
-            "status": "failed",
-            "details": first_video_data
-        }, ensure_ascii=False, indent=2)
-
-    first_video_url = first_video_data.get("video_url")
-    print(f"第一段视频生成成功")
-
-    # 生成第二段视频（10-20秒）：使用尾帧图片
-    print("生成第二段视频（10-20秒）...")
+    # 第二段视频（10-20秒）：使用尾帧图片
     second_prompt = f"""{script_parts['second_part']}
 
 重要要求：
@@ -233,28 +235,75 @@ def generate_miniprogram_video(
 
 --duration 10 --camerafixed false --watermark true"""
 
-    second_video_result = generate_video_internal(
-        prompt=second_prompt,
-        image_url=selected_last_frame,  # 使用尾帧图片
-        api_key=API_KEY,
-        model=MODEL_NAME
-    )
-    second_video_data = json.loads(second_video_result)
+    segments = [
+        {"prompt": first_prompt, "image_url": product_image_url},  # 使用产品图片
+        {"prompt": second_prompt, "image_url": selected_last_frame},  # 使用尾帧图片
+    ]
 
-    if not second_video_data.get("success"):
-        return json.dumps({
-            "error": "第二段视频生成失败",
-            "status": "failed",
-            "details": second_video_data
-        }, ensure_ascii=False, indent=2)
+    # 每段生成成功后立即开始下载（写入本地缓存），与仍在生成的分段并行，拼接时直接使用本地文件
+    local_paths = [None] * len(segments)
+    merged_path = checkpoint.get(STAGE_MERGED_PATH)
+    need_download = not checkpoint.get(STAGE_UPLOADED_KEY) and not (merged_path and os.path.exists(merged_path))
+
+    async def generate_segment(index: int, segment: dict) -> dict:
+        """生成并下载单段视频；已有检查点时直接复用，生成完成后立即记录检查点"""
+        cached_url = checkpoint.get(segment_stage(index))
+        if cached_url:
+            result = {"success": True, "video_url": cached_url, "status": "succeeded"}
+        else:
+            result = await client.generate_video(segment["prompt"], image_url=segment["image_url"], model=DEFAULT_VIDEO_MODEL)
+            if not result.get("success"):
+                return result
+            # 只有新完成的分段计数，重试时复用检查点的分段已在之前的执行中计入
+            await checkpoint.acomplete_part(**{segment_stage(index): result.get("video_url")})
+
+        if need_download:
+            local_paths[index] = await download_video_async(result.get("video_url"))
+        return result
+
+    # 两段视频互不依赖：同时提交、统一轮询，结果按脚本顺序返回
+    print("并行生成两段视频（0-10秒、10-20秒）...")
+    segment_results = await asyncio.gather(*[
+        generate_segment(i, segment) for i, segment in enumerate(segments)
+    ])
+
+    segment_names = ["第一段", "第二段"]
+    segment_urls = []
+    for name, segment_data in zip(segment_names, segment_results):
+        if not segment_data.get("success"):
+            return json.dumps({
+                "error": f"{name}视频生成失败",
+                "status": "failed",
+                "details": segment_data
+            }, ensure_ascii=False, indent=2)
+        segment_urls.append(segment_data.get("video_url"))
+        print(f"{name}视频生成成功")
 
-    second_video_url = second_video_data.get("video_url")
-    print(f"第二段视频生成成功")
+    first_video_url, second_video_url = segment_urls
 
     # 拼接两段视频
     print("拼接两段视频...")
-    merge_result = merge_videos_from_urls([first_video_url, second_video_url])
+    # 下载与拼接是阻塞操作，放到线程中执行，避免阻塞事件循环
+    # 已拼接/已上传的阶段从检查点恢复，新完成的阶段写入检查点
+    # 在任务中执行时拼接文件写入任务目录，跨重试保留到上传 key 记录为止；否则写入随调用结束删除的工作空间。
+    # 临时空间不足时在此等待
+    scratch = get_scratch_space()
+    task_dir = scratch.task_dir(checkpoint.task_id) if checkpoint.task_id else None
+    async with scratch.aworkspace("merge", reserve_bytes=MERGE_RESERVE_BYTES) as work_dir:
+        merge_result = await asyncio.to_thread(
+            merge_videos_from_urls,
+            [first_video_url, second_video_url],
+            output_dir=task_dir or work_dir,
+            local_paths=local_paths,
+            merged_path=merged_path,
+            video_key=checkpoint.get(STAGE_UPLOADED_KEY),
+            on_stage=lambda stage, value: checkpoint.save(**{stage: value}),
+            resume_scope=task_upload_scope(checkpoint.task_id, STAGE_UPLOADED_KEY) if checkpoint.task_id else None
+        )
     merge_data = json.loads(merge_result)
+    if task_dir and merge_data.get("video_key"):
+        # 上传 key 已记录，拼接文件不再需要
+        await asyncio.to_thread(scratch.remove_task_dir, checkpoint.task_id)
 
     if merge_data.get("success"):
         merged_url = merge_data.get("merged_video_url", "")
@@ -270,13 +319,23 @@ def generate_miniprogram_video(
                 "selected_first_frame": selected_first_frame,
                 "selected_last_frame": selected_last_frame
             }, ensure_ascii=False, indent=2)
+        elif merge_data.get("upload_error"):
+            # 拼接成功但上传失败：任务失败，重试时从检查点（拼接文件、已上传的分片）继续
+            return json.dumps({
+                "success": False,
+                "error": f"视频上传失败: {merge_data['upload_error']}",
+                "status": "failed",
+                "retryable": True,
+                "first_part": first_video_url,
+                "second_part": second_video_url
+            }, ensure_ascii=False, indent=2)
         else:
-            # 拼接成功但上传失败，返回第一段视频
+            # 对象存储不可用（未上传），返回第一段视频
             return json.dumps({
                 "success": True,
                 "video_url": first_video_url,
                 "status": "partial_success",
-                "message": "两段视频生成成功，但上传失败，返回第一段视频",
+                "message": "两段视频生成成功，但对象存储不可用，返回第一段视频",
                 "first_part": first_video_url,
                 "second_part": second_video_url
             }, ensure_ascii=False, indent=2)
@@ -325,88 +384,3 @@ def split_script(script: str) -> dict:
         "first_part": '\n'.join(first_part_lines) if first_part_lines else script,
         "second_part": '\n'.join(second_part_lines) if second_part_lines else script
     }
-
-
-def generate_video_internal(prompt: str, image_url: str = "", api_key: str = "", model: str = "") -> str:
-    """内部视频生成函数"""
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": "Bearer " + api_key
-    }
-
-    content_items = [
-        {"type": "text", "text": prompt}
-    ]
-
-    if image_url:
-        content_items.append({
-            "type": "image_url",
-            "image_url": {"url": image_url}
-        })
-
-    request = {"model": model, "content": content_items}
-
-    try:
-        response = requests.post(
-            'https://ark.cn-beijing.volces.com/api/v3/contents/generations/tasks',
-            json=request,
-            headers=headers,
-            timeout=60
-        )
-
-        response.raise_for_status()
-        result = response.json()
-
-        task_id = result.get("id")
-        if not task_id:
-            return json.dumps({
-                "error": "任务创建失败",
-                "status": "failed"
-            }, ensure_ascii=False)
-
-        # 轮询状态
-        max_wait_time = 300
-        start_time = time.time()
-
-        while time.time() - start_time < max_wait_time:
-            try:
-                status_response = requests.get(
-                    f'https://ark.cn-beijing.volces.com/api/v3/contents/generations/tasks/{task_id}',
-                    headers=headers,
-                    timeout=30
-                )
-                status_response.raise_for_status()
-                status_data = status_response.json()
-
-                if status_data.get('error'):
-                    return json.dumps({
-                        "error": f"生成失败: {status_data.get('error', {}).get('message')}",
-                        "status": "failed"
-                    }, ensure_ascii=False)
-
-                status = status_data.get('status')
-
-                if status == 'succeeded':
-                    video_url = status_data.get('content', {}).get('video_url')
-                    return json.dumps({
-                        "success": True,
-                        "video_url": video_url,
-                        "status": "succeeded"
-                    }, ensure_ascii=False)
-                elif status in ['failed', 'cancelled']:
-                    return json.dumps({
-                        "error": f"任务{status}",
-                        "status": status
-                    }, ensure_ascii=False)
-                else:
-                    time.sleep(2)
-                    continue
-
-            except Exception as e:
-                time.sleep(2)
-                continue
-
-        return json.dumps({"error": "超时", "status": "timeout"}, ensure_ascii=False)
-
-    except Exception as e:
-        return json.dumps({"error": str(e), "status": "failed"}, ensure_ascii=False)
@@ -3,20 +3,21 @@
 支持：根据脚本生成20秒视频 + 首尾帧图片上传
 """
 from langchain.tools import tool, ToolRuntime
-import requests
-import time
+import asyncio
 import json
-import os
 from typing import Optional
 
+from llm.ark_video_client import DEFAULT_VIDEO_MODEL, get_ark_video_client, get_video_api_key
+from utils.file.scratch import get_scratch_space
+
 try:
-    from .video_merge_tool import merge_videos_from_urls
+    from .video_merge_tool import merge_videos_from_urls, download_video_async, MERGE_RESERVE_BYTES
 except ImportError:
-    from tools.video_merge_tool import merge_videos_from_urls
+    from tools.video_merge_tool import merge_videos_from_urls, download_video_async, MERGE_RESERVE_BYTES
 
 
 @tool
-def generate_video_with_script(
+async def generate_video_with_script(
     script: str,
     product_name: str = "紧固件",
     first_frame_image: str = "",
@@ -42,8 +43,7 @@ def generate_video_with_script(
     Returns:
         JSON字符串，包含视频URL和生成结果
     """
-    MODEL_NAME = "doubao-seedance-1-5-pro-251215"
-    API_KEY = os.getenv("ARK_VIDEO_API_KEY") or "39bf20d0-55b5-4957-baa1-02f4529a3076"
+    client = get_ark_video_client(get_video_api_key())
 
     # 将20秒脚本分成两段
     # 第一段：0-10秒（开头部分）
@@ -52,8 +52,7 @@ def generate_video_with_script(
     # 解析脚本，提取关键信息
     script_parts = split_script_into_two_parts(script)
 
-    # 生成第一段视频（10秒，使用首帧图片）
-    print("开始生成第一段视频（0-10秒）...")
+    # 第一段视频（10秒，使用首帧图片）
     first_prompt = f"""{script_parts['first_part']}
 
 重要要求：
@@ -66,26 +65,7 @@ def generate_video_with_script(
 
 --duration 10 --camerafixed false --watermark true"""
 
-    first_video_result = generate_video_internal(
-        prompt=first_prompt,
-        image_url=first_frame_image,  # 首帧图片在第一段
-        api_key=API_KEY,
-        model=MODEL_NAME
-    )
-    first_video_data = json.loads(first_video_result)
-
-    if not first_video_data.get("success"):
-        return json.dumps({
-            "error": "第一段视频生成失败",
-            "status": "failed",
-            "details": first_video_data
-        }, ensure_ascii=False, indent=2)
-
-    first_video_url = first_video_data.get("video_url")
-    print(f"第一段视频生成成功: {first_video_url}")
-
-    # 生成第二段视频（10秒，使用尾帧图片）
-    print("开始生成第二段视频（10-20秒）...")
+    # 第二段视频（10秒，使用尾帧图片）
     second_prompt = f"""{script_parts['second_part']}
 
 重要要求：
@@ -98,27 +78,48 @@ def generate_video_with_script(
 
 --duration 10 --camerafixed false --watermark true"""
 
-    second_video_result = generate_video_internal(
-        prompt=second_prompt,
-        image_url=last_frame_image,  # 尾帧图片在第二段
-        api_key=API_KEY,
-        model=MODEL_NAME
-    )
-    second_video_data = json.loads(second_video_result)
-
-    if not second_video_data.get("success"):
-        return json.dumps({
-            "error": "第二段视频生成失败",
-            "status": "failed",
-            "details": second_video_data
-        }, ensure_ascii=False, indent=2)
+    # 每段生成成功后立即开始下载（写入本地缓存），与仍在生成的分段并行，拼接时直接使用本地文件
+    segments = [
+        {"prompt": first_prompt, "image_url": first_frame_image},  # 首帧图片在第一段
+        {"prompt": second_prompt, "image_url": last_frame_image},  # 尾帧图片在第二段
+    ]
+    local_paths = [None] * len(segments)
+
+    async def generate_segment(index: int, segment: dict) -> dict:
+        result = await client.generate_video(segment["prompt"], image_url=segment["image_url"], model=DEFAULT_VIDEO_MODEL)
+        if result.get("success"):
+            local_paths[index] = await download_video_async(result.get("video_url"))
+        return result
+
+    # 两段视频互不依赖，同时提交并轮询
+    print("开始并行生成两段视频（0-10秒、10-20秒）...")
+    segment_results = await asyncio.gather(*[
+        generate_segment(i, segment) for i, segment in enumerate(segments)
+    ])
+
+    segment_urls = []
+    for name, segment_data in zip(["第一段", "第二段"], segment_results):
+        if not segment_data.get("success"):
+            return json.dumps({
+                "error": f"{name}视频生成失败",
+                "status": "failed",
+                "details": segment_data
+            }, ensure_ascii=False, indent=2)
+        segment_urls.append(segment_data.get("video_url"))
+        print(f"{name}视频生成成功: {segment_data.get('video_url')}")
 
-    second_video_url = second_video_data.get("video_url")
-    print(f"第二段视频生成成功: {second_video_url}")
+    first_video_url, second_video_url = segment_urls
 
     # 拼接两段视频
     print("开始拼接两段视频...")
-    merge_result = merge_videos_from_urls([first_video_url, second_video_url])
+    # 拼接文件放在任务工作空间中，上传完成后随工作空间删除；临时空间不足时在此等待
+    async with get_scratch_space().aworkspace("merge", reserve_bytes=MERGE_RESERVE_BYTES) as work_dir:
+        merge_result = await asyncio.to_thread(
+            merge_videos_from_urls,
+            [first_video_url, second_video_url],
+            output_dir=work_dir,
+            local_paths=local_paths
+        )
     merge_data = json.loads(merge_result)
 
     if merge_data.get("success"):
@@ -204,155 +205,6 @@ def split_script_into_two_parts(script: str) -> dict:
     }
 
 
-def generate_video_internal(prompt: str, image_url: str = "", api_key: str = "", model: str = "") -> str:
-    """
-    内部视频生成函数
-
-    Args:
-        prompt: 提示词
-        image_url: 图片URL（可选）
-        api_key: API密钥
-        model: 模型名称
-
-    Returns:
-        JSON字符串
-    """
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": "Bearer " + api_key
-    }
-
-    # 构建内容列表
-    content_items = [
-        {
-            "type": "text",
-            "text": prompt
-        }
-    ]
-
-    # 如果提供了图片，添加到内容项中
-    if image_url:
-        content_items.append({
-            "type": "image_url",
-            "image_url": {
-                "url": image_url
-            }
-        })
-
-    # 构建请求
-    request = {
-        "model": model,
-        "content": content_items
-    }
-
-    # 创建视频生成任务
-    try:
-        response = requests.post(
-            'https://ark.cn-beijing.volces.com/api/v3/contents/generations/tasks',
-            json=request,
-            headers=headers,
-            timeout=60
-        )
-
-        response.raise_for_status()
-        result = response.json()
-
-        # 获取任务ID
-        task_id = result.get("id")
-        if not task_id:
-            return json.dumps({
-                "error": "视频生成任务创建失败，未返回任务ID",
-                "status": "failed",
-                "response": result
-            }, ensure_ascii=False, indent=2)
-
-        # 轮询任务状态（最多等待5分钟）
-        max_wait_time = 300
-        start_time = time.time()
-
-        while time.time() - start_time < max_wait_time:
-            try:
-                status_response = requests.get(
-                    f'https://ark.cn-beijing.volces.com/api/v3/contents/generations/tasks/{task_id}',
-                    headers=headers,
-                    timeout=30
-                )
-                status_response.raise_for_status()
-                status_data = status_response.json()
-
-                # 检查错误
-                if status_data.get('error'):
-                    return json.dumps({
-                        "error": f"视频生成失败: {status_data.get('error', {}).get('message')}",
-                        "status": "failed",
-                        "task_id": task_id
-                    }, ensure_ascii=False, indent=2)
-
-                status = status_data.get('status')
-
-                if status == 'cancelled':
-                    return json.dumps({
-                        "error": "视频生成任务已取消",
-                        "status": "cancelled",
-                        "task_id": task_id
-                    }, ensure_ascii=False, indent=2)
-                elif status == 'failed':
-                    return json.dumps({
-                        "error": "视频生成失败",
-                        "status": "failed",
-                        "task_id": task_id,
-                        "response": status_data
-                    }, ensure_ascii=False, indent=2)
-                elif status in ['queued', 'running']:
-                    # 视频生成中，等待后继续轮询
-                    time.sleep(2)
-                    continue
-                elif status == 'succeeded':
-                    # 视频生成成功
-                    video_url = status_data.get('content', {}).get('video_url')
-                    return json.dumps({
-                        "success": True,
-                        "video_url": video_url,
-                        "status": "succeeded",
-                        "task_id": task_id,
-                        "model": model
-                    }, ensure_ascii=False, indent=2)
-                else:
-                    return json.dumps({
-                        "error": f"视频生成状态未知: {status}",
-                        "status": "unknown",
-                        "task_id": task_id
-                    }, ensure_ascii=False, indent=2)
-
-            except requests.exceptions.RequestException as e:
-                time.sleep(2)
-                continue
-            except Exception as e:
-                return json.dumps({
-                    "error": f"视频生成状态轮询失败: {str(e)}",
-                    "status": "failed",
-                    "task_id": task_id
-                }, ensure_ascii=False, indent=2)
-
-        # 超时
-        return json.dumps({
-            "error": "视频生成超时",
-            "status": "timeout",
-            "task_id": task_id
-        }, ensure_ascii=False, indent=2)
-
-    except requests.exceptions.HTTPError as e:
-        return json.dumps({
-            "error": f"HTTP错误: {e.response.status_code} - {e.response.text}",
-            "status": "failed"
-        }, ensure_ascii=False)
-    except Exception as e:
-        return json.dumps({
-            "error": f"视频生成失败: {str(e)}",
-            "status": "failed"
-        }, ensure_ascii=False)
-
-
 @tool
 def generate_simple_script(
     theme: str,
@@ -2,31 +2,188 @@
 对象存储上传工具
 使用 S3SyncStorage 上传文件到对象存储
 """
+import asyncio
+import functools
+import hashlib
 import os
-from coze_coding_dev_sdk.s3 import S3SyncStorage
+from typing import Dict, Optional, Tuple
+
+from storage.database.db import get_db_url
+from storage.database.session import get_db_session
+from storage.database.stored_content import StoredContentManager
+from storage.s3.s3_storage import S3SyncStorage
+from storage.s3.s3_async_storage import S3AsyncStorage
+from storage.s3.simulated_storage import create_simulated_storage
+from storage.s3.upload_journal import upload_resume_id
+
+# 存储后端：s3（默认）；local / memory 为离线替身，用于无网络环境下的压测与基准测试
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "s3").lower()
+
+# 并发上传的分片数，按部署环境代理层的节流限制配置（1 表示逐片上传）
+STORAGE_UPLOAD_CONCURRENCY = int(os.getenv("STORAGE_UPLOAD_CONCURRENCY", "4"))
+# 分片大小上限；实际分片大小按文件大小自适应，不小于 5MB
+STORAGE_UPLOAD_MAX_PART_SIZE = int(os.getenv("STORAGE_UPLOAD_MAX_PART_SIZE", str(16 * 1024 * 1024)))
+# 单个分片失败后的重试次数
+STORAGE_UPLOAD_PART_RETRIES = int(os.getenv("STORAGE_UPLOAD_PART_RETRIES", "3"))
+# 按内容哈希去重：相同内容已上传过时直接复用已有对象
+STORAGE_UPLOAD_DEDUP = os.getenv("STORAGE_UPLOAD_DEDUP", "true").lower() == "true"
+# 清理超期未完成分片上传的间隔（秒），0 表示不清理；只清理 key 以 STORAGE_UPLOAD_JANITOR_PREFIX 开头的上传
+# （可续传的只有拼接后视频的上传，其 key 以 tnho_promo_video_ 开头）
+STORAGE_UPLOAD_JANITOR_INTERVAL = int(os.getenv("STORAGE_UPLOAD_JANITOR_INTERVAL", "3600"))
+STORAGE_UPLOAD_JANITOR_PREFIX = os.getenv("STORAGE_UPLOAD_JANITOR_PREFIX", "tnho_promo_video_")
 
 def get_storage():
     """
     获取对象存储客户端实例
 
     Returns:
-        S3SyncStorage 实例
+        S3SyncStorage 实例（STORAGE_BACKEND 为 local / memory 时为接口一致的离线替身）
     """
+    if STORAGE_BACKEND != "s3":
+        return create_simulated_storage(STORAGE_BACKEND, max_pool_connections=max(10, STORAGE_UPLOAD_CONCURRENCY))
     return S3SyncStorage(
         endpoint_url=os.getenv("COZE_BUCKET_ENDPOINT_URL"),
         access_key="",
         secret_key="",
         bucket_name=os.getenv("COZE_BUCKET_NAME"),
         region="cn-beijing",
+        max_pool_connections=max(10, STORAGE_UPLOAD_CONCURRENCY),
     )
 
-def upload_video_file(file_path: str, file_name: str = None) -> str:
+# 异步存储实例的线程池与 httpx 客户端绑定创建时的事件循环，按事件循环分别共享
+_async_storages: Dict[int, S3AsyncStorage] = {}
+
+def get_async_storage() -> S3AsyncStorage:
+    """
+    获取当前事件循环内共享的异步对象存储实例（必须在协程中调用；应用退出时由 close_async_storages 关闭）
+
+    Returns:
+        S3AsyncStorage 实例
+    """
+    loop_id = id(asyncio.get_running_loop())
+    storage = _async_storages.get(loop_id)
+    if storage is None:
+        storage = _async_storages[loop_id] = _create_async_storage()
+    return storage
+
+async def close_async_storages() -> None:
+    """关闭当前事件循环内共享的异步对象存储实例（应用退出时调用）"""
+    storage = _async_storages.pop(id(asyncio.get_running_loop()), None)
+    if storage is not None:
+        await storage.aclose()
+
+def _create_async_storage() -> S3AsyncStorage:
+    if STORAGE_BACKEND != "s3":
+        return S3AsyncStorage(access_key="", secret_key="", bucket_name="", max_concurrency=STORAGE_UPLOAD_CONCURRENCY,
+                              sync_storage=get_storage())
+    return S3AsyncStorage(
+        endpoint_url=os.getenv("COZE_BUCKET_ENDPOINT_URL"),
+        access_key="",
+        secret_key="",
+        bucket_name=os.getenv("COZE_BUCKET_NAME"),
+        region="cn-beijing",
+        max_concurrency=STORAGE_UPLOAD_CONCURRENCY,
+    )
+
+def file_content_hash(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """按块计算文件内容的 SHA-256（十六进制）"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+@functools.lru_cache(maxsize=1)
+def _dedup_enabled() -> bool:
+    """去重索引是否可用：离线替身后端的对象不在真实存储中，不查询索引；未配置数据库时跳过"""
+    return STORAGE_UPLOAD_DEDUP and STORAGE_BACKEND == "s3" and bool(get_db_url())
+
+def _find_uploaded(storage, file_path: str) -> Tuple[Optional[str], Optional[str], int]:
+    """
+    查找与本地文件内容相同的已上传对象
+
+    Returns:
+        (已有对象 key 或 None, 内容哈希, 文件大小)；去重关闭或索引不可用时 key 为 None，
+        去重未启用时内容哈希也为 None
+    """
+    size = os.path.getsize(file_path)
+    if not _dedup_enabled():
+        return None, None, size
+    content_hash = file_content_hash(file_path)
+    try:
+        bucket = storage._resolve_bucket(None)
+        with get_db_session() as db:
+            manager = StoredContentManager()
+            record = manager.find(db, content_hash, bucket, size)
+            if record is None:
+                return None, content_hash, size
+            # 对象可能已被删除或过期清理，确认存在后才复用
+            if storage.file_exists(file_key=record.object_key):
+                manager.mark_hit(db, content_hash, bucket)
+                return record.object_key, content_hash, size
+            manager.forget(db, content_hash, bucket)
+    except Exception as e:
+        print(f"查询上传去重索引失败: {str(e)}")
+    return None, content_hash, size
+
+def _remember_uploaded(storage, content_hash: Optional[str], key: str, size: int, content_type: str) -> str:
+    """
+    记录新上传对象的内容哈希（失败不影响上传结果）
+
+    Returns:
+        应使用的对象 key；并发上传了相同内容时返回先记录的 key，并删除本次上传的重复对象
+    """
+    if not content_hash:
+        return key
+    try:
+        with get_db_session() as db:
+            stored_key = StoredContentManager().remember(db, content_hash, storage._resolve_bucket(None), key, size,
+                                                         content_type)
+    except Exception as e:
+        print(f"记录上传去重索引失败: {str(e)}")
+        return key
+    if stored_key and stored_key != key:
+        try:
+            storage.delete_file(file_key=key)
+        except Exception as e:
+            print(f"删除重复对象失败: {str(e)}")
+        return stored_key
+    return key
+
+def task_upload_scope(task_id: str, stage: str) -> str:
+    """任务某个阶段上传的续传范围（同一任务重试时不变）"""
+    return f"{task_id}__{stage}"
+
+def abort_task_uploads(task_id: str) -> int:
+    """中止任务遗留的可续传上传（任务最终失败、不再重试时调用），失败不抛出"""
+    try:
+        return get_storage().abort_journaled_uploads(resume_prefix=f"{task_id}__")
+    except Exception as e:
+        print(f"中止任务遗留的分片上传失败: {str(e)}")
+        return 0
+
+def abort_stale_uploads() -> int:
+    """中止本服务超期未完成的可续传分片上传（崩溃后未再续传的上传）"""
+    return get_storage().abort_stale_multipart_uploads(prefix=STORAGE_UPLOAD_JANITOR_PREFIX)
+
+async def run_upload_janitor(interval: int = STORAGE_UPLOAD_JANITOR_INTERVAL) -> None:
+    """定期执行 abort_stale_uploads；API 进程与各 worker 都可运行，重复中止无副作用"""
+    while True:
+        try:
+            await asyncio.to_thread(abort_stale_uploads)
+        except Exception as e:
+            print(f"清理超期分片上传失败: {str(e)}")
+        await asyncio.sleep(interval)
+
+def upload_video_file(file_path: str, file_name: str = None, resume_scope: Optional[str] = None) -> str:
     """
-    上传视频文件到对象存储
+    上传视频文件到对象存储（相同内容已上传过时直接返回已有对象的 key）
 
     Args:
         file_path: 本地视频文件路径
         file_name: 上传后的文件名（可选，默认使用原文件名）
+        resume_scope: 续传范围（见 task_upload_scope）；提供时失败后保留已上传的分片，
+            同一范围再次上传相同内容时只上传缺失的分片。不提供时失败立即中止
 
     Returns:
         对象存储的 key（文件路径）
@@ -41,20 +198,64 @@ def upload_video_file(file_path: str, file_name: str = None) -> str:
         if file_name is None:
             file_name = os.path.basename(file_path)
 
-        # 使用流式上传（适用于大文件）
+        existing_key, content_hash, size = _find_uploaded(storage, file_path)
+        if existing_key:
+            print(f"内容已存在，跳过上传，key: {existing_key}")
+            return existing_key
+
+        resume_id = None
+        if resume_scope:
+            resume_id = upload_resume_id(resume_scope, content_hash or file_content_hash(file_path),
+                                         storage._resolve_bucket(None))
+
+        # 并发分片上传：分片大小自适应，失败的分片单独重试
+        key = storage.parallel_upload_file(
+            file_path=file_path,
+            file_name=file_name,
+            content_type="video/mp4",
+            max_concurrency=STORAGE_UPLOAD_CONCURRENCY,
+            max_part_size=STORAGE_UPLOAD_MAX_PART_SIZE,
+            max_retries=STORAGE_UPLOAD_PART_RETRIES,
+            resume_id=resume_id
+        )
+        key = _remember_uploaded(storage, content_hash, key, size, "video/mp4")
+
+        print(f"视频上传成功，key: {key}")
+        return key
+
+    except Exception as e:
+        print(f"视频上传失败: {str(e)}")
+        raise Exception(f"视频上传失败: {str(e)}")
+
+async def upload_video_file_async(file_path: str, file_name: str = None) -> str:
+    """
+    上传视频文件到对象存储（异步版本，不阻塞事件循环；去重规则同 upload_video_file）
+
+    Args:
+        file_path: 本地视频文件路径
+        file_name: 上传后的文件名（可选，默认使用原文件名）
+
+    Returns:
+        对象存储的 key（文件路径）
+    """
+    if file_name is None:
+        file_name = os.path.basename(file_path)
+    try:
+        storage = get_async_storage()
+        existing_key, content_hash, size = await asyncio.to_thread(_find_uploaded, storage._sync, file_path)
+        if existing_key:
+            print(f"内容已存在，跳过上传，key: {existing_key}")
+            return existing_key
         with open(file_path, 'rb') as f:
-            key = storage.stream_upload_file(
+            key = await storage.stream_upload_file(
                 fileobj=f,
                 file_name=file_name,
                 content_type="video/mp4",
-                multipart_chunksize=5 * 1024 * 1024,  # 5MB 分片
-                multipart_threshold=5 * 1024 * 1024,   # 5MB 触发分片
-                use_threads=False
+                max_concurrency=STORAGE_UPLOAD_CONCURRENCY
             )
-
+        key = await asyncio.to_thread(_remember_uploaded, storage._sync, content_hash, key, size, "video/mp4")
         print(f"视频上传成功，key: {key}")
         return key
-
     except Exception as e:
         print(f"视频上传失败: {str(e)}")
         raise Exception(f"视频上传失败: {str(e)}")
@@ -88,6 +289,38 @@ def generate_presigned_url(file_key: str, expire_time: int = 1800) -> str:
         print(f"签名URL生成失败: {str(e)}")
         raise Exception(f"签名URL生成失败: {str(e)}")
 
+def generate_presigned_urls(file_keys: list, expire_time: int = 1800) -> dict:
+    """
+    批量生成签名访问URL（缓存命中的直接返回，其余并发签名）
+
+    Args:
+        file_keys: 对象存储中的文件key列表
+        expire_time: URL过期时间（秒），默认30分钟
+
+    Returns:
+        key -> 签名URL 的字典，签名失败的 key 不在结果中
+    """
+    return get_storage().generate_presigned_urls(keys=file_keys, expire_time=expire_time)
+
+def download_video_file(file_key: str, file_path: str) -> str:
+    """
+    把对象存储中的视频流式下载到本地文件（按块写入，不整体读入内存）
+
+    Args:
+        file_key: 对象存储中的文件key
+        file_path: 本地保存路径
+
+    Returns:
+        本地文件路径
+    """
+    try:
+        size = get_storage().download_to_file(file_key=file_key, file_path=file_path)
+        print(f"视频下载成功: {file_key} -> {file_path} ({size} bytes)")
+        return file_path
+    except Exception as e:
+        print(f"视频下载失败: {str(e)}")
+        raise Exception(f"视频下载失败: {str(e)}")
+
 def upload_and_get_url(file_path: str, file_name: str = None, expire_time: int = 1800) -> str:
     """
     上传视频文件并返回签名URL
@@ -0,0 +1,160 @@
+"""
+上传去重测试：相同内容再次上传时复用已有对象并记录命中、已有对象被删除时清除失效记录并重新上传、
+并发上传相同内容时以先记录的 key 为准并删除本次上传的重复对象、索引不可用时照常上传
+使用内存存储替身（SimulatedSyncStorage）与 SQLite 内存库，不需要网络与 PostgreSQL
+"""
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+# 添加src目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+pytest.importorskip("boto3")
+pytest.importorskip("sqlalchemy")
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from storage.database.shared.model import Base, StoredContent
+from storage.database.stored_content import StoredContentManager
+from storage.s3.simulated_storage import MemoryObjectStore, SimulatedLink, SimulatedSyncStorage
+from tools import storage_upload_tool
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def _register_functions(dbapi_connection, _):
+        dbapi_connection.create_function(
+            "now", 0, lambda: datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        )
+
+    Base.metadata.create_all(engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def storage(session_factory, monkeypatch):
+    storage = SimulatedSyncStorage(store=MemoryObjectStore(), link=SimulatedLink())
+    storage.uploads = []
+    original = storage.parallel_upload_file
+
+    def _counting_upload(**kwargs):
+        key = original(**kwargs)
+        storage.uploads.append(key)
+        return key
+
+    @contextmanager
+    def _db_session():
+        with session_factory() as db:
+            yield db
+
+    monkeypatch.setattr(storage, "parallel_upload_file", _counting_upload)
+    monkeypatch.setattr(storage_upload_tool, "get_storage", lambda: storage)
+    monkeypatch.setattr(storage_upload_tool, "get_db_session", _db_session)
+    monkeypatch.setattr(storage_upload_tool, "_dedup_enabled", lambda: True)
+    return storage
+
+
+def _video(tmp_path, name: str, content: bytes = b"same video content") -> str:
+    path = tmp_path / name
+    path.write_bytes(content)
+    return str(path)
+
+
+def _records(factory) -> list:
+    with factory() as db:
+        return [(r.object_key, r.hit_count) for r in db.query(StoredContent).all()]
+
+
+def _exists(storage, key: str) -> bool:
+    return storage.file_exists(file_key=key)
+
+
+def test_same_content_reuses_uploaded_object(storage, session_factory, tmp_path):
+    first = storage_upload_tool.upload_video_file(_video(tmp_path, "a.mp4"))
+    assert storage.uploads == [first]
+    assert _records(session_factory) == [(first, 0)]
+
+    # 文件名不同、内容相同：不再上传，记录命中
+    assert storage_upload_tool.upload_video_file(_video(tmp_path, "b.mp4")) == first
+    assert storage.uploads == [first]
+    assert _records(session_factory) == [(first, 1)]
+
+    # 内容不同时正常上传
+    other = storage_upload_tool.upload_video_file(_video(tmp_path, "c.mp4", b"other content"))
+    assert other != first and storage.uploads == [first, other]
+
+
+def test_find_uploaded_returns_hash_and_size(storage, session_factory, tmp_path):
+    path = _video(tmp_path, "a.mp4")
+    key, content_hash, size = storage_upload_tool._find_uploaded(storage, path)
+    assert key is None
+    assert content_hash == storage_upload_tool.file_content_hash(path)
+    assert size == len(b"same video content")
+
+    assert storage_upload_tool._remember_uploaded(storage, content_hash, "videos/a.mp4", size, "video/mp4") \
+        == "videos/a.mp4"
+    # 确认对象存在后才复用
+    storage._get_client().put_object(Bucket="local", Key="videos/a.mp4", Body=b"same video content")
+    assert storage_upload_tool._find_uploaded(storage, path) == ("videos/a.mp4", content_hash, size)
+
+
+def test_stale_record_is_forgotten_and_content_reuploaded(storage, session_factory, tmp_path):
+    first = storage_upload_tool.upload_video_file(_video(tmp_path, "a.mp4"))
+    # 对象被删除或过期清理后，索引记录失效
+    storage.delete_file(file_key=first)
+
+    path = _video(tmp_path, "b.mp4")
+    key, content_hash, _ = storage_upload_tool._find_uploaded(storage, path)
+    assert key is None and content_hash
+    assert _records(session_factory) == []
+
+    second = storage_upload_tool.upload_video_file(path)
+    assert second != first and _exists(storage, second)
+    assert storage.uploads == [first, second]
+    assert _records(session_factory) == [(second, 0)]
+
+
+def test_concurrent_upload_keeps_first_key_and_deletes_duplicate(storage, session_factory, tmp_path):
+    path = _video(tmp_path, "a.mp4")
+    content_hash = storage_upload_tool.file_content_hash(path)
+    racing_key = "videos/racing.mp4"
+    upload = storage.parallel_upload_file
+
+    def _upload_while_other_process_records(**kwargs):
+        key = upload(**kwargs)
+        # 本次上传期间，另一个进程上传了相同内容并先写入索引
+        storage._get_client().put_object(Bucket="local", Key=racing_key, Body=b"same video content")
+        with session_factory() as db:
+            StoredContentManager().remember(db, content_hash, "local", racing_key, len(b"same video content"))
+        return key
+
+    storage.parallel_upload_file = _upload_while_other_process_records
+    assert storage_upload_tool.upload_video_file(path) == racing_key
+
+    duplicate = storage.uploads[0]
+    assert duplicate != racing_key and not _exists(storage, duplicate)
+    assert _exists(storage, racing_key)
+    assert _records(session_factory) == [(racing_key, 0)]
+
+
+def test_upload_succeeds_when_index_unavailable(storage, tmp_path, monkeypatch):
+    @contextmanager
+    def _broken_session():
+        raise ConnectionError("database unavailable")
+        yield
+
+    monkeypatch.setattr(storage_upload_tool, "get_db_session", _broken_session)
+    first = storage_upload_tool.upload_video_file(_video(tmp_path, "a.mp4"))
+    second = storage_upload_tool.upload_video_file(_video(tmp_path, "b.mp4"))
+    # 不去重，但上传不受影响
+    assert storage.uploads == [first, second]
+    assert _exists(storage, first) and _exists(storage, second)
@@ -0,0 +1,84 @@
+"""
+视频拼接工具测试：未指定输出目录时在预留了临时空间的工作空间中拼接，返回前删除并释放预留
+下载、拼接与上传替换为本地函数，不需要网络与 ffmpeg
+"""
+import json
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# 添加src目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+pytest.importorskip("requests")
+
+from tools import video_merge_tool
+from utils.file.scratch import ScratchSpace
+
+
+@pytest.fixture
+def scratch(tmp_path, monkeypatch):
+    space = ScratchSpace(root=str(tmp_path / "scratch"), max_bytes=1024 ** 3, min_free_bytes=0)
+    merged = []
+
+    def _merge_video_files(paths, output_path):
+        Path(output_path).write_bytes(b"".join(Path(p).read_bytes() for p in paths))
+        # 记录拼接时的输出路径与已预留的字节数
+        merged.append((output_path, space._reserved))
+        return output_path
+
+    monkeypatch.setattr(video_merge_tool, "get_scratch_space", lambda: space)
+    monkeypatch.setattr(video_merge_tool, "merge_video_files", _merge_video_files)
+    return space, merged
+
+
+def _local_parts(tmp_path):
+    parts = []
+    for i in range(2):
+        path = tmp_path / f"part{i}.mp4"
+        path.write_bytes(f"part{i}".encode())
+        parts.append(str(path))
+    return parts
+
+
+def test_merge_without_output_dir_uses_reserved_workspace(tmp_path, monkeypatch, scratch):
+    space, merged = scratch
+    uploaded = []
+
+    def _upload(path, file_name, resume_scope=None):
+        uploaded.append(Path(path).read_bytes())
+        return f"videos/{file_name}"
+
+    monkeypatch.setattr(video_merge_tool, "upload_video_file", _upload)
+    monkeypatch.setattr(video_merge_tool, "generate_presigned_url", lambda key: f"https://signed/{key}")
+
+    result = json.loads(video_merge_tool.merge_videos_from_urls(
+        ["u0", "u1"], local_paths=_local_parts(tmp_path)
+    ))
+
+    assert result["success"] and result["merged_video_url"].startswith("https://signed/videos/")
+    assert uploaded == [b"part0part1"]
+    # 拼接文件随工作空间删除，预留释放，不留给后台清理
+    output_path, reserved = merged[0]
+    assert reserved == video_merge_tool.MERGE_RESERVE_BYTES
+    assert result["merged_video_path"] is None
+    assert not os.path.exists(output_path)
+    assert os.listdir(space.root) == []
+    assert space._reserved == 0
+
+
+def test_merge_into_caller_directory_keeps_file(tmp_path, monkeypatch, scratch):
+    space, _ = scratch
+    monkeypatch.setattr(video_merge_tool, "upload_video_file", None)
+    output_dir = tmp_path / "task"
+
+    result = json.loads(video_merge_tool.merge_videos_from_urls(
+        ["u0", "u1"], output_dir=str(output_dir), local_paths=_local_parts(tmp_path)
+    ))
+
+    assert result["success"]
+    assert Path(result["merged_video_path"]).parent == output_dir
+    assert Path(result["merged_video_path"]).read_bytes() == b"part0part1"
+    assert space._reserved == 0
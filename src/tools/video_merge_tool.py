@@ -1,11 +1,15 @@
 """
 视频拼接工具
-使用 moviepy 将两段视频拼接成一段完整视频
+各段视频编码参数一致时使用 ffmpeg concat 直接拼接（不重新编码），
+否则使用 moviepy 重新编码拼接
 """
 import os
+import re
 import json
-import tempfile
-import requests
+import asyncio
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Optional, Callable
 from datetime import datetime
@@ -26,127 +30,319 @@ def _init_moviepy():
         except ImportError as e:
             print(f"警告: moviepy 未正确安装，视频拼接功能将不可用: {e}")
 
+from utils.file.cache import get_file_cache
+from utils.file.scratch import get_scratch_space
+
+# 拼接模式：auto（参数一致时直接拼接，否则重新编码）/ copy（强制直接拼接）/ reencode（强制重新编码）
+VIDEO_MERGE_MODE = os.getenv("VIDEO_MERGE_MODE", "auto")
+
+# 单次拼接预留的临时空间（拼接输出文件，输入文件位于下载缓存）
+MERGE_RESERVE_BYTES = int(os.getenv("VIDEO_MERGE_RESERVE_BYTES", str(512 * 1024 * 1024)))
+
+# 参与一致性比较的流参数
+_VIDEO_STREAM_FIELDS = ("codec_name", "profile", "width", "height", "pix_fmt", "r_frame_rate", "time_base")
+_AUDIO_STREAM_FIELDS = ("codec_name", "profile", "sample_rate", "channels", "channel_layout")
+
 # 导入对象存储上传工具
 try:
-    from tools.storage_upload_tool import upload_and_get_url
+    from tools.storage_upload_tool import upload_video_file, generate_presigned_url
 except ImportError as e:
     print(f"警告: 无法导入对象存储上传工具: {e}")
-    upload_and_get_url = None
+    upload_video_file = None
+    generate_presigned_url = None
 
-def download_video(video_url: str, download_dir: str) -> str:
+def download_video(video_url: str, download_dir: Optional[str] = None) -> str:
     """
     从URL下载视频到本地
 
+    通过本地文件缓存读取：同一视频（URL 或内容相同）只下载一次，
+    重新拼接、重试时直接复用。
+
     Args:
         video_url: 视频URL
-        download_dir: 下载目录
+        download_dir: 下载目录（保留参数以兼容旧调用，实际写入缓存目录）
 
     Returns:
-        下载的本地文件路径
+        下载的本地文件路径（只读）
     """
     try:
-        # 发送请求下载视频
-        response = requests.get(video_url, stream=True, timeout=60)
-        response.raise_for_status()
+        return get_file_cache().fetch(video_url, suffix=".mp4", timeout=60)
+    except Exception as e:
+        raise Exception(f"下载视频失败: {str(e)}")
 
-        # 使用简短的文件名，避免文件名过长
-        import hashlib
-        url_hash = hashlib.md5(video_url.encode()).hexdigest()[:16]
-        filename = f"video_{url_hash}.mp4"
+def _get_ffmpeg_exe() -> Optional[str]:
+    """获取 ffmpeg 可执行文件（系统 PATH 或 moviepy 自带的 imageio-ffmpeg）"""
+    exe = shutil.which("ffmpeg")
+    if exe:
+        return exe
+    try:
+        import imageio_ffmpeg  # type: ignore
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return None
 
-        # 构建本地文件路径
-        local_path = os.path.join(download_dir, filename)
 
-        # 保存视频文件
-        with open(local_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
+def probe_stream_signature(video_path: str) -> Optional[tuple]:
+    """
+    读取视频的流参数签名（编码、分辨率、像素格式、帧率、音频采样等）
 
-        return local_path
+    Returns:
+        签名元组；无法探测时返回 None
+    """
+    ffprobe = shutil.which("ffprobe")
+    if ffprobe:
+        try:
+            output = subprocess.run(
+                [ffprobe, "-v", "error", "-show_streams", "-of", "json", video_path],
+                capture_output=True, text=True, timeout=30, check=True
+            ).stdout
+            signature = []
+            for stream in json.loads(output).get("streams", []):
+                codec_type = stream.get("codec_type")
+                if codec_type == "video":
+                    fields = _VIDEO_STREAM_FIELDS
+                elif codec_type == "audio":
+                    fields = _AUDIO_STREAM_FIELDS
+                else:
+                    continue
+                signature.append((codec_type,) + tuple(stream.get(f) for f in fields))
+            return tuple(signature) or None
+        except Exception as e:
+            print(f"ffprobe 探测失败: {e}")
+
+    # 没有 ffprobe 时解析 ffmpeg -i 的输出
+    ffmpeg = _get_ffmpeg_exe()
+    if not ffmpeg:
+        return None
+    try:
+        stderr = subprocess.run(
+            [ffmpeg, "-hide_banner", "-i", video_path],
+            capture_output=True, text=True, timeout=30
+        ).stderr
     except Exception as e:
-        raise Exception(f"下载视频失败: {str(e)}")
+        print(f"ffmpeg 探测失败: {e}")
+        return None
 
-def merge_videos(video_urls: List[str], output_dir: Optional[str] = None) -> str:
-    """
-    拼接多个视频成一段完整视频
+    signature = []
+    for match in re.finditer(r"Stream #\d+:\d+.*?: (Video|Audio): (.*)", stderr):
+        # 去掉码率、默认流标记等与拼接兼容性无关的字段
+        params = re.sub(r",?\s*\d+ kb/s", "", match.group(2))
+        params = re.sub(r"\s*\((default|forced)\)", "", params)
+        signature.append((match.group(1).lower(), params.strip()))
+    return tuple(signature) or None
 
-    Args:
-        video_urls: 视频URL列表
-        output_dir: 输出目录，默认使用临时目录
+
+def concat_stream_copy(video_paths: List[str], output_path: str) -> bool:
+    """
+    使用 ffmpeg concat demuxer 直接拼接（容器层拼接，不解码不重新编码）
 
     Returns:
-        拼接后的视频URL
+        是否拼接成功
     """
+    ffmpeg = _get_ffmpeg_exe()
+    if not ffmpeg:
+        return False
+
+    list_path = output_path + ".concat.txt"
+    try:
+        with open(list_path, "w", encoding="utf-8") as f:
+            for path in video_paths:
+                escaped = os.path.abspath(path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+
+        result = subprocess.run(
+            [ffmpeg, "-hide_banner", "-loglevel", "error", "-y",
+             "-f", "concat", "-safe", "0", "-i", list_path,
+             "-c", "copy", "-movflags", "+faststart", output_path],
+            capture_output=True, text=True, timeout=120
+        )
+        if result.returncode != 0:
+            print(f"直接拼接失败: {result.stderr.strip()}")
+            return False
+        return os.path.exists(output_path) and os.path.getsize(output_path) > 0
+    except Exception as e:
+        print(f"直接拼接失败: {e}")
+        return False
+    finally:
+        if os.path.exists(list_path):
+            os.remove(list_path)
+
+
+def concat_reencode(video_paths: List[str], output_path: str) -> None:
+    """使用 moviepy 解码后重新编码拼接（各段参数不一致时使用）"""
     # 初始化 moviepy
     _init_moviepy()
 
     if VideoFileClip is None or concatenate_videoclips is None:
         raise Exception("moviepy 未正确安装，无法拼接视频")
 
+    video_clips = []
     try:
-        # 创建临时下载目录
-        if output_dir is None:
-            temp_dir = tempfile.mkdtemp()
-        else:
-            temp_dir = output_dir
-            Path(temp_dir).mkdir(parents=True, exist_ok=True)
-
-        download_dir = os.path.join(temp_dir, "downloads")
-        Path(download_dir).mkdir(parents=True, exist_ok=True)
-
-        # 下载所有视频
-        video_clips = []
-        for i, url in enumerate(video_urls):
-            print(f"下载第 {i+1} 个视频: {url}")
-            local_path = download_video(url, download_dir)
-            clip = VideoFileClip(local_path)
+        for i, path in enumerate(video_paths):
+            clip = VideoFileClip(path)
             video_clips.append(clip)
             print(f"第 {i+1} 个视频时长: {clip.duration}秒")
 
-            # 更新下载进度（70-80%）
-            download_progress = 70 + int(((i + 1) / len(video_urls)) * 10)
-            print(f"下载第 {i+1}/{len(video_urls)} 个视频...")
-
-        # 拼接视频
-        print("开始拼接视频...")
         final_clip = concatenate_videoclips(video_clips, method="compose")
-
-        # 导出拼接后的视频
-        output_filename = f"merged_video_{id(final_clip)}.mp4"
-        output_path = os.path.join(temp_dir, output_filename)
         final_clip.write_videofile(output_path, codec='libx264', audio_codec='aac')
-
-        print("视频导出完成")
-
-        # 关闭所有视频剪辑
+        print(f"拼接后视频时长: {final_clip.duration}秒")
         final_clip.close()
+    finally:
+        # 关闭所有视频剪辑
         for clip in video_clips:
             clip.close()
 
-        print(f"视频拼接完成: {output_path}")
-        print(f"拼接后视频时长: {final_clip.duration}秒")
 
+def merge_video_files(video_paths: List[str], output_path: str, mode: Optional[str] = None) -> str:
+    """
+    拼接本地视频文件
+
+    Args:
+        video_paths: 本地视频路径列表（按顺序）
+        output_path: 输出文件路径
+        mode: auto / copy / reencode，默认取 VIDEO_MERGE_MODE
+
+    Returns:
+        输出文件路径
+    """
+    mode = mode or VIDEO_MERGE_MODE
+
+    if mode != "reencode":
+        signatures = [probe_stream_signature(path) for path in video_paths]
+        compatible = signatures[0] is not None and all(sig == signatures[0] for sig in signatures)
+        if compatible or mode == "copy":
+            print("各段视频参数一致，直接拼接（不重新编码）...")
+            if concat_stream_copy(video_paths, output_path):
+                return output_path
+            print("直接拼接失败，改为重新编码拼接")
+        else:
+            print("各段视频参数不一致，重新编码拼接...")
+
+    concat_reencode(video_paths, output_path)
+    return output_path
+
+
+def merge_videos(video_urls: List[str], output_dir: str, local_paths: Optional[List[Optional[str]]] = None) -> str:
+    """
+    拼接多个视频成一段完整视频
+
+    Args:
+        video_urls: 视频URL列表
+        output_dir: 输出目录（调用方的工作空间或任务目录，由调用方负责删除）
+        local_paths: 已提前下载好的本地文件（与 video_urls 一一对应，缺失项为 None），
+            仅下载缺失的部分
+
+    Returns:
+        拼接后的本地视频路径
+    """
+    try:
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+
+        # 下载尚未下载的视频（并发下载）
+        paths = list(local_paths) if local_paths else [None] * len(video_urls)
+        missing = [i for i, path in enumerate(paths) if not path or not os.path.exists(path)]
+        if missing:
+            print(f"下载 {len(missing)}/{len(video_urls)} 个视频...")
+            with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+                downloaded = executor.map(lambda i: download_video(video_urls[i]), missing)
+                for i, path in zip(missing, downloaded):
+                    paths[i] = path
+
+        # 拼接视频
+        print("开始拼接视频...")
+        output_path = os.path.join(output_dir, f"merged_video_{uuid.uuid4().hex[:8]}.mp4")
+        merge_video_files(paths, output_path)
+
+        print(f"视频拼接完成: {output_path}")
         return output_path
 
     except Exception as e:
         print(f"视频拼接失败: {str(e)}")
         raise Exception(f"视频拼接失败: {str(e)}")
 
-def merge_videos_from_urls(video_urls: List[str], output_dir: Optional[str] = None, auto_upload: bool = True) -> str:
+
+async def download_video_async(video_url: str, download_dir: Optional[str] = None) -> Optional[str]:
+    """
+    在线程中下载视频，供分段生成完成后立即下载（与其余分段的生成并行）
+
+    Returns:
+        本地文件路径；下载失败时返回 None，由拼接阶段重新下载
+    """
+    try:
+        return await asyncio.to_thread(download_video, video_url, download_dir)
+    except Exception as e:
+        print(f"提前下载视频失败，将在拼接时重试: {e}")
+        return None
+
+
+def merge_videos_from_urls(
+    video_urls: List[str],
+    output_dir: Optional[str] = None,
+    auto_upload: bool = True,
+    local_paths: Optional[List[Optional[str]]] = None,
+    merged_path: Optional[str] = None,
+    video_key: Optional[str] = None,
+    on_stage: Optional[Callable[[str, str], None]] = None,
+    resume_scope: Optional[str] = None
+) -> str:
     """
     从URL列表拼接视频并返回结果
 
     Args:
         video_urls: 视频URL列表
-        output_dir: 输出目录
+        output_dir: 输出目录；未指定时在预留了临时空间的工作空间中拼接和上传，返回前删除（结果中不含本地路径）
         auto_upload: 是否自动上传到对象存储（默认True）
+        local_paths: 已提前下载好的本地文件，与 video_urls 一一对应
+        merged_path: 已拼接好的本地文件（检查点），存在时跳过拼接
+        video_key: 已上传的对象存储 key（检查点），存在时跳过拼接和上传
+        on_stage: 阶段完成回调 (阶段名, 结果)，阶段名为 merged_path / uploaded_key
+        resume_scope: 上传的续传范围（见 storage_upload_tool.task_upload_scope），任务重试时从已上传的分片继续
 
     Returns:
         JSON格式的拼接结果
     """
+    if output_dir is None:
+        try:
+            with get_scratch_space().workspace("merge", reserve_bytes=MERGE_RESERVE_BYTES) as work_dir:
+                result = json.loads(merge_videos_from_urls(
+                    video_urls,
+                    output_dir=work_dir,
+                    auto_upload=auto_upload,
+                    local_paths=local_paths,
+                    merged_path=merged_path,
+                    video_key=video_key,
+                    on_stage=on_stage,
+                    resume_scope=resume_scope
+                ))
+        except Exception as e:
+            return json.dumps({
+                "success": False,
+                "error": str(e),
+                "message": f"视频拼接失败: {str(e)}"
+            }, ensure_ascii=False, indent=2)
+        # 拼接文件已随工作空间删除
+        if result.get("merged_video_path") and not os.path.exists(result["merged_video_path"]):
+            result["merged_video_path"] = None
+        return json.dumps(result, ensure_ascii=False, indent=2)
+
     try:
-        merged_path = merge_videos(video_urls, output_dir)
+        # 已上传：只需重新签名
+        if video_key and generate_presigned_url:
+            print(f"视频已上传，跳过拼接与上传: {video_key}")
+            return json.dumps({
+                "success": True,
+                "merged_video_path": merged_path,
+                "merged_video_url": generate_presigned_url(video_key),
+                "video_key": video_key,
+                "message": "视频拼接并上传成功"
+            }, ensure_ascii=False, indent=2)
+
+        if merged_path and os.path.exists(merged_path):
+            print(f"视频已拼接，跳过拼接: {merged_path}")
+        else:
+            merged_path = merge_videos(video_urls, output_dir, local_paths=local_paths)
+            if on_stage:
+                on_stage("merged_path", merged_path)
 
         result = {
             "success": True,
@@ -155,7 +351,7 @@ def merge_videos_from_urls(video_urls: List[str], output_dir: Optional[str] = No
         }
 
         # 如果启用了自动上传且上传工具可用
-        if auto_upload and upload_and_get_url:
+        if auto_upload and upload_video_file and generate_presigned_url:
             try:
                 print("正在上传到对象存储... (95%)")
                 print("开始上传拼接后的视频到对象存储...")
@@ -165,10 +361,13 @@ def merge_videos_from_urls(video_urls: List[str], output_dir: Optional[str] = No
                 file_name = f"tnho_promo_video_{timestamp}_{unique_id}.mp4"
 
                 # 上传并获取签名URL
-                signed_url = upload_and_get_url(merged_path, file_name)
+                video_key = upload_video_file(merged_path, file_name, resume_scope=resume_scope)
+                if on_stage:
+                    on_stage("uploaded_key", video_key)
+                signed_url = generate_presigned_url(video_key)
 
                 result["merged_video_url"] = signed_url
-                result["video_key"] = f"videos/{file_name}"
+                result["video_key"] = video_key
                 result["message"] = "视频拼接并上传成功"
 
                 print("视频上传成功 (100%)")
@@ -3,11 +3,12 @@
 使用 doubao-seedream 模型生成图片
 """
 import os
-import tempfile
 from langchain.tools import tool, ToolRuntime
 import requests
 from dotenv import load_dotenv
 
+from utils.file.cache import get_file_cache
+
 load_dotenv()
 
 # 导入对象存储上传工具
@@ -132,11 +133,8 @@ def generate_image(
 
         # 上传到对象存储
         try:
-            # 下载图片
-            temp_file = tempfile.NamedTemporaryFile(suffix='.png', delete=False)
-            image_response = requests.get(image_url, timeout=60)
-            temp_file.write(image_response.content)
-            temp_file.close()
+            # 下载图片（经本地文件缓存，缓存文件只读，由缓存按容量淘汰）
+            local_path = get_file_cache().fetch(image_url, suffix='.png', timeout=60)
 
             # 上传到对象存储
             if upload_and_get_url:
@@ -145,12 +143,10 @@ def generate_image(
                 timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
                 unique_id = str(uuid.uuid4())[:8]
                 file_name = f"wechat_image_{timestamp}_{unique_id}.png"
-                oss_url = upload_and_get_url(temp_file.name, file_name)
+                oss_url = upload_and_get_url(local_path, file_name)
             else:
                 oss_url = image_url  # 如果上传工具不可用，使用原始URL
 
-            os.unlink(temp_file.name)
-
             return f"""
 ✅ 图片生成成功！
 
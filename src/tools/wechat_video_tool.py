@@ -3,12 +3,13 @@
 使用 doubao-seedance 模型生成视频
 """
 import os
-import tempfile
 from pathlib import Path
 from langchain.tools import tool, ToolRuntime
 import requests
 from dotenv import load_dotenv
 
+from utils.file.cache import get_file_cache
+
 load_dotenv()
 
 # 导入对象存储上传工具
@@ -148,11 +149,8 @@ def generate_video(
 
         # 上传到对象存储
         try:
-            # 下载视频
-            temp_file = tempfile.NamedTemporaryFile(suffix='.mp4', delete=False)
-            video_response = requests.get(video_url, timeout=60)
-            temp_file.write(video_response.content)
-            temp_file.close()
+            # 下载视频（经本地文件缓存，缓存文件只读，由缓存按容量淘汰）
+            local_path = get_file_cache().fetch(video_url, suffix='.mp4', timeout=60)
 
             # 上传到对象存储
             if upload_and_get_url:
@@ -161,12 +159,10 @@ def generate_video(
                 timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
                 unique_id = str(uuid.uuid4())[:8]
                 file_name = f"wechat_video_{timestamp}_{unique_id}.mp4"
-                oss_url = upload_and_get_url(temp_file.name, file_name)
+                oss_url = upload_and_get_url(local_path, file_name)
             else:
                 oss_url = video_url  # 如果上传工具不可用，使用原始URL
 
-            os.unlink(temp_file.name)
-
             return f"""
 ✅ 视频生成成功！
 
@@ -3,11 +3,12 @@
 使用 doubao-voice 模型生成语音
 """
 import os
-import tempfile
 from langchain.tools import tool, ToolRuntime
 import requests
 from dotenv import load_dotenv
 
+from utils.file.scratch import get_scratch_space
+
 load_dotenv()
 
 # 导入对象存储上传工具
@@ -88,23 +89,22 @@ def generate_voice(
         # 获取音频内容
         audio_content = response.content
 
-        # 保存到临时文件
-        temp_file = tempfile.NamedTemporaryFile(suffix='.mp3', delete=False)
-        temp_file.write(audio_content)
-        temp_file.close()
-
-        # 上传到对象存储
-        if upload_and_get_url:
-            import datetime
-            import uuid
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            unique_id = str(uuid.uuid4())[:8]
-            file_name = f"wechat_voice_{timestamp}_{unique_id}.mp3"
-            oss_url = upload_and_get_url(temp_file.name, file_name)
-        else:
-            oss_url = None  # 如果上传工具不可用，返回本地文件
-
-        os.unlink(temp_file.name)
+        # 保存到任务工作空间，上传完成后随工作空间删除
+        with get_scratch_space().workspace("voice", reserve_bytes=len(audio_content)) as work_dir:
+            audio_path = os.path.join(work_dir, "voice.mp3")
+            with open(audio_path, "wb") as f:
+                f.write(audio_content)
+
+            # 上传到对象存储
+            if upload_and_get_url:
+                import datetime
+                import uuid
+                timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+                unique_id = str(uuid.uuid4())[:8]
+                file_name = f"wechat_voice_{timestamp}_{unique_id}.mp3"
+                oss_url = upload_and_get_url(audio_path, file_name)
+            else:
+                oss_url = None  # 如果上传工具不可用，返回本地文件
 
         # 估算时长
         duration_seconds = len(text) / 3  # 平均每秒3个字
@@ -0,0 +1,227 @@
+"""
+本地文件缓存
+按 URL 和内容哈希寻址的下载缓存：同一 URL 或同一内容只下载、只存储一次，
+按总字节数做 LRU 淘汰，写入时先写临时文件再原子重命名
+"""
+import hashlib
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+import requests
+
+DEFAULT_CACHE_DIR = os.getenv("TNHO_CACHE_DIR", "/tmp/tnho_cache")
+DEFAULT_CACHE_MAX_BYTES = int(os.getenv("TNHO_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+
+# 最近使用过的文件在该时间内不会被淘汰，避免正在拼接/上传的文件被删除
+EVICT_MIN_AGE = 600
+
+
+class LocalFileCache:
+    """
+    本地文件缓存
+
+    目录结构：
+        objects/<sha256><后缀>   文件内容（按内容哈希命名）
+        urls/<md5(url)>          URL 索引，内容为对应的 objects 文件名
+        tmp/                     下载中的临时文件
+
+    返回的路径为缓存共享文件，调用方只能读取，不能修改或删除。
+    """
+
+    def __init__(self, root: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.objects_dir = os.path.join(root, "objects")
+        self.urls_dir = os.path.join(root, "urls")
+        self.tmp_dir = os.path.join(root, "tmp")
+        for path in (self.objects_dir, self.urls_dir, self.tmp_dir):
+            os.makedirs(path, exist_ok=True)
+
+        # URL -> [锁, 持有或等待的线程数]；没有线程使用时删除，不随获取过的 URL 数增长
+        self._locks: Dict[str, List] = {}
+        self._locks_guard = threading.Lock()
+        self._evict_lock = threading.Lock()
+
+    @contextmanager
+    def _url_lock(self, url_key: str) -> Iterator[None]:
+        """同一 URL 的下载互斥"""
+        with self._locks_guard:
+            entry = self._locks.get(url_key)
+            if entry is None:
+                entry = self._locks[url_key] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._locks_guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[url_key]
+
+    @staticmethod
+    def _url_key(url: str) -> str:
+        return hashlib.md5(url.encode("utf-8")).hexdigest()
+
+    def lookup(self, url: str) -> Optional[str]:
+        """查询 URL 是否已缓存，命中时刷新访问时间并返回本地路径"""
+        index_path = os.path.join(self.urls_dir, self._url_key(url))
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                object_name = f.read().strip()
+        except FileNotFoundError:
+            return None
+
+        object_path = os.path.join(self.objects_dir, object_name)
+        if not os.path.exists(object_path):
+            # 内容已被淘汰，清理失效索引
+            try:
+                os.remove(index_path)
+            except OSError:
+                pass
+            return None
+        self._touch(object_path)
+        return object_path
+
+    def fetch(self, url: str, suffix: str = "", timeout: int = 60, headers: Optional[dict] = None) -> str:
+        """
+        获取 URL 对应的本地文件，未缓存时下载
+
+        Args:
+            url: 文件URL
+            suffix: 缓存文件后缀（如 .mp4），便于 ffmpeg 等按后缀识别格式
+            timeout: 下载超时时间（秒）
+            headers: 下载请求头
+
+        Returns:
+            本地文件路径（只读）
+        """
+        url_key = self._url_key(url)
+        with self._url_lock(url_key):
+            cached = self.lookup(url)
+            if cached:
+                return cached
+
+            tmp_path = os.path.join(self.tmp_dir, f"{uuid.uuid4().hex}.part")
+            digest = hashlib.sha256()
+            try:
+                with requests.get(url, headers=headers, stream=True, timeout=timeout) as resp:
+                    resp.raise_for_status()
+                    with open(tmp_path, "wb") as f:
+                        for chunk in resp.iter_content(chunk_size=64 * 1024):
+                            if chunk:
+                                digest.update(chunk)
+                                f.write(chunk)
+                return self._commit(tmp_path, digest.hexdigest(), suffix, url_key)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def put_file(self, file_path: str, url: Optional[str] = None, suffix: str = "") -> str:
+        """
+        将已有本地文件加入缓存（复制），可选地关联一个 URL
+
+        Returns:
+            缓存文件路径
+        """
+        tmp_path = os.path.join(self.tmp_dir, f"{uuid.uuid4().hex}.part")
+        digest = hashlib.sha256()
+        try:
+            with open(file_path, "rb") as src, open(tmp_path, "wb") as dst:
+                for chunk in iter(lambda: src.read(1024 * 1024), b""):
+                    digest.update(chunk)
+                    dst.write(chunk)
+            return self._commit(tmp_path, digest.hexdigest(), suffix, self._url_key(url) if url else None)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _commit(self, tmp_path: str, content_hash: str, suffix: str, url_key: Optional[str]) -> str:
+        """临时文件原子重命名为内容寻址文件，并写入 URL 索引"""
+        object_name = f"{content_hash}{suffix}"
+        object_path = os.path.join(self.objects_dir, object_name)
+
+        if os.path.exists(object_path):
+            # 内容已存在（其他 URL 下载过同样的内容），复用已有文件
+            self._touch(object_path)
+        else:
+            os.replace(tmp_path, object_path)
+
+        if url_key:
+            index_tmp = os.path.join(self.tmp_dir, f"{uuid.uuid4().hex}.idx")
+            with open(index_tmp, "w", encoding="utf-8") as f:
+                f.write(object_name)
+            os.replace(index_tmp, os.path.join(self.urls_dir, url_key))
+
+        self.evict()
+        return object_path
+
+    @staticmethod
+    def _touch(path: str) -> None:
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+    def total_bytes(self) -> int:
+        total = 0
+        with os.scandir(self.objects_dir) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    total += entry.stat().st_size
+        return total
+
+    def evict(self) -> int:
+        """
+        按最近访问时间淘汰，直到总大小不超过上限
+
+        Returns:
+            释放的字节数
+        """
+        with self._evict_lock:
+            entries = []
+            with os.scandir(self.objects_dir) as it:
+                for entry in it:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+            total = sum(size for _, size, _ in entries)
+            if total <= self.max_bytes:
+                return 0
+
+            freed = 0
+            now = time.time()
+            for mtime, size, path in sorted(entries):
+                if total - freed <= self.max_bytes:
+                    break
+                if now - mtime < EVICT_MIN_AGE:
+                    continue
+                try:
+                    os.remove(path)
+                    freed += size
+                except OSError:
+                    pass
+            # 指向已淘汰文件的 URL 索引在 lookup 时自动失效
+            return freed
+
+
+_file_cache: Optional[LocalFileCache] = None
+_file_cache_lock = threading.Lock()
+
+
+def get_file_cache() -> LocalFileCache:
+    """获取进程内共享的文件缓存"""
+    global _file_cache
+    if _file_cache is None:
+        with _file_cache_lock:
+            if _file_cache is None:
+                _file_cache = LocalFileCache()
+    return _file_cache
+
+
+__all__ = ["LocalFileCache", "get_file_cache"]
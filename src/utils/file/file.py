@@ -1,4 +1,5 @@
 import os
+import shutil
 import requests
 import uuid
 import chardet
@@ -8,6 +9,8 @@ from pydantic import BaseModel, Field, field_validator,PrivateAttr
 from urllib.parse import urlparse
 from pptx import Presentation
 
+from utils.file.cache import get_file_cache
+
 MAX_FILE_SIZE = 10 * 1024 * 1024
 
 class File(BaseModel):
@@ -165,18 +168,17 @@ class FileOps:
 
         try:
             os.makedirs(FileOps.DOWNLOAD_DIR, exist_ok=True)
-
-            # 简单的文件名生成策略 (真实场景建议用 url hash 避免重复下载)
-            # ext = os.path.splitext(file_obj.url.split('?')[0])[1] or ".tmp"
-            # filename = f"{uuid.uuid4().hex}{ext}"
             local_path = os.path.join(FileOps.DOWNLOAD_DIR, filename)
 
+            # 经本地缓存下载：同一 URL 只下载一次，再复制到目标文件名
+            # （不硬链接：调用方可写的文件与缓存对象共用 inode 会破坏缓存内容，淘汰时也释放不了空间）
+            ext = os.path.splitext(urlparse(file_obj.url).path)[1]
             headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'}
-            with requests.get(file_obj.url, headers=headers, stream=True, timeout=120) as r:
-                r.raise_for_status()
-                with open(local_path, 'wb') as f:
-                    for chunk in r.iter_content(chunk_size=8192):
-                        f.write(chunk)
+            cached_path = get_file_cache().fetch(file_obj.url, suffix=ext, timeout=120, headers=headers)
+
+            if os.path.exists(local_path):
+                os.remove(local_path)
+            shutil.copyfile(cached_path, local_path)
 
             return local_path
         except Exception as e:
@@ -0,0 +1,284 @@
+"""
+临时工作空间管理
+视频下载、拼接、语音合成等任务的临时文件统一放在工作空间中：
+- 每个任务一个工作空间目录，任务结束（包括异常退出）时自动删除
+- 需要跨重试保留的中间文件（如拼接结果）放在按任务ID命名的任务目录中，由调用方删除
+- 全局字节预算：任务开始前预留空间，预算或磁盘剩余空间不足时等待其他任务释放
+- 后台清理：删除崩溃进程遗留的工作空间
+"""
+import asyncio
+import json
+import os
+import re
+import shutil
+import socket
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Iterator, AsyncIterator, Optional
+
+DEFAULT_SCRATCH_DIR = os.getenv("TNHO_SCRATCH_DIR", "/tmp/tnho_scratch")
+DEFAULT_SCRATCH_MAX_BYTES = int(os.getenv("TNHO_SCRATCH_MAX_BYTES", str(4 * 1024 * 1024 * 1024)))
+# 磁盘至少保留的剩余空间
+DEFAULT_MIN_FREE_BYTES = int(os.getenv("TNHO_SCRATCH_MIN_FREE_BYTES", str(1024 * 1024 * 1024)))
+# 无主工作空间（非本进程创建且无法确认属主存活）超过该时间后删除
+DEFAULT_ORPHAN_SECONDS = int(os.getenv("TNHO_SCRATCH_ORPHAN_SECONDS", str(6 * 3600)))
+DEFAULT_SWEEP_INTERVAL = int(os.getenv("TNHO_SCRATCH_SWEEP_SECONDS", "600"))
+# 等待空间的默认超时时间（秒）
+DEFAULT_ACQUIRE_TIMEOUT = float(os.getenv("TNHO_SCRATCH_ACQUIRE_TIMEOUT", "600"))
+
+OWNER_FILE = ".owner"
+
+
+class ScratchSpaceExhausted(Exception):
+    """等待超时仍无可用的临时空间"""
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class ScratchSpace:
+    """
+    临时工作空间管理器
+
+    预留字节数是任务对自身临时文件大小的估计，只用于准入控制，不限制实际写入。
+    """
+
+    def __init__(
+        self,
+        root: str = DEFAULT_SCRATCH_DIR,
+        max_bytes: int = DEFAULT_SCRATCH_MAX_BYTES,
+        min_free_bytes: int = DEFAULT_MIN_FREE_BYTES,
+        orphan_seconds: int = DEFAULT_ORPHAN_SECONDS
+    ):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.min_free_bytes = min_free_bytes
+        self.orphan_seconds = orphan_seconds
+        os.makedirs(root, exist_ok=True)
+
+        self._hostname = socket.gethostname()
+        self._reserved = 0
+        # 本进程正在使用的工作空间 -> 预留字节数
+        self._active: Dict[str, int] = {}
+        self._cond = threading.Condition()
+        self._sweeper: Optional[threading.Thread] = None
+
+    # ==================== 空间预留 ====================
+
+    def _has_room(self, reserve_bytes: int) -> bool:
+        # 没有其他任务占用时总是放行，避免单个大任务永远等待
+        if self._reserved == 0:
+            return True
+        if self._reserved + reserve_bytes > self.max_bytes:
+            return False
+        free = shutil.disk_usage(self.root).free
+        return free - reserve_bytes >= self.min_free_bytes
+
+    def _try_reserve(self, reserve_bytes: int) -> bool:
+        with self._cond:
+            if not self._has_room(reserve_bytes):
+                return False
+            self._reserved += reserve_bytes
+            return True
+
+    def _reserve(self, reserve_bytes: int, timeout: float) -> None:
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._has_room(reserve_bytes):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise ScratchSpaceExhausted(
+                        f"临时空间不足：已预留 {self._reserved} 字节，需要 {reserve_bytes} 字节"
+                    )
+                # 磁盘剩余空间可能被其他进程释放，定期重新检查
+                self._cond.wait(min(remaining, 5))
+            self._reserved += reserve_bytes
+
+    def _release(self, reserve_bytes: int) -> None:
+        with self._cond:
+            self._reserved = max(0, self._reserved - reserve_bytes)
+            self._cond.notify_all()
+
+    # ==================== 工作空间 ====================
+
+    def _create_dir(self, prefix: str) -> str:
+        path = os.path.join(self.root, f"{prefix}_{os.getpid()}_{uuid.uuid4().hex[:8]}")
+        os.makedirs(path)
+        with open(os.path.join(path, OWNER_FILE), "w", encoding="utf-8") as f:
+            json.dump({"host": self._hostname, "pid": os.getpid(), "created_at": time.time()}, f)
+        return path
+
+    def _open(self, prefix: str, reserve_bytes: int) -> str:
+        try:
+            path = self._create_dir(prefix)
+        except Exception:
+            self._release(reserve_bytes)
+            raise
+        with self._cond:
+            self._active[path] = reserve_bytes
+        return path
+
+    def _close(self, path: str) -> None:
+        with self._cond:
+            reserve_bytes = self._active.pop(path, 0)
+        shutil.rmtree(path, ignore_errors=True)
+        self._release(reserve_bytes)
+
+    @contextmanager
+    def workspace(
+        self,
+        prefix: str = "job",
+        reserve_bytes: int = 0,
+        timeout: float = DEFAULT_ACQUIRE_TIMEOUT
+    ) -> Iterator[str]:
+        """
+        创建任务工作空间，退出时删除
+
+        Args:
+            prefix: 目录名前缀
+            reserve_bytes: 预计占用的字节数
+            timeout: 等待空间的超时时间（秒）
+
+        Returns:
+            工作空间目录路径
+
+        Raises:
+            ScratchSpaceExhausted: 等待超时
+        """
+        self._reserve(reserve_bytes, timeout)
+        path = self._open(prefix, reserve_bytes)
+        try:
+            yield path
+        finally:
+            self._close(path)
+
+    @asynccontextmanager
+    async def aworkspace(
+        self,
+        prefix: str = "job",
+        reserve_bytes: int = 0,
+        timeout: float = DEFAULT_ACQUIRE_TIMEOUT
+    ) -> AsyncIterator[str]:
+        """workspace 的异步版本，等待空间时不阻塞事件循环"""
+        deadline = time.monotonic() + timeout
+        while not self._try_reserve(reserve_bytes):
+            if time.monotonic() >= deadline:
+                raise ScratchSpaceExhausted(
+                    f"临时空间不足：已预留 {self._reserved} 字节，需要 {reserve_bytes} 字节"
+                )
+            await asyncio.sleep(1)
+
+        path = self._open(prefix, reserve_bytes)
+        try:
+            yield path
+        finally:
+            await asyncio.to_thread(self._close, path)
+
+    def _task_path(self, task_id: str, prefix: str) -> str:
+        return os.path.join(self.root, f"{prefix}_{re.sub(r'[^A-Za-z0-9_.-]', '_', task_id)}")
+
+    def task_dir(self, task_id: str, prefix: str = "task") -> str:
+        """
+        获取任务目录：同一任务的多次执行（重试、崩溃后被接管）使用同一目录，保存跨重试复用的中间文件
+
+        不绑定进程，不随任务结束删除：调用方在不再需要时调用 remove_task_dir，否则 orphan_seconds 后由后台清理删除
+        """
+        path = self._task_path(task_id, prefix)
+        if not os.path.isdir(path):
+            os.makedirs(path, exist_ok=True)
+            # 不记录 pid：进程退出后目录仍需保留给重试使用，只按存在时间清理
+            with open(os.path.join(path, OWNER_FILE), "w", encoding="utf-8") as f:
+                json.dump({"host": self._hostname, "created_at": time.time()}, f)
+        return path
+
+    def remove_task_dir(self, task_id: str, prefix: str = "task") -> None:
+        """删除任务目录（任务完成或最终失败后调用）"""
+        shutil.rmtree(self._task_path(task_id, prefix), ignore_errors=True)
+
+    # ==================== 清理 ====================
+
+    def _is_orphan(self, path: str, now: float) -> bool:
+        try:
+            with open(os.path.join(path, OWNER_FILE), "r", encoding="utf-8") as f:
+                owner = json.load(f)
+        except (OSError, ValueError):
+            owner = {}
+
+        # 同一主机上属主进程已退出：立即清理
+        if owner.get("host") == self._hostname and owner.get("pid") and not _pid_alive(owner["pid"]):
+            return True
+        # 其他情况（属主存活、其他主机、无属主信息）按存在时间清理
+        try:
+            created_at = owner.get("created_at") or os.path.getmtime(path)
+        except OSError:
+            return False
+        return now - created_at > self.orphan_seconds
+
+    def sweep(self) -> int:
+        """
+        删除无主的工作空间
+
+        Returns:
+            删除的目录数
+        """
+        removed = 0
+        now = time.time()
+        with self._cond:
+            active = set(self._active)
+        try:
+            entries = list(os.scandir(self.root))
+        except FileNotFoundError:
+            return 0
+
+        for entry in entries:
+            if not entry.is_dir() or entry.path in active:
+                continue
+            if self._is_orphan(entry.path, now):
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+        if removed:
+            print(f"已清理 {removed} 个无主临时工作空间")
+        return removed
+
+    def start_sweeper(self, interval: int = DEFAULT_SWEEP_INTERVAL) -> None:
+        """启动后台清理线程（重复调用无副作用）"""
+        if self._sweeper and self._sweeper.is_alive():
+            return
+
+        def _loop():
+            while True:
+                try:
+                    self.sweep()
+                except Exception as e:
+                    print(f"清理临时工作空间失败: {e}")
+                time.sleep(interval)
+
+        self._sweeper = threading.Thread(target=_loop, name="scratch-sweeper", daemon=True)
+        self._sweeper.start()
+
+
+_scratch_space: Optional[ScratchSpace] = None
+_scratch_space_lock = threading.Lock()
+
+
+def get_scratch_space() -> ScratchSpace:
+    """获取进程内共享的临时空间管理器（首次调用时启动后台清理）"""
+    global _scratch_space
+    if _scratch_space is None:
+        with _scratch_space_lock:
+            if _scratch_space is None:
+                _scratch_space = ScratchSpace()
+                _scratch_space.start_sweeper()
+    return _scratch_space
+
+
+__all__ = ["ScratchSpace", "ScratchSpaceExhausted", "get_scratch_space"]
@@ -0,0 +1,119 @@
+"""
+本地文件缓存测试：内容寻址去重、超过容量时按最近访问时间淘汰、最近使用的文件不淘汰
+"""
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+# 添加src目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+pytest.importorskip("requests")
+
+from utils.file import cache as cache_module
+from utils.file.cache import EVICT_MIN_AGE, LocalFileCache
+
+
+def _source(tmp_path, name: str, size: int) -> str:
+    path = tmp_path / name
+    path.write_bytes(os.urandom(size))
+    return str(path)
+
+
+def _age(path: str, seconds: float) -> None:
+    """把文件的访问时间调到 seconds 秒之前"""
+    at = time.time() - seconds
+    os.utime(path, (at, at))
+
+
+def test_same_content_is_stored_once(tmp_path):
+    cache = LocalFileCache(root=str(tmp_path / "cache"), max_bytes=10 * 1024)
+    src = _source(tmp_path, "a.bin", 1024)
+    first = cache.put_file(src, url="http://example.com/a", suffix=".bin")
+    second = cache.put_file(src, url="http://example.com/b", suffix=".bin")
+    assert first == second
+    assert cache.lookup("http://example.com/b") == first
+    assert cache.total_bytes() == 1024
+
+
+def test_evicts_least_recently_used_until_under_limit(tmp_path):
+    cache = LocalFileCache(root=str(tmp_path / "cache"), max_bytes=3 * 1024)
+    paths = []
+    for i, age in enumerate((3000, 2000, 1000)):
+        path = cache.put_file(_source(tmp_path, f"{i}.bin", 1024), url=f"http://example.com/{i}")
+        _age(path, age)
+        paths.append(path)
+
+    # 第四个文件超出容量：淘汰最久未访问的一个
+    newest = cache.put_file(_source(tmp_path, "3.bin", 1024), url="http://example.com/3")
+    assert not os.path.exists(paths[0])
+    assert all(os.path.exists(p) for p in paths[1:] + [newest])
+    assert cache.total_bytes() <= cache.max_bytes
+    # 指向已淘汰文件的 URL 索引失效
+    assert cache.lookup("http://example.com/0") is None
+
+
+def test_lookup_refreshes_access_time(tmp_path):
+    cache = LocalFileCache(root=str(tmp_path / "cache"), max_bytes=2 * 1024)
+    old = cache.put_file(_source(tmp_path, "old.bin", 1024), url="http://example.com/old")
+    other = cache.put_file(_source(tmp_path, "other.bin", 1024), url="http://example.com/other")
+    _age(old, 3000)
+    _age(other, 2000)
+
+    # 最久未访问的文件被再次读取后不再是淘汰对象
+    assert cache.lookup("http://example.com/old") == old
+    _age(old, EVICT_MIN_AGE + 10)
+    cache.put_file(_source(tmp_path, "new.bin", 1024))
+    assert os.path.exists(old)
+    assert not os.path.exists(other)
+
+
+def test_recently_used_files_are_kept_over_limit(tmp_path):
+    cache = LocalFileCache(root=str(tmp_path / "cache"), max_bytes=1024)
+    first = cache.put_file(_source(tmp_path, "a.bin", 1024))
+    second = cache.put_file(_source(tmp_path, "b.bin", 1024))
+    # 两个文件都在 EVICT_MIN_AGE 内使用过（可能正在拼接/上传），暂时超出容量也不淘汰
+    assert os.path.exists(first) and os.path.exists(second)
+    assert cache.evict() == 0
+
+
+class _Response:
+    def __init__(self, body: bytes):
+        self._body = body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size: int):
+        yield self._body
+
+
+def test_concurrent_fetches_download_once_and_release_locks(tmp_path, monkeypatch):
+    downloads = []
+
+    def _get(url, **kwargs):
+        downloads.append(url)
+        time.sleep(0.05)
+        return _Response(url.encode() * 100)
+
+    monkeypatch.setattr(cache_module.requests, "get", _get)
+    cache = LocalFileCache(root=str(tmp_path / "cache"), max_bytes=1024 * 1024)
+    urls = ["http://example.com/a"] * 4 + [f"http://example.com/{i}" for i in range(4)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        paths = list(executor.map(cache.fetch, urls))
+
+    # 同一 URL 只下载一次，并发获取得到同一个缓存文件
+    assert downloads.count("http://example.com/a") == 1
+    assert len(set(paths[:4])) == 1
+    # 获取结束后不保留按 URL 创建的锁
+    assert cache._locks == {}
@@ -0,0 +1,36 @@
+"""
+FileOps 测试：远程文件经本地缓存下载后复制到目标路径，调用方修改该文件不影响缓存
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# 添加src目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+pytest.importorskip("pptx")
+
+from utils.file import file as file_module
+from utils.file.cache import LocalFileCache
+from utils.file.file import File, FileOps
+
+
+def test_save_to_local_returns_private_copy_of_cached_file(tmp_path, monkeypatch):
+    url = "http://example.com/video.mp4"
+    source = tmp_path / "source.mp4"
+    source.write_bytes(b"video-bytes")
+    cache = LocalFileCache(root=str(tmp_path / "cache"))
+    cached_path = cache.put_file(str(source), url=url, suffix=".mp4")
+
+    monkeypatch.setattr(file_module, "get_file_cache", lambda: cache)
+    monkeypatch.setattr(FileOps, "DOWNLOAD_DIR", str(tmp_path / "downloads"))
+    local_path = FileOps.save_to_local(File(url=url), "video.mp4")
+
+    assert Path(local_path).read_bytes() == b"video-bytes"
+    assert not os.path.samefile(local_path, cached_path)
+    # 调用方截断/改写自己的文件，缓存内容不变
+    with open(local_path, "wb") as f:
+        f.write(b"")
+    assert Path(cache.lookup(url)).read_bytes() == b"video-bytes"
@@ -0,0 +1,140 @@
+"""
+临时工作空间测试：预留与释放的字节数、预算不足时等待超时、退出（包括异常）时删除工作空间，
+后台清理按属主进程与存在时间删除无主目录
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# 添加src目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from utils.file.scratch import OWNER_FILE, ScratchSpace, ScratchSpaceExhausted
+
+MB = 1024 * 1024
+
+
+def _space(tmp_path, **kwargs) -> ScratchSpace:
+    kwargs.setdefault("max_bytes", 10 * MB)
+    kwargs.setdefault("min_free_bytes", 0)
+    return ScratchSpace(root=str(tmp_path / "scratch"), **kwargs)
+
+
+def test_workspace_reserves_and_releases(tmp_path):
+    space = _space(tmp_path)
+    with space.workspace("job", reserve_bytes=4 * MB) as first:
+        assert os.path.isdir(first)
+        assert space._reserved == 4 * MB
+        with space.workspace("job", reserve_bytes=6 * MB) as second:
+            assert space._reserved == 10 * MB
+            assert first != second
+        assert not os.path.exists(second)
+        assert space._reserved == 4 * MB
+    assert not os.path.exists(first)
+    assert space._reserved == 0
+    assert space._active == {}
+
+
+def test_workspace_is_removed_on_error(tmp_path):
+    space = _space(tmp_path)
+    with pytest.raises(RuntimeError):
+        with space.workspace("job", reserve_bytes=MB) as path:
+            Path(path, "partial.mp4").write_bytes(b"x")
+            raise RuntimeError("ffmpeg failed")
+    assert not os.path.exists(path)
+    assert space._reserved == 0
+
+
+def test_over_budget_waits_then_times_out(tmp_path):
+    space = _space(tmp_path)
+    with space.workspace("job", reserve_bytes=8 * MB):
+        started = time.monotonic()
+        with pytest.raises(ScratchSpaceExhausted):
+            with space.workspace("job", reserve_bytes=4 * MB, timeout=0.1):
+                pass
+        assert time.monotonic() - started >= 0.1
+        assert space._reserved == 8 * MB
+
+
+def test_single_oversized_task_is_admitted(tmp_path):
+    # 没有其他任务占用时总是放行，避免单个大任务永远等待
+    space = _space(tmp_path)
+    with space.workspace("job", reserve_bytes=20 * MB, timeout=0):
+        assert space._reserved == 20 * MB
+    assert space._reserved == 0
+
+
+def test_async_workspace_waits_for_release(tmp_path):
+    space = _space(tmp_path)
+
+    async def _run():
+        order = []
+
+        async def _hold():
+            async with space.aworkspace("a", reserve_bytes=8 * MB):
+                order.append("a")
+                await asyncio.sleep(0.2)
+            order.append("a released")
+
+        async def _wait():
+            await asyncio.sleep(0.05)
+            async with space.aworkspace("b", reserve_bytes=4 * MB, timeout=5):
+                order.append("b")
+
+        await asyncio.gather(_hold(), _wait())
+        return order
+
+    assert asyncio.run(_run()) == ["a", "a released", "b"]
+    assert space._reserved == 0
+
+
+def _orphan_dir(space: ScratchSpace, name: str, **owner) -> str:
+    path = os.path.join(space.root, name)
+    os.makedirs(path)
+    with open(os.path.join(path, OWNER_FILE), "w", encoding="utf-8") as f:
+        json.dump(owner, f)
+    return path
+
+
+def test_sweep_removes_dead_and_old_directories(tmp_path):
+    space = _space(tmp_path, orphan_seconds=3600)
+    now = time.time()
+    dead_pid = _orphan_dir(space, "dead", host=space._hostname, pid=2 ** 22 + 1, created_at=now)
+    other_host_old = _orphan_dir(space, "old", host="other-host", pid=os.getpid(), created_at=now - 7200)
+    other_host_new = _orphan_dir(space, "new", host="other-host", pid=os.getpid(), created_at=now - 60)
+    live_pid_old = _orphan_dir(space, "live", host=space._hostname, pid=os.getpid(), created_at=now - 7200)
+    # 任务目录不记录 pid，只按存在时间清理
+    task_new = space.task_dir("t1")
+    task_old = _orphan_dir(space, "task_t0", host=space._hostname, created_at=now - 7200)
+
+    with space.workspace("job") as active:
+        os.utime(active, (now - 7200, now - 7200))
+        assert space.sweep() == 4
+        # 本进程正在使用的工作空间不清理
+        assert os.path.isdir(active)
+
+    assert not os.path.exists(dead_pid)
+    assert not os.path.exists(other_host_old)
+    assert not os.path.exists(live_pid_old)
+    assert not os.path.exists(task_old)
+    assert os.path.isdir(other_host_new)
+    assert os.path.isdir(task_new)
+
+
+def test_sweep_uses_mtime_without_owner_file(tmp_path):
+    space = _space(tmp_path, orphan_seconds=3600)
+    old = os.path.join(space.root, "no_owner_old")
+    new = os.path.join(space.root, "no_owner_new")
+    os.makedirs(old)
+    os.makedirs(new)
+    at = time.time() - 7200
+    os.utime(old, (at, at))
+
+    assert space.sweep() == 1
+    assert not os.path.exists(old)
+    assert os.path.isdir(new)
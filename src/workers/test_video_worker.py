@@ -0,0 +1,152 @@
+"""
+视频任务 worker 测试：租约丢失时取消执行、可重试失败放回队列或标记失败、放弃的任务丢弃续传状态
+队列与数据库会话替换为记录调用的替身，不需要数据库
+"""
+import asyncio
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+
+import pytest
+
+# 添加src目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("pydantic")
+
+from api.video_tasks import RetryableTaskError
+from workers import video_worker
+from workers.video_worker import VideoWorker
+
+
+class _Task:
+    def __init__(self, task_id: str):
+        self.task_id = task_id
+        self.request_payload = {"product_name": "p"}
+        self.total_parts = 2
+
+
+class _Queue:
+    """记录调用的队列替身"""
+
+    def __init__(self, retry_result: bool = True, abandoned=(), leased=()):
+        self.calls = []
+        self._retry_result = retry_result
+        self._abandoned = list(abandoned)
+        self._leased = list(leased)
+
+    def abandon_expired(self, db, max_attempts=3):
+        self.calls.append(("abandon_expired", max_attempts))
+        return self._abandoned
+
+    def lease(self, db, worker_id, limit=1, lease_seconds=120, max_attempts=3):
+        self.calls.append(("lease", worker_id, limit))
+        return self._leased
+
+    def heartbeat(self, db, task_id, worker_id, lease_seconds=120):
+        self.calls.append(("heartbeat", task_id))
+        return True
+
+    def retry(self, db, task_id, worker_id, error_message, max_attempts=3):
+        self.calls.append(("retry", task_id, error_message))
+        return self._retry_result
+
+    def release(self, db, task_id, worker_id):
+        self.calls.append(("release", task_id))
+
+
+class _Manager:
+    failed = []
+
+    def mark_as_failed(self, db, task_id, error_message, lease_owner=None):
+        self.failed.append((task_id, error_message, lease_owner))
+        return object()
+
+
+@pytest.fixture
+def discarded(monkeypatch):
+    """记录被丢弃续传状态的任务"""
+    discarded_ids = []
+
+    @contextmanager
+    def _session():
+        yield None
+
+    _Manager.failed = []
+    monkeypatch.setattr(video_worker, "get_db_session", _session)
+    monkeypatch.setattr(video_worker, "VideoTaskManager", _Manager)
+    monkeypatch.setattr(video_worker, "discard_task_resume_state", discarded_ids.append)
+    return discarded_ids
+
+
+def _worker(queue: _Queue) -> VideoWorker:
+    worker = VideoWorker(worker_id="w1", max_attempts=3)
+    worker.queue = queue
+    return worker
+
+
+def test_lease_discards_resume_state_of_abandoned_tasks(discarded):
+    queue = _Queue(abandoned=["crashed"], leased=[_Task("t1")])
+    leased = _worker(queue)._lease(2)
+
+    assert leased == [("t1", {"product_name": "p"}, 2)]
+    assert queue.calls[0] == ("abandon_expired", 3)
+    assert discarded == ["crashed"]
+
+
+def test_retry_or_fail_requeues_while_attempts_remain(discarded):
+    queue = _Queue(retry_result=True)
+    _worker(queue)._retry_or_fail("t1", "上传失败")
+
+    assert ("retry", "t1", "上传失败") in queue.calls
+    assert _Manager.failed == []
+    assert discarded == []
+
+
+def test_retry_or_fail_marks_failed_when_attempts_exhausted(discarded):
+    queue = _Queue(retry_result=False)
+    _worker(queue)._retry_or_fail("t1", "上传失败")
+
+    assert _Manager.failed == [("t1", "上传失败", "w1")]
+    assert discarded == ["t1"]
+
+
+def test_lost_lease_cancels_execution(monkeypatch, discarded):
+    queue = _Queue()
+    started = []
+
+    async def _process(task_id, request, total_parts, lease_owner=None):
+        started.append(task_id)
+        await asyncio.sleep(60)
+
+    monkeypatch.setattr(video_worker, "process_video_generation_task", _process)
+    worker = _worker(queue)
+    worker.heartbeat_interval = 0.01
+    # 租约已被其他 worker 接管
+    monkeypatch.setattr(worker, "_heartbeat", lambda task_id: False)
+
+    async def _run():
+        execution = asyncio.create_task(worker._execute("t1", {"product_name": "p"}, 2))
+        worker._running["t1"] = execution
+        await asyncio.wait_for(execution, timeout=5)
+
+    asyncio.run(_run())
+    assert started == ["t1"]
+    # 租约丢失导致的取消不向外抛出，执行结束后释放租约
+    assert queue.calls == [("release", "t1")]
+    assert worker._lease_lost == set()
+    assert worker._running == {}
+
+
+def test_retryable_error_goes_to_retry_or_fail(monkeypatch, discarded):
+    queue = _Queue(retry_result=True)
+
+    async def _process(task_id, request, total_parts, lease_owner=None):
+        raise RetryableTaskError("上传失败")
+
+    monkeypatch.setattr(video_worker, "process_video_generation_task", _process)
+    worker = _worker(queue)
+    asyncio.run(worker._execute("t1", {"product_name": "p"}, 2))
+
+    assert queue.calls == [("retry", "t1", "上传失败"), ("release", "t1")]
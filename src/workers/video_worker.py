@@ -0,0 +1,230 @@
+"""
+视频生成任务 worker
+从 video_generation_tasks 持久化队列租约任务并执行：
+- 每个 worker 可配置并发数
+- 执行期间定期心跳续约，worker 崩溃后租约过期，任务会被其他 worker 重新租约
+- 收到 SIGINT/SIGTERM 后停止租约新任务，等待执行中的任务结束
+- 可重试的失败（如上传失败）未用尽执行次数时放回队列，重试时从阶段检查点继续
+- 定期中止对象存储中本服务超期未完成的分片上传（崩溃遗留的分片）
+
+用法：
+    python worker.py --concurrency 4
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+import uuid
+from typing import Dict, Optional, Set
+
+from storage.database.init_db import init_db
+from storage.database.db import close_async_engine
+from storage.database.progress_writer import close_progress_writer
+from storage.database.session import get_db_session
+from storage.database.video_job_queue import VideoJobQueue
+from storage.database.video_task_manager import VideoTaskManager
+from storage.workload_identity import stop_workload_identity
+from api.video_tasks import (
+    RetryableTaskError,
+    VideoGenerateRequest,
+    discard_task_resume_state,
+    process_video_generation_task,
+)
+from llm.ark_video_client import close_ark_video_clients
+from tools.storage_upload_tool import STORAGE_UPLOAD_JANITOR_INTERVAL, close_async_storages, run_upload_janitor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = int(os.getenv("VIDEO_WORKER_CONCURRENCY", "2"))
+DEFAULT_LEASE_SECONDS = int(os.getenv("VIDEO_WORKER_LEASE_SECONDS", "120"))
+DEFAULT_POLL_INTERVAL = float(os.getenv("VIDEO_WORKER_POLL_INTERVAL", "2"))
+DEFAULT_MAX_ATTEMPTS = int(os.getenv("VIDEO_WORKER_MAX_ATTEMPTS", "3"))
+
+
+class VideoWorker:
+    """视频生成任务 worker"""
+
+    def __init__(
+        self,
+        worker_id: Optional[str] = None,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        lease_seconds: int = DEFAULT_LEASE_SECONDS,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS
+    ):
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.concurrency = max(1, concurrency)
+        self.lease_seconds = lease_seconds
+        # 心跳间隔为租约时长的 1/3，留出两次心跳失败的余量
+        self.heartbeat_interval = max(1.0, lease_seconds / 3)
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.queue = VideoJobQueue()
+        self._running: Dict[str, asyncio.Task] = {}
+        # 租约已丢失、正在取消执行的任务
+        self._lease_lost: Set[str] = set()
+        self._stopping = asyncio.Event()
+
+    def stop(self) -> None:
+        """停止租约新任务"""
+        self._stopping.set()
+
+    def _lease(self, limit: int):
+        with get_db_session() as db:
+            # 反复崩溃的任务不再重试：标记失败并丢弃其续传状态（本机日志中的分片上传、任务目录）
+            abandoned = self.queue.abandon_expired(db, max_attempts=self.max_attempts)
+            tasks = self.queue.lease(
+                db,
+                self.worker_id,
+                limit=limit,
+                lease_seconds=self.lease_seconds,
+                max_attempts=self.max_attempts
+            )
+            leased = [(task.task_id, task.request_payload, task.total_parts) for task in tasks]
+        for task_id in abandoned:
+            logger.warning(f"Video task {task_id} abandoned after {self.max_attempts} attempts")
+            discard_task_resume_state(task_id)
+        return leased
+
+    def _heartbeat(self, task_id: str) -> bool:
+        with get_db_session() as db:
+            return self.queue.heartbeat(db, task_id, self.worker_id, lease_seconds=self.lease_seconds)
+
+    def _release(self, task_id: str) -> None:
+        with get_db_session() as db:
+            self.queue.release(db, task_id, self.worker_id)
+
+    def _retry_or_fail(self, task_id: str, error_message: str) -> None:
+        """可重试的失败：未用尽执行次数时放回队列，否则标记失败并丢弃续传状态"""
+        with get_db_session() as db:
+            if self.queue.retry(db, task_id, self.worker_id, error_message, max_attempts=self.max_attempts):
+                logger.info(f"Video task {task_id} requeued for retry: {error_message}")
+                return
+            task = VideoTaskManager().mark_as_failed(db, task_id, error_message, lease_owner=self.worker_id)
+        if task is not None:
+            discard_task_resume_state(task_id)
+
+    async def run(self) -> None:
+        """主循环：有空闲并发时租约任务，直到收到停止信号"""
+        logger.info(f"Video worker {self.worker_id} started, concurrency={self.concurrency}")
+        janitor = asyncio.create_task(run_upload_janitor()) if STORAGE_UPLOAD_JANITOR_INTERVAL > 0 else None
+
+        while not self._stopping.is_set():
+            free = self.concurrency - len(self._running)
+            leased = []
+            if free > 0:
+                try:
+                    leased = await asyncio.to_thread(self._lease, free)
+                except Exception as e:
+                    logger.error(f"Lease video tasks failed: {e}")
+
+            for task_id, payload, total_parts in leased:
+                logger.info(f"Leased video task {task_id}")
+                self._running[task_id] = asyncio.create_task(self._execute(task_id, payload, total_parts))
+
+            # 队列已满载或暂无任务时等待；有任务结束或收到停止信号时提前唤醒
+            if not leased or len(self._running) >= self.concurrency:
+                waiters = [asyncio.create_task(self._stopping.wait())]
+                try:
+                    await asyncio.wait(
+                        waiters + list(self._running.values()),
+                        timeout=self.poll_interval,
+                        return_when=asyncio.FIRST_COMPLETED
+                    )
+                finally:
+                    waiters[0].cancel()
+
+        if self._running:
+            logger.info(f"Waiting for {len(self._running)} running video tasks to finish")
+            await asyncio.gather(*self._running.values(), return_exceptions=True)
+        if janitor:
+            janitor.cancel()
+        await close_progress_writer()
+        await close_async_engine()
+        await close_ark_video_clients()
+        await close_async_storages()
+        await asyncio.to_thread(stop_workload_identity)
+        logger.info(f"Video worker {self.worker_id} stopped")
+
+    async def _execute(self, task_id: str, payload: dict, total_parts: int) -> None:
+        """执行单个任务，并在执行期间心跳续约；租约丢失时取消执行"""
+        heartbeat = asyncio.create_task(self._keep_alive(task_id, asyncio.current_task()))
+        try:
+            request = VideoGenerateRequest(**(payload or {}))
+            await process_video_generation_task(task_id, request, total_parts, lease_owner=self.worker_id)
+        except asyncio.CancelledError:
+            if task_id not in self._lease_lost:
+                raise
+            logger.warning(f"Video task {task_id} cancelled: lease taken over by another worker")
+        except RetryableTaskError as e:
+            try:
+                await asyncio.to_thread(self._retry_or_fail, task_id, str(e))
+            except Exception as e2:
+                # 未能写入时租约过期后任务会被重新租约
+                logger.error(f"Retry video task {task_id} failed: {e2}")
+        except Exception as e:
+            logger.error(f"Video task {task_id} crashed: {e}")
+        finally:
+            heartbeat.cancel()
+            self._lease_lost.discard(task_id)
+            try:
+                await asyncio.to_thread(self._release, task_id)
+            except Exception as e:
+                logger.warning(f"Release video task {task_id} failed: {e}")
+            self._running.pop(task_id, None)
+
+    async def _keep_alive(self, task_id: str, execution: asyncio.Task) -> None:
+        """
+        定期续约
+
+        租约丢失（已被其他 worker 接管）时取消当前执行，避免两个 worker 同时生成、上传并写入终态；
+        取消后的终态写入带租约校验，不会覆盖接管者的结果。
+        """
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                if not await asyncio.to_thread(self._heartbeat, task_id):
+                    logger.warning(f"Lease of video task {task_id} lost, cancelling execution")
+                    self._lease_lost.add(task_id)
+                    execution.cancel()
+                    return
+            except Exception as e:
+                logger.warning(f"Heartbeat of video task {task_id} failed: {e}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="视频生成任务 worker")
+    parser.add_argument("--worker-id", default=None, help="worker ID（默认 主机名-进程号-随机串）")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="并发执行的任务数")
+    parser.add_argument("--lease-seconds", type=int, default=DEFAULT_LEASE_SECONDS, help="租约时长（秒）")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL, help="空闲时查询队列的间隔（秒）")
+    parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS, help="单个任务最大执行次数")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    init_db()
+
+    async def _serve():
+        worker = VideoWorker(
+            worker_id=args.worker_id,
+            concurrency=args.concurrency,
+            lease_seconds=args.lease_seconds,
+            poll_interval=args.poll_interval,
+            max_attempts=args.max_attempts
+        )
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, worker.stop)
+            except NotImplementedError:
+                # Windows 不支持，依赖 KeyboardInterrupt
+                pass
+        await worker.run()
+
+    asyncio.run(_serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+# TNHO 视频生成服务 - 任务 worker 入口
+# 从持久化队列租约视频生成任务并执行，可在多台机器上启动多个实例
+import os
+import sys
+from dotenv import load_dotenv
+
+# 加载 .env 文件
+load_dotenv()
+
+# 添加 src 目录到 Python 路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_path = os.path.join(current_dir, "src")
+
+if src_path not in sys.path:
+    sys.path.insert(0, src_path)
+
+from workers.video_worker import main
+
+if __name__ == "__main__":
+    main()